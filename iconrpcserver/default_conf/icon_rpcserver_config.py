@@ -45,4 +45,38 @@ default_rpcserver_config = \
         ConfigKey.WS_HEARTBEAT_TIME: 30,
         ConfigKey.REQUEST_MAX_SIZE: 2 * 1024 * 1024,
         ConfigKey.DOS_GUARD_ENABLE: False,
+        ConfigKey.COMPILED_VALIDATION: False,
+        ConfigKey.JSON_CODEC: "json",
+        ConfigKey.BLOCK_CACHE_SIZE: 512,
+        ConfigKey.BLOCK_CACHE_BYTES: 32 * 1024 * 1024,
+        ConfigKey.TX_CACHE_SIZE: 4096,
+        ConfigKey.TX_CACHE_BYTES: 16 * 1024 * 1024,
+        ConfigKey.TX_NOT_INVOKED_TTL: 0.5,
+        ConfigKey.TX_NOT_INVOKED_SIZE: 4096,
+        ConfigKey.STUB_SINGLE_FLIGHT: True,
+        ConfigKey.QUERY_CACHE_SIZE: 0,
+        ConfigKey.QUERY_CACHE_BYTES: 8 * 1024 * 1024,
+        ConfigKey.QUERY_CACHE_HEIGHT_TTL: 0.5,
+        ConfigKey.SHARED_CACHE_PATH: "",
+        ConfigKey.SHARED_CACHE_SIZE: 8192,
+        ConfigKey.SHARED_CACHE_BYTES: 256 * 1024 * 1024,
+        ConfigKey.STREAM_RESPONSE_ITEMS: 2000,
+        ConfigKey.RELAY_POOL_SIZE: 32,
+        ConfigKey.RELAY_KEEPALIVE_TIMEOUT: 15,
+        ConfigKey.RELAY_TIMEOUT: 10,
+        ConfigKey.RELAY_BATCH_SIZE: 0,
+        ConfigKey.RELAY_BATCH_DELAY: 0.005,
+        ConfigKey.RELAY_FAILURE_THRESHOLD: 5,
+        ConfigKey.RELAY_CIRCUIT_OPEN_DURATION: 10,
+        ConfigKey.RELAY_ALTERNATES: [],
+        ConfigKey.BATCH_CONCURRENCY: 16,
+        ConfigKey.QUERY_BATCH_SIZE: 0,
+        ConfigKey.QUERY_BATCH_DELAY: 0.001,
+        ConfigKey.QUERY_BATCH_TIMEOUT: 5,
+        ConfigKey.WS_BLOCK_FRAMES: 16,
+        ConfigKey.WS_CATCH_UP_BLOCKS: 64,
+        ConfigKey.WS_SEND_HIGH_WATERMARK: 64,
+        ConfigKey.WS_SEND_LOW_WATERMARK: 16,
+        ConfigKey.WS_SLOW_SUBSCRIBER: "catchUp",
+        ConfigKey.WS_MAX_SUBSCRIPTIONS: 64,
     }
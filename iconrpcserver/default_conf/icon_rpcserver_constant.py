@@ -68,6 +68,40 @@ class ConfigKey:
     REQUEST_MAX_SIZE = 'requestMaxSize'
     GUNICORN_CONFIG = 'gunicornConfig'
     DOS_GUARD_ENABLE = "dosGuardEnable"
+    COMPILED_VALIDATION = "compiledValidation"
+    JSON_CODEC = "jsonCodec"
+    BLOCK_CACHE_SIZE = "blockCacheSize"
+    BLOCK_CACHE_BYTES = "blockCacheBytes"
+    TX_CACHE_SIZE = "txCacheSize"
+    TX_CACHE_BYTES = "txCacheBytes"
+    TX_NOT_INVOKED_TTL = "txNotInvokedTtl"
+    TX_NOT_INVOKED_SIZE = "txNotInvokedSize"
+    STUB_SINGLE_FLIGHT = "stubSingleFlight"
+    QUERY_CACHE_SIZE = "queryCacheSize"
+    QUERY_CACHE_BYTES = "queryCacheBytes"
+    QUERY_CACHE_HEIGHT_TTL = "queryCacheHeightTtl"
+    SHARED_CACHE_PATH = "sharedCachePath"
+    SHARED_CACHE_SIZE = "sharedCacheSize"
+    SHARED_CACHE_BYTES = "sharedCacheBytes"
+    STREAM_RESPONSE_ITEMS = "streamResponseItems"
+    RELAY_POOL_SIZE = "relayPoolSize"
+    RELAY_KEEPALIVE_TIMEOUT = "relayKeepaliveTimeout"
+    RELAY_TIMEOUT = "relayTimeout"
+    RELAY_BATCH_SIZE = "relayBatchSize"
+    RELAY_BATCH_DELAY = "relayBatchDelay"
+    RELAY_FAILURE_THRESHOLD = "relayFailureThreshold"
+    RELAY_CIRCUIT_OPEN_DURATION = "relayCircuitOpenDuration"
+    RELAY_ALTERNATES = "relayAlternates"
+    BATCH_CONCURRENCY = "batchConcurrency"
+    QUERY_BATCH_SIZE = "queryBatchSize"
+    QUERY_BATCH_DELAY = "queryBatchDelay"
+    QUERY_BATCH_TIMEOUT = "queryBatchTimeout"
+    WS_BLOCK_FRAMES = "wsBlockFrames"
+    WS_CATCH_UP_BLOCKS = "wsCatchUpBlocks"
+    WS_SEND_HIGH_WATERMARK = "wsSendHighWatermark"
+    WS_SEND_LOW_WATERMARK = "wsSendLowWatermark"
+    WS_SLOW_SUBSCRIBER = "wsSlowSubscriber"
+    WS_MAX_SUBSCRIPTIONS = "wsMaxSubscriptions"
 
 
 ICON_RPC_SERVER_LOG_TAG = 'IconRpcServer'
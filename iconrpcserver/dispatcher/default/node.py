@@ -1,18 +1,17 @@
-import json
 from typing import TYPE_CHECKING, Dict, List, Union
 
 from iconcommons.logger import Logger
-from jsonrpcserver import async_dispatch
 from jsonrpcserver.methods import Methods
 from jsonrpcserver.response import ExceptionResponse
 from sanic import response as sanic_response
 
 from iconrpcserver.default_conf.icon_rpcserver_constant import ConfigKey, DISPATCH_NODE_TAG
 from iconrpcserver.dispatcher import GenericJsonRpcServerError, validate_jsonschema_node
-from iconrpcserver.utils import convert_upper_camel_method_to_lower_camel
+from iconrpcserver.utils import convert_upper_camel_method_to_lower_camel, json_codec
 from iconrpcserver.utils.icon_service import RequestParamType
 from iconrpcserver.utils.icon_service.converter import convert_params
-from iconrpcserver.utils.json_rpc import get_block_by_params, get_channel_stub_by_channel_name
+from iconrpcserver.utils.json_rpc import (async_dispatch, encode_response, get_block_by_params,
+                                          get_channel_stub_by_channel_name)
 from iconrpcserver.utils.message_queue.stub_collection import StubCollection
 
 if TYPE_CHECKING:
@@ -25,19 +24,13 @@ methods = Methods()
 class NodeDispatcher:
     @staticmethod
     async def dispatch(request: 'SanicRequest', channel_name: str = ""):
-        """Node dispatch
+        """Node dispatch. Each request of a batch request is normalized and validated on its own"""
 
-        FIXME : this dispatch is not considered to support batch request.
-            If you want to support batch request, need to update code that using req_json.
-        """
-
-        req_json = request.json
+        req_json = request.load_json(loads=json_codec.loads)
         url = request.url
         channel = channel_name if channel_name else StubCollection().conf[ConfigKey.CHANNEL]
-        req_json['method'] = convert_upper_camel_method_to_lower_camel(req_json['method'])
-
-        if 'params' in req_json and 'message' in req_json['params']:  # this will be removed after update.
-            req_json['params'] = req_json['params']['message']
+        for req in (req_json if isinstance(req_json, list) else [req_json]):
+            NodeDispatcher._normalize(req)
 
         context = {
             'url': url,
@@ -50,16 +43,30 @@ class NodeDispatcher:
             Logger.info(f'rest_server_node request with {req_json}', DISPATCH_NODE_TAG)
             Logger.info(f'{client_ip} requested {req_json} on {url}')
 
-            validate_jsonschema_node(request=req_json)
+            if not isinstance(req_json, list):
+                validate_jsonschema_node(request=req_json)
         except GenericJsonRpcServerError as e:
             response = ExceptionResponse(e, id=req_json.get('id', 0), debug=False)
         except Exception as e:
             response = ExceptionResponse(e, id=req_json.get('id', 0), debug=False)
         else:
-            response = await async_dispatch(request.body, methods, context=context)
+            response = await async_dispatch(request.body, methods, deserialized=req_json, context=context,
+                                            validator=validate_jsonschema_node,
+                                            concurrency=StubCollection().conf.get(ConfigKey.BATCH_CONCURRENCY, 0))
+
+        body = encode_response(response)
+        Logger.info(f'rest_server_node with response {body.decode()}', DISPATCH_NODE_TAG)
+        return sanic_response.raw(body, status=response.http_status, content_type="application/json")
 
-        Logger.info(f'rest_server_node with response {response}', DISPATCH_NODE_TAG)
-        return sanic_response.json(response.deserialized(), status=response.http_status, dumps=json.dumps)
+    @staticmethod
+    def _normalize(req_json: dict):
+        if not isinstance(req_json, dict) or not isinstance(req_json.get('method'), str):
+            return
+        req_json['method'] = convert_upper_camel_method_to_lower_camel(req_json['method'])
+
+        if isinstance(req_json.get('params'), dict) and 'message' in req_json['params']:
+            # this will be removed after update.
+            req_json['params'] = req_json['params']['message']
 
     @staticmethod
     @methods.add
@@ -13,20 +13,20 @@
 # limitations under the License.'
 
 import asyncio
-import json
 import traceback
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 
 from iconcommons.logger import Logger
 from jsonrpcclient.requests import Request
-from jsonrpcserver import async_dispatch
 from jsonrpcserver.methods import Methods
 from websockets import exceptions
 
 from iconrpcserver.default_conf.icon_rpcserver_constant import ConfigKey
-from iconrpcserver.utils import get_now_timestamp, message_code
-from iconrpcserver.utils.json_rpc import get_channel_stub_by_channel_name
+from iconrpcserver.utils import get_now_timestamp, json_codec, message_code
+from iconrpcserver.utils.json_rpc import async_dispatch, get_channel_stub_by_channel_name
 from iconrpcserver.utils.message_queue.stub_collection import StubCollection
+from iconrpcserver.utils.new_block_hub import PUBLISH_NEW_BLOCK, NewBlockHub
+from iconrpcserver.utils.ws_send_queue import SendQueue, SendQueues, SlowSubscriberError, SubscriberBehindError
 
 if TYPE_CHECKING:
     from sanic.request import Request as SanicRequest
@@ -70,7 +70,7 @@ class Reception:
 
 class WSDispatcher:
     PUBLISH_HEARTBEAT = "node_ws_PublishHeartbeat"
-    PUBLISH_NEW_BLOCK = "node_ws_PublishNewBlock"
+    PUBLISH_NEW_BLOCK = PUBLISH_NEW_BLOCK
 
     @staticmethod
     async def dispatch(request: 'SanicRequest', ws: 'WebSocketCommonProtocol', channel_name: str = ""):
@@ -93,6 +93,8 @@ class WSDispatcher:
 
         height = kwargs['height']
         peer_id = kwargs['peer_id']
+        # blocks in a node_ws_PublishNewBlocks frame while the citizen catches up. 0 sends a block in a frame
+        batch_size = kwargs.get('batch_size', 0)
 
         async with Reception(channel_name, peer_id, remote_target) as registered:
             if not registered:
@@ -102,7 +104,7 @@ class WSDispatcher:
 
             futures = [
                 WSDispatcher.publish_heartbeat(ws),
-                WSDispatcher.publish_new_block(ws, channel_name, height, peer_id),
+                WSDispatcher.publish_new_block(ws, channel_name, height, peer_id, batch_size),
                 WSDispatcher.publish_unregister(ws, channel_name, peer_id)
             ]
             try:
@@ -133,32 +135,39 @@ class WSDispatcher:
         call_method = WSDispatcher.PUBLISH_HEARTBEAT
         request = Request(call_method)
         Logger.debug(f"{call_method}: {request}")
-        await ws.send(json.dumps(request))
+        await ws.send(json_codec.dumps(request))
 
     @staticmethod
-    async def publish_new_block(ws, channel_name, height, peer_id):
+    async def publish_new_block(ws, channel_name, height, peer_id, batch_size: int = 0):
         call_method = WSDispatcher.PUBLISH_NEW_BLOCK
-        channel_stub = get_channel_stub_by_channel_name(channel_name)
+        new_block_hub = NewBlockHub()
         try:
-            while True:
-                new_block_dumped, confirm_info_bytes = await channel_stub.async_task().announce_new_block(
-                    subscriber_block_height=height,
-                    subscriber_id=peer_id
-                )
-                new_block: dict = json.loads(new_block_dumped)
-
-                if "error" in new_block:
-                    Logger.error(f"announce_new_block error: {new_block}, to citizen({peer_id})")
-                    break
-
-                confirm_info = confirm_info_bytes.decode('utf-8')
-                request = Request(call_method, block=new_block, confirm_info=confirm_info)
-                Logger.debug(f"{call_method}: {request}")
-
-                await ws.send(json.dumps(request))
-                height += 1
+            async with SendQueues().open(ws, peer_id) as send_queue:
+                height = await WSDispatcher._catch_up(send_queue, channel_name, height, peer_id, batch_size)
+                while height is not None:
+                    # subscribers at the same height share the block and its frame
+                    new_block = await new_block_hub.get(channel_name, height, peer_id)
+                    if new_block is None:
+                        break
+
+                    Logger.debug(f"{call_method}: {new_block.height} to citizen({peer_id})")
+                    try:
+                        await send_queue.put(new_block.frame, new_block.height)
+                    except SubscriberBehindError as e:
+                        height = await WSDispatcher._catch_up(send_queue, channel_name, e.next_height, peer_id,
+                                                              batch_size)
+                        continue
+                    height += 1
         except exceptions.ConnectionClosed:
             Logger.debug("Connection Closed by child.")  # TODO: Useful message needed.
+        except SlowSubscriberError as e:
+            Logger.warning(f"Disconnect slow citizen({peer_id}): {e}")
+            await WSDispatcher.send_exception(
+                ws, call_method,
+                exception=e,
+                error_code=message_code.Response.fail_subscribe_limit
+            )
+            await ws.close()
         except Exception as e:
             traceback.print_exc()  # TODO: Keep this tb?
             await WSDispatcher.send_exception(
@@ -167,6 +176,44 @@ class WSDispatcher:
                 error_code=message_code.Response.fail_announce_block
             )
 
+    @staticmethod
+    async def _catch_up(send_queue: SendQueue, channel_name: str, height: int, peer_id: str,
+                        batch_size: int) -> Optional[int]:
+        """Send the blocks from the height to the last height of the channel. They are fetched a range at a time.
+        If the subscriber is too slow to take them, it catches up again from the first dropped block
+
+        :param batch_size: blocks in a node_ws_PublishNewBlocks frame. 0 or 1 sends a block in a frame
+        :return: the next height to publish. None if the channel answers with an error
+        """
+        new_block_hub = NewBlockHub()
+        if new_block_hub.catch_up_blocks <= 1:
+            return height
+
+        last_height = await new_block_hub.last_height(channel_name)
+        while last_height is not None and height <= last_height:
+            count = min(new_block_hub.catch_up_blocks, last_height - height + 1)
+            new_blocks = await new_block_hub.get_range(channel_name, height, count, peer_id)
+            Logger.debug(f"Catch up {len(new_blocks)} blocks from {height} to citizen({peer_id})")
+            try:
+                if batch_size > 1:
+                    for i in range(0, len(new_blocks), batch_size):
+                        await send_queue.put(new_block_hub.encode_blocks(new_blocks[i:i + batch_size]),
+                                             new_blocks[i].height)
+                else:
+                    for new_block in new_blocks:
+                        await send_queue.put(new_block.frame, new_block.height)
+            except SubscriberBehindError as e:
+                height = e.next_height
+                continue
+
+            height += len(new_blocks)
+            if len(new_blocks) < count:
+                return None
+            if height > last_height:
+                # blocks committed while catching up
+                last_height = await new_block_hub.last_height(channel_name)
+        return height
+
     @staticmethod
     async def publish_unregister(ws, channel_name, peer_id, force: bool = False):
         call_method = WSDispatcher.PUBLISH_HEARTBEAT
@@ -186,4 +233,4 @@ class WSDispatcher:
     @staticmethod
     async def send_exception(ws, method, exception, error_code):
         request = Request(method, error=str(exception), code=error_code)
-        await ws.send(json.dumps(request))
+        await ws.send(json_codec.dumps(request))
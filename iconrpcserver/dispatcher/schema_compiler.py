@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Generate specialized python validation functions from JSON schema dicts.
+
+A generated function raises the same first ValidationError as Draft4Validator.validate() does,
+as far as validate_jsonschema() reads it: the last element of the instance path
+and the last element of the schema path.
+Only the subset of Draft 4 used by the schemas of this project is supported.
+"""
+
+import numbers
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from jsonschema import FormatChecker
+from jsonschema.exceptions import ValidationError
+
+# keywords which do not affect validation
+IGNORED_KEYWORDS = frozenset(("title", "id", "description", "$schema"))
+
+TYPE_CHECKS = {
+    "object": "isinstance({0}, dict)",
+    "array": "isinstance({0}, list)",
+    "string": "isinstance({0}, str)",
+    "integer": "(isinstance({0}, int) and not isinstance({0}, bool))",
+    "number": "(isinstance({0}, _Number) and not isinstance({0}, bool))",
+    "boolean": "isinstance({0}, bool)",
+    "null": "{0} is None",
+}
+
+
+class UnsupportedSchemaError(Exception):
+    pass
+
+
+class CompiledValidator:
+    """Validator generated from a schema. It can be used in place of Draft4Validator."""
+
+    def __init__(self, schema: dict, validate: Callable[[Any], None], source: str):
+        self.schema = schema
+        self.validate = validate
+        self.source = source
+
+
+def _error(last, keyword: str) -> ValidationError:
+    path = () if last is None else (last,)
+    return ValidationError("", path=path, schema_path=(keyword,))
+
+
+def _format_check(func: Callable, raises) -> Callable:
+    if not raises:
+        return func
+
+    def check(instance):
+        try:
+            return func(instance)
+        except raises:
+            return False
+
+    return check
+
+
+class _SchemaCompiler:
+    def __init__(self, format_checker: FormatChecker):
+        self._format_checker = format_checker
+        self._namespace: Dict[str, Any] = {"_error": _error, "_Number": numbers.Number}
+        self._functions: List[str] = []
+        self._count = 0
+
+    def compile(self, schema: dict, name: str) -> CompiledValidator:
+        func_name = self._function(schema, f"validate_{name}", predicate=False)
+        source = "\n\n".join(self._functions)
+        exec(compile(source, f"<schema {name}>", "exec"), self._namespace)
+        return CompiledValidator(schema, self._namespace[func_name], source)
+
+    def _name(self, prefix: str) -> str:
+        self._count += 1
+        return f"{prefix}{self._count}"
+
+    def _const(self, value) -> str:
+        name = self._name("_c")
+        self._namespace[name] = value
+        return name
+
+    def _function(self, schema: dict, name: str, predicate: bool) -> str:
+        """Generate a function and return its name.
+
+        predicate function returns True/False, otherwise it raises ValidationError on the first error.
+        """
+        name = "".join(c if c.isalnum() else "_" for c in name)
+        lines = [f"def {name}(v0):"]
+        if predicate:
+            self._emit(schema, "v0", "None", lambda last, keyword: "return False", lines, 1, schema_key=0)
+            lines.append("    return True")
+        else:
+            self._emit(schema, "v0", "None", lambda last, keyword: f"raise _error({last}, {keyword!r})", lines, 1)
+            lines.append("    return None")
+        self._functions.append("\n".join(lines))
+        return name
+
+    def _emit(self, schema: Union[dict, bool], var: str, last: str, fail: Callable[[str, Any], str],
+              lines: List[str], depth: int, schema_key: Any = None):
+        """Emit validation statements of schema for the instance in var.
+
+        :param last: expression of the last element of the instance path
+        :param fail: returns a statement for an error with the last element of the instance path and schema path
+        :param schema_key: the last element of the schema path of this schema
+        """
+        indent = "    " * depth
+        if schema is True:
+            return
+        if schema is False and schema_key is not None:
+            # Draft4Validator does not append any keyword for the error of False schema
+            lines.append(f"{indent}{fail(last, schema_key)}")
+            return
+        if not isinstance(schema, dict):
+            raise UnsupportedSchemaError(f"schema: {schema}")
+
+        for keyword, value in schema.items():
+            if keyword in IGNORED_KEYWORDS:
+                continue
+            elif keyword == "type":
+                types = value if isinstance(value, list) else [value]
+                if not types or any(t not in TYPE_CHECKS for t in types):
+                    raise UnsupportedSchemaError(f"type: {value}")
+                condition = " or ".join(TYPE_CHECKS[t].format(var) for t in types)
+                lines.append(f"{indent}if not ({condition}):")
+                lines.append(f"{indent}    {fail(last, keyword)}")
+            elif keyword == "enum":
+                # Draft4Validator compares 0/1 and booleans specially. It is not needed for string enums.
+                if not all(isinstance(each, str) for each in value):
+                    raise UnsupportedSchemaError(f"enum: {value}")
+                lines.append(f"{indent}if {var} not in {self._const(tuple(value))}:")
+                lines.append(f"{indent}    {fail(last, keyword)}")
+            elif keyword == "format":
+                if value not in self._format_checker.checkers:
+                    continue
+                check = self._const(_format_check(*self._format_checker.checkers[value]))
+                lines.append(f"{indent}if not {check}({var}):")
+                lines.append(f"{indent}    {fail(last, keyword)}")
+            elif keyword == "properties":
+                if not value:
+                    continue
+                lines.append(f"{indent}if isinstance({var}, dict):")
+                for key, subschema in value.items():
+                    sub_var = self._name("v")
+                    lines.append(f"{indent}    if {key!r} in {var}:")
+                    lines.append(f"{indent}        {sub_var} = {var}[{key!r}]")
+                    self._emit(subschema, sub_var, repr(key), fail, lines, depth + 2, schema_key=key)
+            elif keyword == "additionalProperties":
+                if value is True or value == {}:
+                    continue
+                if value is not False or "patternProperties" in schema:
+                    raise UnsupportedSchemaError(f"additionalProperties: {value}")
+                known = self._const(frozenset(schema.get("properties", {})))
+                lines.append(f"{indent}if isinstance({var}, dict) and not {known}.issuperset({var}):")
+                lines.append(f"{indent}    {fail(last, keyword)}")
+            elif keyword == "required":
+                required = self._const(frozenset(value))
+                lines.append(f"{indent}if isinstance({var}, dict) and not {var}.keys() >= {required}:")
+                lines.append(f"{indent}    {fail(last, keyword)}")
+            elif keyword == "items":
+                if not isinstance(value, dict):
+                    raise UnsupportedSchemaError(f"items: {value}")
+                index, item = self._name("i"), self._name("v")
+                lines.append(f"{indent}if isinstance({var}, list):")
+                lines.append(f"{indent}    for {index}, {item} in enumerate({var}):")
+                self._emit(value, item, index, fail, lines, depth + 2, schema_key=keyword)
+            elif keyword == "allOf":
+                for i, subschema in enumerate(value):
+                    self._emit(subschema, var, last, fail, lines, depth, schema_key=i)
+            elif keyword in ("anyOf", "oneOf", "not"):
+                subschemas = [value] if keyword == "not" else value
+                predicates = [self._function(subschema, self._name("_is_valid"), predicate=True)
+                              for subschema in subschemas]
+                results = ", ".join(f"{predicate}({var})" for predicate in predicates)
+                if keyword == "anyOf":
+                    condition = f"not any(({results},))"
+                elif keyword == "oneOf":
+                    condition = f"({results},).count(True) != 1"
+                else:
+                    condition = results
+                lines.append(f"{indent}if {condition}:")
+                lines.append(f"{indent}    {fail(last, keyword)}")
+            else:
+                raise UnsupportedSchemaError(f"keyword: {keyword}")
+
+
+def compile_schema(schema: dict, format_checker: FormatChecker, name: Optional[str] = None) -> CompiledValidator:
+    """Generate a validator for schema.
+
+    :param schema: JSON schema (Draft 4)
+    :param format_checker: format checker to be used for 'format' keyword
+    :param name: name of the generated function. schema title is used by default
+    :return: CompiledValidator
+    :raise UnsupportedSchemaError: schema uses a keyword which is not supported
+    """
+    if name is None:
+        name = schema.get("title", "schema")
+    return _SchemaCompiler(format_checker).compile(schema, name)
@@ -1,12 +1,9 @@
 """json rpc dispatcher"""
 
-import json
-import re
 from typing import TYPE_CHECKING, Dict, Union
 from urllib.parse import urlparse
 
 from iconcommons.logger import Logger
-from jsonrpcserver import async_dispatch
 from jsonrpcserver.methods import Methods
 from jsonrpcserver.response import ExceptionResponse
 from sanic import response as sanic_response
@@ -14,10 +11,11 @@ from sanic import response as sanic_response
 from iconrpcserver.default_conf.icon_rpcserver_constant import ConfigKey, ApiVersion, DISPATCH_V2_TAG
 from iconrpcserver.dispatcher import GenericJsonRpcServerError
 from iconrpcserver.dispatcher import validate_jsonschema_v2
-from iconrpcserver.utils import message_code
+from iconrpcserver.utils import json_codec, message_code
 from iconrpcserver.utils.icon_service import response_to_json_query, RequestParamType
 from iconrpcserver.utils.icon_service.converter import make_request
-from iconrpcserver.utils.json_rpc import relay_tx_request, get_block_v2_by_params
+from iconrpcserver.utils.hexadecimal import is_lowercase_hex
+from iconrpcserver.utils.json_rpc import async_dispatch, encode_response, relay_tx_request, get_block_v2_by_params
 from iconrpcserver.utils.message_queue.stub_collection import StubCollection
 
 if TYPE_CHECKING:
@@ -31,7 +29,7 @@ class Version2Dispatcher:
 
     @staticmethod
     async def dispatch(request: 'SanicRequest'):
-        req = request.json
+        req = request.load_json(loads=json_codec.loads)
         url = request.url
 
         context = {
@@ -49,10 +47,11 @@ class Version2Dispatcher:
             Logger.debug(f'dispatch() validate exception = {e}')
             response = ExceptionResponse(e, id=req.get('id', 0), debug=False)
         else:
-            response = await async_dispatch(request.body, methods, context=context)
+            response = await async_dispatch(request.body, methods, deserialized=req, context=context)
 
-        Logger.info(f'rest_server_v2 response with {response}', DISPATCH_V2_TAG)
-        return sanic_response.json(response.deserialized(), status=response.http_status, dumps=json.dumps)
+        body = encode_response(response)
+        Logger.info(f'rest_server_v2 response with {body.decode()}', DISPATCH_V2_TAG)
+        return sanic_response.raw(body, status=response.http_status, content_type="application/json")
 
     @staticmethod
     async def __relay_icx_transaction(path, message, relay_target):
@@ -110,7 +109,7 @@ class Version2Dispatcher:
                 if result:
                     try:
                         # apply tx_result_convert
-                        result_dict = json.loads(result)
+                        result_dict = json_codec.loads(result)
                         fail_status = bool(result_dict.get('failure'))
                         if fail_status:
                             error_code = message_code.Response.fail_validate_params
@@ -228,4 +227,6 @@ class Version2Dispatcher:
 
 
 def is_hex(s):
-    return re.fullmatch(r"^(0x)?[0-9a-f]{64}$", s or "") is not None
+    if not isinstance(s, str):
+        return False
+    return (len(s) == 64 and is_lowercase_hex(s)) or (len(s) == 66 and is_lowercase_hex(s, "0x"))
@@ -16,3 +16,4 @@ from .version3 import *
 from .icx import *
 from .ise import *
 from .rep import *
+from .subscription import *
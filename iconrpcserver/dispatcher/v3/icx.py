@@ -1,7 +1,8 @@
 """json rpc dispatcher version 3"""
 
+import functools
 import json
-from typing import Dict
+from typing import Any, Callable, Dict, Optional
 from urllib.parse import urlparse
 
 from iconcommons.logger import Logger
@@ -9,17 +10,37 @@ from jsonrpcserver import status
 
 from iconrpcserver.dispatcher import GenericJsonRpcServerError, JsonError
 from iconrpcserver.dispatcher.v3 import methods, ConfigKey
-from iconrpcserver.utils import message_code
+from iconrpcserver.utils import json_codec, message_code
+from iconrpcserver.utils.cache import BlockCache, QueryCache, TransactionCache, parse_block_height
 from iconrpcserver.utils.icon_service import (response_to_json_query,
                                               RequestParamType, ResponseParamType)
-from iconrpcserver.utils.icon_service.converter import convert_params, make_request
+from iconrpcserver.utils.icon_service.converter import (compile_item_template, convert_params, is_noop_template,
+                                                        make_request)
+from iconrpcserver.utils.json_codec import EncodedResult, StreamedResult
 from iconrpcserver.utils.json_rpc import (get_icon_stub_by_channel_name, get_channel_stub_by_channel_name,
                                           relay_tx_request, get_block_by_params, get_block_recipts_by_params)
+from iconrpcserver.utils.message_queue.icon_score_inner_stub import QueryBatcher, query_batch
 from iconrpcserver.utils.message_queue.stub_collection import StubCollection
+from iconrpcserver.utils.single_flight import SingleFlight, freeze
 
 BLOCK_v0_1a = '0.1a'
 BLOCK_v0_3 = '0.3'
 
+# kinds of responses in BlockCache and TransactionCache
+BLOCK_RESPONSE = 'icx_getBlock'
+BLOCK_RESPONSE_v0_1a = 'icx_getBlockByHeight'
+BLOCK_RECEIPTS_RESPONSE = 'icx_getBlockReceipts'
+TX_RESULT_RESPONSE = 'icx_getTransactionResult'
+TX_RESPONSE = 'icx_getTransactionByHash'
+
+# keys of the transactions in block JSON
+TX_LIST_KEYS = ('transactions', 'confirmed_transaction_list')
+# templates of icx_getBlock by block version
+BLOCK_TEMPLATES = {
+    BLOCK_v0_1a: ResponseParamType.get_block_v0_1a_tx_v3,
+    BLOCK_v0_3: ResponseParamType.get_block_v0_3_tx_v3,
+}
+
 
 def check_response_code(response_code: message_code.Response):
     if response_code != message_code.Response.success:
@@ -30,27 +51,205 @@ def check_response_code(response_code: message_code.Response):
         )
 
 
+def is_streamed_list(items: Any) -> bool:
+    """Whether the list in the response is large enough to be streamed"""
+    stream_items = StubCollection().conf.get(ConfigKey.STREAM_RESPONSE_ITEMS, 0)
+    return isinstance(items, list) and 0 < stream_items <= len(items)
+
+
+def convert_block_streamed(block: dict, param_type: ResponseParamType):
+    """Convert the block decoded for the request in place.
+
+    The transactions of a large block are not converted here. They are converted while the response is written.
+
+    :return: StreamedResult if the block is large, otherwise the converted block
+    """
+    key = next((key for key in TX_LIST_KEYS if key in block), None)
+    if key is None or not is_streamed_list(block[key]):
+        return convert_params(block, param_type, in_place=True)
+
+    transactions, placeholder = block[key], []
+    block[key] = placeholder
+    response = response_to_json_query(convert_params(block, param_type, in_place=True))
+    # the key of the transactions can be changed by the template
+    key = next((key for key, value in response.items() if value is placeholder), None)
+    if key is None:
+        return response
+    return StreamedResult.from_dict(response, key, transactions, compile_item_template(param_type, key))
+
+
+def convert_block(block: dict):
+    """Convert the block decoded for the request in place. Large blocks are streamed"""
+    param_type = BLOCK_TEMPLATES.get(block['version'])
+    response = block if param_type is None else convert_block_streamed(block, param_type)
+    return response_to_json_query(response)
+
+
+def is_passthrough_block(version: str) -> bool:
+    """Whether icx_getBlock returns the block of the version as it is"""
+    return is_noop_template(BLOCK_TEMPLATES.get(version), dict)
+
+
+def convert_block_v0_1a(block: dict):
+    """Convert the block decoded for the request in place. Large blocks are streamed"""
+    return convert_block_streamed(block, ResponseParamType.get_block_v0_1a_tx_v3)
+
+
+async def get_block_response(channel: str, kind: str, convert: Callable[[dict], Any],
+                             block_height: Optional[int] = None, block_hash: str = "", unconfirmed: bool = False,
+                             passthrough: Optional[Callable[[str], bool]] = None):
+    """Get the converted block. Confirmed blocks are cached as EncodedResult in BlockCache.
+    Large blocks are streamed, and the confirmed ones are cached after they are streamed
+
+    :param kind: response kind in BlockCache
+    :param convert: converts block JSON to the response
+    :param passthrough: whether convert returns the block of the version as it is.
+        such blocks are put into the response without decoding
+    """
+    block_cache = BlockCache()
+    cacheable = block_cache.enabled and not unconfirmed and \
+        (bool(block_hash) or (block_height is not None and block_height >= 0))
+    if cacheable:
+        response = await block_cache.fetch(channel, kind, height=block_height, block_hash=block_hash or None)
+        if response is not None:
+            return response
+
+    if block_hash:
+        block_hash, result = await get_block_by_params(block_hash=block_hash,
+                                                       channel_name=channel,
+                                                       passthrough=passthrough)
+    else:
+        block_hash, result = await get_block_by_params(block_height=block_height,
+                                                       channel_name=channel,
+                                                       unconfirmed=unconfirmed,
+                                                       passthrough=passthrough)
+    check_response_code(result['response_code'])
+
+    block = result['block']
+    if isinstance(block, EncodedResult):
+        # the height of the block which is not decoded is unknown
+        response, height = block, None
+    else:
+        height = parse_block_height(block.get('height'))
+        response = convert(block)
+    if not unconfirmed:
+        QueryCache().update_height(channel, height, latest=block_height == -1)
+    if cacheable:
+        if block_height is None:
+            block_height = height
+        if isinstance(response, StreamedResult):
+            # large blocks cost the most to convert, so they are cached too unless they are too large
+            stream_to_cache(response, block_cache, channel, kind, block_hash, block_height)
+            return response
+        if not isinstance(response, EncodedResult):
+            response = json_codec.encode_result(response)
+        block_cache.put(channel, kind, block_hash, block_height, response, size=len(response))
+    return response
+
+
+def stream_to_cache(response: StreamedResult, block_cache: BlockCache, channel: str, kind: str,
+                    block_hash: str, block_height: Optional[int]):
+    """Cache the response in BlockCache after it is streamed, if it fits in the cache"""
+    response.on_encoded(
+        lambda encoded: block_cache.put(channel, kind, block_hash, block_height, encoded, size=len(encoded)),
+        block_cache.max_bytes)
+
+
+async def get_last_height(channel: str) -> Optional[int]:
+    """The last committed height known to QueryCache. The status of the channel is polled if it is not fresh"""
+    query_cache = QueryCache()
+    height = query_cache.height(channel)
+    if height is None:
+        channel_stub = get_channel_stub_by_channel_name(channel)
+        status_data: dict = await channel_stub.async_task().get_status()
+        query_cache.update_height(channel, parse_block_height(status_data.get('block_height')))
+        height = query_cache.height(channel)
+    return height
+
+
+async def get_query_response(channel: str, method: str, params: dict):
+    """Query icon service. Results are cached in QueryCache until the height of the channel advances"""
+    request = make_request(method, params)
+    query_cache = QueryCache()
+    height = None
+    if query_cache.enabled:
+        key = freeze(request)
+        height = await get_last_height(channel)
+        if height is not None:
+            response = query_cache.get(channel, height, key)
+            if response is not None:
+                return response
+
+    score_stub = get_icon_stub_by_channel_name(channel)
+    query_batcher = QueryBatcher()
+    if query_batcher.enabled:
+        send = functools.partial(query_batch, score_stub, timeout=query_batcher.timeout)
+        response = await query_batcher.submit(channel, request, send)
+    else:
+        response = await score_stub.async_task().query(request)
+    response = response_to_json_query(response)
+    if height is not None:
+        response = json_codec.encode_result(response)
+        query_cache.put(channel, height, key, response, size=len(response))
+    return response
+
+
+def tx_not_invoked_error() -> GenericJsonRpcServerError:
+    return GenericJsonRpcServerError(
+        code=JsonError.INVALID_PARAMS,
+        message=message_code.responseCodeMap[message_code.Response.fail_tx_not_invoked][1],
+        http_status=status.HTTP_BAD_REQUEST
+    )
+
+
+tx_result_flight = SingleFlight()
+
+
+async def get_tx_result_response(channel: str, tx_hash: str):
+    """Get the converted result of the transaction. Results of invoked transactions are cached in TransactionCache"""
+    channel_stub = StubCollection().channel_stubs[channel]
+    verify_result = dict()
+
+    response_code, result = await channel_stub.async_task().get_invoke_result(tx_hash)
+
+    tx_cache = TransactionCache()
+    if response_code == message_code.Response.fail_tx_not_invoked:
+        tx_cache.put_not_invoked(channel, tx_hash)
+        raise tx_not_invoked_error()
+    elif response_code == message_code.Response.fail_invalid_key_error or \
+            response_code == message_code.Response.fail:
+        raise GenericJsonRpcServerError(
+            code=JsonError.INVALID_PARAMS,
+            message='Invalid params txHash',
+            http_status=status.HTTP_BAD_REQUEST
+        )
+
+    if result:
+        try:
+            result_dict = json_codec.loads(result)
+            verify_result = result_dict
+        except json.JSONDecodeError as e:
+            Logger.warning(f"your result is not json, result({result}), {e}")
+
+    response = convert_params(verify_result, ResponseParamType.get_tx_result, in_place=True)
+    if tx_cache.enabled and response_code == message_code.Response.success and verify_result:
+        response = json_codec.encode_result(response)
+        tx_cache.put(channel, TX_RESULT_RESPONSE, tx_hash, response, size=len(response))
+    return response
+
+
 class IcxDispatcher:
     @staticmethod
     @methods.add
     async def icx_call(context: Dict[str, str], **kwargs):
         channel = context.get('channel')
-        method = 'icx_call'
-        request = make_request(method, kwargs)
-        score_stub = get_icon_stub_by_channel_name(channel)
-        response = await score_stub.async_task().query(request)
-        return response_to_json_query(response)
+        return await get_query_response(channel, 'icx_call', kwargs)
 
     @staticmethod
     @methods.add
     async def icx_getScoreApi(context: Dict[str, str], **kwargs):
         channel = context.get('channel')
-        method = 'icx_getScoreApi'
-        request = make_request(method, kwargs)
-        score_stub = get_icon_stub_by_channel_name(channel)
-        response = await score_stub.async_task().query(request)
-
-        return response_to_json_query(response)
+        return await get_query_response(channel, 'icx_getScoreApi', kwargs)
 
     @staticmethod
     async def __relay_icx_transaction(path, message: dict, relay_target):
@@ -113,35 +312,17 @@ class IcxDispatcher:
     async def icx_getTransactionResult(context: Dict[str, str], **kwargs):
         channel = context.get('channel')
         request = convert_params(kwargs, RequestParamType.get_tx_result)
-        channel_stub = StubCollection().channel_stubs[channel]
-        verify_result = dict()
 
         tx_hash = request["txHash"]
-        response_code, result = await channel_stub.async_task().get_invoke_result(tx_hash)
+        tx_cache = TransactionCache()
+        cached = await tx_cache.fetch(channel, TX_RESULT_RESPONSE, tx_hash)
+        if cached is not None:
+            return cached
+        if tx_cache.is_not_invoked(channel, tx_hash):
+            raise tx_not_invoked_error()
 
-        if response_code == message_code.Response.fail_tx_not_invoked:
-            raise GenericJsonRpcServerError(
-                code=JsonError.INVALID_PARAMS,
-                message=message_code.responseCodeMap[response_code][1],
-                http_status=status.HTTP_BAD_REQUEST
-            )
-        elif response_code == message_code.Response.fail_invalid_key_error or \
-                response_code == message_code.Response.fail:
-            raise GenericJsonRpcServerError(
-                code=JsonError.INVALID_PARAMS,
-                message='Invalid params txHash',
-                http_status=status.HTTP_BAD_REQUEST
-            )
-
-        if result:
-            try:
-                result_dict = json.loads(result)
-                verify_result = result_dict
-            except json.JSONDecodeError as e:
-                Logger.warning(f"your result is not json, result({result}), {e}")
-
-        response = convert_params(verify_result, ResponseParamType.get_tx_result)
-        return response
+        # concurrent polls for a transaction share one request to the channel
+        return await tx_result_flight.do((channel, tx_hash), lambda: get_tx_result_response(channel, tx_hash))
 
     @staticmethod
     @methods.add
@@ -150,6 +331,11 @@ class IcxDispatcher:
         request = convert_params(kwargs, RequestParamType.get_tx_result)
         channel_stub = StubCollection().channel_stubs[channel]
 
+        tx_cache = TransactionCache()
+        cached = await tx_cache.fetch(channel, TX_RESPONSE, request["txHash"])
+        if cached is not None:
+            return cached
+
         response_code, tx_info = await channel_stub.async_task().get_tx_info(request["txHash"])
         if response_code == message_code.Response.fail_invalid_key_error:
             raise GenericJsonRpcServerError(
@@ -165,30 +351,22 @@ class IcxDispatcher:
         result["blockHash"] = tx_info["block_hash"]
 
         response = convert_params(result, ResponseParamType.get_tx_by_hash)
+        if tx_cache.enabled and response_code == message_code.Response.success:
+            response = json_codec.encode_result(response)
+            tx_cache.put(channel, TX_RESPONSE, request["txHash"], response, size=len(response))
         return response
 
     @staticmethod
     @methods.add
     async def icx_getBalance(context: Dict[str, str], **kwargs):
         channel = context.get('channel')
-        method = 'icx_getBalance'
-        request = make_request(method, kwargs)
-        score_stub = get_icon_stub_by_channel_name(channel)
-        response = await score_stub.async_task().query(request)
-
-        return response_to_json_query(response)
+        return await get_query_response(channel, 'icx_getBalance', kwargs)
 
     @staticmethod
     @methods.add
     async def icx_getTotalSupply(context: Dict[str, str], **kwargs):
         channel = context.get('channel')
-
-        method = 'icx_getTotalSupply'
-        request = make_request(method, kwargs)
-        score_stub = get_icon_stub_by_channel_name(channel)
-        response = await score_stub.async_task().query(request)
-
-        return response_to_json_query(response)
+        return await get_query_response(channel, 'icx_getTotalSupply', kwargs)
 
     @staticmethod
     @methods.add
@@ -197,28 +375,17 @@ class IcxDispatcher:
         request = convert_params(kwargs, RequestParamType.get_block)
 
         if "hash" in request:
-            block_hash, result = await get_block_by_params(block_hash=request.get("hash"),
-                                                           channel_name=channel)
+            return await get_block_response(channel, BLOCK_RESPONSE, convert_block,
+                                            block_hash=request.get("hash"),
+                                            passthrough=is_passthrough_block)
         elif "height" in request:
-            block_hash, result = await get_block_by_params(block_height=request.get("height"),
-                                                           channel_name=channel,
-                                                           unconfirmed=request.get("unconfirmed", False))
-
+            return await get_block_response(channel, BLOCK_RESPONSE, convert_block,
+                                            block_height=request.get("height"),
+                                            unconfirmed=request.get("unconfirmed", False),
+                                            passthrough=is_passthrough_block)
         else:
-            block_hash, result = await get_block_by_params(block_height=-1,
-                                                           channel_name=channel)
-
-        response_code = result['response_code']
-        check_response_code(response_code)
-
-        block = result['block']
-        if block['version'] == BLOCK_v0_1a:
-            response = convert_params(result['block'], ResponseParamType.get_block_v0_1a_tx_v3)
-        elif block['version'] == BLOCK_v0_3:
-            response = convert_params(result['block'], ResponseParamType.get_block_v0_3_tx_v3)
-        else:
-            response = block
-        return response_to_json_query(response)
+            return await get_block_response(channel, BLOCK_RESPONSE, convert_block, block_height=-1,
+                                            passthrough=is_passthrough_block)
 
     @staticmethod
     @methods.add
@@ -227,7 +394,8 @@ class IcxDispatcher:
 
         block_hash, result = await get_block_by_params(block_height=-1,
                                                        channel_name=channel)
-        response = convert_params(result['block'], ResponseParamType.get_block_v0_1a_tx_v3)
+        QueryCache().update_height(channel, parse_block_height(result['block'].get('height')))
+        response = convert_block_v0_1a(result['block'])
 
         return response_to_json_query(response)
 
@@ -236,28 +404,16 @@ class IcxDispatcher:
     async def icx_getBlockByHash(context: Dict[str, str], **kwargs):
         channel = context.get('channel')
         request = convert_params(kwargs, RequestParamType.get_block_by_hash)
-        block_hash, result = await get_block_by_params(block_hash=request['hash'],
-                                                       channel_name=channel)
-
-        response_code = result['response_code']
-        check_response_code(response_code)
-
-        response = convert_params(result['block'], ResponseParamType.get_block_v0_1a_tx_v3)
-        return response
+        return await get_block_response(channel, BLOCK_RESPONSE_v0_1a, convert_block_v0_1a,
+                                        block_hash=request['hash'])
 
     @staticmethod
     @methods.add
     async def icx_getBlockByHeight(context: Dict[str, str], **kwargs):
         channel = context.get('channel')
         request = convert_params(kwargs, RequestParamType.get_block_by_height)
-
-        block_hash, result = await get_block_by_params(block_height=request.get("height"),
-                                                       channel_name=channel)
-        response_code = result['response_code']
-        check_response_code(response_code)
-
-        response = convert_params(result['block'], ResponseParamType.get_block_v0_1a_tx_v3)
-        return response
+        return await get_block_response(channel, BLOCK_RESPONSE_v0_1a, convert_block_v0_1a,
+                                        block_height=request.get("height"))
 
     @staticmethod
     @methods.add
@@ -312,22 +468,54 @@ class IcxDispatcher:
                 message='Invalid params (only one parameter is allowed)',
                 http_status=status.HTTP_BAD_REQUEST
             )
+        # receipts of the latest block are not cached
+        block_cache = BlockCache()
+        cacheable = block_cache.enabled and ('hash' in request or 'height' in request)
+        if cacheable:
+            cached = await block_cache.fetch(channel, BLOCK_RECEIPTS_RESPONSE,
+                                             height=request.get('height'), block_hash=request.get('hash'))
+            if cached is not None:
+                return cached
+
+        # receipts are not decoded unless the block hash is needed for the cache
+        passthrough = is_noop_template(ResponseParamType.get_block_receipts, list) and \
+            not (cacheable and 'hash' not in request)
         if 'hash' in request:
             code, block_receipts = await get_block_recipts_by_params(
                 block_hash=request['hash'],
-                channel_name=channel
+                channel_name=channel,
+                passthrough=passthrough
             )
         elif 'height' in request:
             code, block_receipts = await get_block_recipts_by_params(
                 block_height=request['height'],
-                channel_name=channel
+                channel_name=channel,
+                passthrough=passthrough
             )
         else:
             code, block_receipts = await get_block_recipts_by_params(
                 block_height=-1,
-                channel_name=channel
+                channel_name=channel,
+                passthrough=passthrough
             )
 
         check_response_code(code)
+        if isinstance(block_receipts, EncodedResult):
+            if cacheable:
+                block_cache.put(channel, BLOCK_RECEIPTS_RESPONSE, request['hash'], None, block_receipts,
+                                size=len(block_receipts))
+            return block_receipts
         response = convert_params(block_receipts, ResponseParamType.get_block_receipts)
-        return response_to_json_query(response)
+        response = response_to_json_query(response)
+        streamed = StreamedResult(response) if is_streamed_list(response) else None
+        # the block hash and height of receipts are known from the receipts of transactions
+        if cacheable and response and isinstance(response, list) and isinstance(response[0], dict):
+            block_hash = request.get('hash', response[0].get('blockHash'))
+            block_height = request.get('height', parse_block_height(response[0].get('blockHeight')))
+            if streamed is not None:
+                # large receipts are cached after they are streamed
+                stream_to_cache(streamed, block_cache, channel, BLOCK_RECEIPTS_RESPONSE, block_hash, block_height)
+                return streamed
+            response = json_codec.encode_result(response)
+            block_cache.put(channel, BLOCK_RECEIPTS_RESPONSE, block_hash, block_height, response, size=len(response))
+        return streamed if streamed is not None else response
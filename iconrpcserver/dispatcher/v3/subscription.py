@@ -0,0 +1,434 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Subscriptions of clients to new blocks, transaction results and event logs over a websocket.
+
+A client sends icx_subscribe and icx_unsubscribe requests on the socket, and the data of each new block
+which matches its subscriptions is pushed in icx_subscription notifications. While a channel has subscriptions,
+one task of the worker follows it, so each block is fetched once through NewBlockHub,
+and its receipts are fetched once only if an event log is subscribed. The logs of the receipts are matched
+with the event filters of the channel through EventFilterIndex.
+"""
+
+import asyncio
+import itertools
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Iterator, List, Optional, Set, Union
+
+from iconcommons.logger import Logger
+from jsonrpcserver import status
+from jsonrpcserver.methods import Methods
+from websockets import exceptions
+
+from iconrpcserver.components import SingletonMetaClass
+from iconrpcserver.default_conf.icon_rpcserver_constant import ConfigKey
+from iconrpcserver.dispatcher import GenericJsonRpcServerError, JsonError
+from iconrpcserver.utils import json_codec, message_code
+from iconrpcserver.utils.cache import parse_block_height
+from iconrpcserver.utils.event_filter import EventFilterIndex
+from iconrpcserver.utils.json_codec import EncodedResult
+from iconrpcserver.utils.json_rpc import async_dispatch, encode_response, get_block_recipts_by_params
+from iconrpcserver.utils.message_queue.stub_collection import StubCollection
+from iconrpcserver.utils.new_block_hub import NewBlock, NewBlockHub
+from iconrpcserver.utils.ws_send_queue import SendQueue, SendQueues, SlowSubscriberError
+from .icx import TX_LIST_KEYS, get_tx_result_response
+
+if TYPE_CHECKING:
+    from sanic.request import Request as SanicRequest
+    from websockets import WebSocketCommonProtocol
+
+subscription_methods = Methods()
+
+SUBSCRIPTION = "icx_subscription"
+
+# types of subscriptions
+BLOCK = "block"
+TX_RESULT = "txResult"
+EVENT = "event"
+
+# id of the followers of the channels, passed to the channel with announce_new_block
+FOLLOWER_ID = "subscriptions"
+RETRY_DELAY = 1
+# attempts to fetch the result of a transaction or the receipts of a block before its data is skipped
+FETCH_ATTEMPTS = 3
+
+TAG = "WS_SUBSCRIPTION"
+
+
+class SubscriberConnection:
+    """Websocket of a client and its subscriptions"""
+
+    def __init__(self, ws: 'WebSocketCommonProtocol', send_queue: SendQueue, subscriber_id: str):
+        self.ws = ws
+        self.send_queue = send_queue
+        self.subscriber_id = subscriber_id
+        self.subscriptions: Dict[str, 'Subscription'] = {}
+        self.closing = False
+
+    def push(self, subscription_id: str, result: Union[dict, EncodedResult]):
+        """Queue an icx_subscription notification. A slow client is disconnected, since the followers do not wait"""
+        if self.closing:
+            return
+
+        data = result.data.decode() if isinstance(result, EncodedResult) else json_codec.dumps(result)
+        frame = ''.join(('{"jsonrpc": "2.0", "method": "', SUBSCRIPTION, '", "params": {"subscription": "',
+                         subscription_id, '", "result": ', data, '}}'))
+        try:
+            self.send_queue.put_nowait(frame)
+        except SlowSubscriberError as e:
+            Logger.warning(f"Disconnect slow subscriber({self.subscriber_id}): {e}", TAG)
+            self.close()
+        except exceptions.ConnectionClosed:
+            self.closing = True
+
+    def close(self):
+        self.closing = True
+        asyncio.ensure_future(self.ws.close())
+
+
+class Subscription:
+    __slots__ = ("id", "channel", "type", "params", "connection", "last_height")
+
+    def __init__(self, subscription_id: str, channel: str, type_: str, params: dict,
+                 connection: SubscriberConnection):
+        """
+        :param params: txHash of TX_RESULT. event(signature) and addr(optional SCORE address) of EVENT
+        """
+        self.id = subscription_id
+        self.channel = channel
+        self.type = type_
+        self.params = params
+        self.connection = connection
+        # height of the last block whose data is pushed, so a block published again is not pushed again
+        self.last_height = -1
+
+    def push(self, result: Union[dict, EncodedResult]):
+        self.connection.push(self.id, result)
+
+
+class SubscriptionHub(metaclass=SingletonMetaClass):
+    """Subscriptions of the clients of a worker by channel, and the followers of the channels"""
+
+    def __init__(self, max_subscriptions: int = 0):
+        """
+        :param max_subscriptions: subscriptions of a connection. 0 means no limit
+        """
+        self.max_subscriptions = max_subscriptions
+        self.blocks = 0
+        self.receipts = 0
+        self.pushes = 0
+        self._subscriptions: Dict[str, Dict[str, Subscription]] = {}
+        self._event_filters: Dict[str, EventFilterIndex[Subscription]] = {}
+        self._followers: Dict[str, asyncio.Future] = {}
+        self._tasks: Set[asyncio.Future] = set()
+        self._ids = itertools.count(1)
+
+    def subscribe(self, channel: str, connection: SubscriberConnection, type_: str, params: dict) -> Subscription:
+        if 0 < self.max_subscriptions <= len(connection.subscriptions):
+            raise GenericJsonRpcServerError(
+                code=JsonError.INVALID_REQUEST,
+                message=f"Too many subscriptions, max {self.max_subscriptions}",
+                http_status=status.HTTP_BAD_REQUEST
+            )
+
+        subscription = Subscription(hex(next(self._ids)), channel, type_, params, connection)
+        self._subscriptions.setdefault(channel, {})[subscription.id] = subscription
+        connection.subscriptions[subscription.id] = subscription
+        if type_ == EVENT:
+            event_filters = self._event_filters.setdefault(channel, EventFilterIndex())
+            event_filters.add(params["event"], params["addr"], subscription.id, subscription)
+        if channel not in self._followers:
+            self._followers[channel] = asyncio.ensure_future(self._follow(channel))
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Remove the subscription. The follower of its channel stops with the last subscription of the channel"""
+        subscription.connection.subscriptions.pop(subscription.id, None)
+        subscriptions = self._subscriptions.get(subscription.channel, {})
+        subscriptions.pop(subscription.id, None)
+        if subscription.type == EVENT:
+            event_filters = self._event_filters.get(subscription.channel)
+            if event_filters is not None:
+                event_filters.remove(subscription.params["event"], subscription.params["addr"], subscription.id)
+                if not event_filters:
+                    del self._event_filters[subscription.channel]
+        if subscriptions:
+            return
+
+        self._subscriptions.pop(subscription.channel, None)
+        follower = self._followers.pop(subscription.channel, None)
+        if follower is not None:
+            follower.cancel()
+
+    def unsubscribe_all(self, connection: SubscriberConnection):
+        for subscription in list(connection.subscriptions.values()):
+            self.unsubscribe(subscription)
+
+    def stats(self) -> dict:
+        return {
+            "subscriptions": sum(len(subscriptions) for subscriptions in self._subscriptions.values()),
+            "channels": len(self._followers),
+            "blocks": self.blocks,
+            "receipts": self.receipts,
+            "pushes": self.pushes,
+        }
+
+    async def _follow(self, channel: str):
+        """Publish the blocks of the channel from the next block"""
+        new_block_hub = NewBlockHub()
+        height: Optional[int] = None
+        while True:
+            try:
+                if height is None:
+                    last_height = await new_block_hub.last_height(channel)
+                    if last_height is None:
+                        raise RuntimeError("The last height is unknown")
+                    height = last_height + 1
+
+                new_block = await new_block_hub.get(channel, height, FOLLOWER_ID)
+                if new_block is None:
+                    raise RuntimeError(f"The block {height} is not announced")
+                # the channel may announce another block than the one asked
+                height = max(height, await self._publish(channel, new_block)) + 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                Logger.warning(f"Cannot follow {channel}: {type(e)} {e}", TAG)
+                await asyncio.sleep(RETRY_DELAY)
+
+    async def _publish(self, channel: str, new_block: NewBlock) -> int:
+        """Push the data of the block to the subscriptions which match it.
+
+        The receipts are fetched before the block is pushed, and fetched again on their own if they fail.
+        The results of transactions are fetched and pushed by other tasks, so a slow result does not hold the blocks.
+        A subscription is pushed the data of a block once, even if the block is published again.
+
+        :return: height of the block
+        """
+        self.blocks += 1
+        block = new_block.block
+        height = parse_block_height(block.get("height"))
+        if height is None:
+            height = new_block.height
+
+        block_subscriptions: List[Subscription] = []
+        tx_subscriptions: Dict[str, List[Subscription]] = {}
+        for subscription in self._subscriptions.get(channel, {}).values():
+            if subscription.type == BLOCK:
+                block_subscriptions.append(subscription)
+            elif subscription.type == TX_RESULT:
+                tx_subscriptions.setdefault(subscription.params["txHash"], []).append(subscription)
+
+        for tx_hash in get_tx_hashes(block):
+            subscriptions = tx_subscriptions.get(tx_hash)
+            if subscriptions:
+                self._spawn(self._push_tx_results(channel, tx_hash, subscriptions))
+
+        receipts: Optional[list] = None
+        if self._event_filters.get(channel):
+            receipts = await self._fetch(f"the receipts of the block {height}", self._get_receipts, channel, height)
+
+        # the subscriptions may be removed while the receipts are fetched
+        block_hash = to_hex_hash(block.get("hash") or block.get("block_hash", ""))
+        for subscription in block_subscriptions:
+            if subscription.id in subscription.connection.subscriptions and subscription.last_height < height:
+                self._push(subscription, {"height": hex(height), "hash": block_hash})
+                subscription.last_height = height
+
+        if receipts:
+            event_filters = self._event_filters.get(channel, EventFilterIndex())
+            pushed: List[Subscription] = []
+            for receipt in receipts:
+                for index, event_log in enumerate(receipt.get("eventLogs") or ()):
+                    result: Optional[EncodedResult] = None
+                    for subscription in event_filters.match(event_log):
+                        if subscription.last_height >= height:
+                            continue
+                        if result is None:
+                            # encoded once for the subscriptions matching the log
+                            result = json_codec.encode_result({
+                                "height": hex(height), "hash": block_hash,
+                                "txHash": to_hex_hash(receipt.get("txHash", "")), "index": hex(index), "log": event_log
+                            })
+                        self._push(subscription, result)
+                        pushed.append(subscription)
+            for subscription in pushed:
+                subscription.last_height = height
+        return height
+
+    def push_tx_result(self, subscription: Subscription, result: Union[dict, EncodedResult]):
+        """Push the result of the transaction once and remove the subscription"""
+        if subscription.id not in subscription.connection.subscriptions:
+            return
+        self._push(subscription, result)
+        self.unsubscribe(subscription)
+
+    def push_committed_tx_result(self, subscription: Subscription):
+        """Push the result of the transaction in another task, if it is committed before the subscription"""
+        async def _push_committed_tx_result():
+            try:
+                result = await get_tx_result_response(subscription.channel, subscription.params["txHash"])
+            except Exception:
+                # not committed yet, or unknown. the result is pushed with the block of the transaction
+                return
+            self.push_tx_result(subscription, result)
+
+        self._spawn(_push_committed_tx_result())
+
+    async def _push_tx_results(self, channel: str, tx_hash: str, subscriptions: List[Subscription]):
+        result = await self._fetch(f"the result of {tx_hash}", get_tx_result_response, channel, tx_hash)
+        if result is not None:
+            for subscription in subscriptions:
+                self.push_tx_result(subscription, result)
+
+    def _spawn(self, coro: Awaitable):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self, what: str, fetch: Callable[..., Awaitable], *args):
+        """Result of the fetch, tried FETCH_ATTEMPTS times. None if it keeps failing"""
+        for attempt in range(1, FETCH_ATTEMPTS + 1):
+            try:
+                return await fetch(*args)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                Logger.warning(f"Cannot get {what}({attempt}/{FETCH_ATTEMPTS}): {type(e)} {e}", TAG)
+                if attempt < FETCH_ATTEMPTS:
+                    await asyncio.sleep(RETRY_DELAY)
+        return None
+
+    async def _get_receipts(self, channel: str, height: int) -> list:
+        self.receipts += 1
+        response_code, receipts = await get_block_recipts_by_params(channel, block_height=height)
+        if response_code != message_code.Response.success or not isinstance(receipts, list):
+            raise RuntimeError(f"response code {response_code}")
+        return receipts
+
+    def _push(self, subscription: Subscription, result: Union[dict, EncodedResult]):
+        self.pushes += 1
+        subscription.push(result)
+
+
+def to_hex_hash(value: str) -> str:
+    value = value.lower()
+    return value if value.startswith("0x") else "0x" + value
+
+
+def get_tx_hashes(block: dict) -> Iterator[str]:
+    """Hashes of the transactions in the block of any version, prefixed with 0x"""
+    for key in TX_LIST_KEYS:
+        for tx in block.get(key) or ():
+            tx_hash = tx.get("txHash") or tx.get("tx_hash")
+            if tx_hash:
+                yield to_hex_hash(tx_hash)
+
+
+def _is_hash(value) -> bool:
+    try:
+        return isinstance(value, str) and value.startswith("0x") and len(value) == 66 and int(value, 16) >= 0
+    except ValueError:
+        return False
+
+
+def _invalid_params(message: str) -> GenericJsonRpcServerError:
+    return GenericJsonRpcServerError(
+        code=JsonError.INVALID_PARAMS,
+        message=message,
+        http_status=status.HTTP_BAD_REQUEST
+    )
+
+
+class SubscriptionDispatcher:
+    @staticmethod
+    async def dispatch(request: 'SanicRequest', ws: 'WebSocketCommonProtocol', channel_name: str = ""):
+        ip = request.remote_addr or request.ip
+        subscriber_id = f"{ip}:{request.port}"
+        channel = channel_name if channel_name else StubCollection().conf[ConfigKey.CHANNEL]
+        Logger.info(f"Subscriber({subscriber_id}) is connected to {channel}", TAG)
+
+        subscription_hub = SubscriptionHub()
+        try:
+            async with SendQueues().open(ws, subscriber_id) as send_queue:
+                connection = SubscriberConnection(ws, send_queue, subscriber_id)
+                context = {
+                    "channel": channel,
+                    "connection": connection
+                }
+                try:
+                    while True:
+                        ws_request = await ws.recv()
+                        response = await async_dispatch(ws_request, subscription_methods, context=context)
+                        if response.wanted:
+                            await send_queue.put(encode_response(response).decode())
+                finally:
+                    subscription_hub.unsubscribe_all(connection)
+        except exceptions.ConnectionClosed:
+            Logger.info(f"Subscriber({subscriber_id}) is disconnected", TAG)
+        except SlowSubscriberError as e:
+            Logger.warning(f"Disconnect slow subscriber({subscriber_id}): {e}", TAG)
+            await ws.close()
+
+    @staticmethod
+    @subscription_methods.add
+    async def icx_subscribe(context, **kwargs):
+        """Subscribe to the new blocks, the result of a transaction, or the event logs of a signature
+
+        :return: id of the subscription, which is pushed with the results
+        """
+        channel = context.get("channel")
+        if channel not in StubCollection().channel_stubs:
+            raise GenericJsonRpcServerError(
+                code=JsonError.INVALID_REQUEST,
+                message="Invalid channel name",
+                http_status=status.HTTP_BAD_REQUEST
+            )
+
+        type_ = kwargs.get("type")
+        if type_ == BLOCK:
+            params = {}
+        elif type_ == TX_RESULT:
+            tx_hash = kwargs.get("txHash")
+            if not _is_hash(tx_hash):
+                raise _invalid_params("Invalid params txHash")
+            params = {"txHash": tx_hash.lower()}
+        elif type_ == EVENT:
+            event, addr = kwargs.get("event"), kwargs.get("addr")
+            if not event or not isinstance(event, str):
+                raise _invalid_params("Invalid params event")
+            if addr is not None and not (isinstance(addr, str) and addr.startswith("cx") and len(addr) == 42):
+                raise _invalid_params("Invalid params addr")
+            params = {"event": event, "addr": addr}
+        else:
+            raise _invalid_params(f"Invalid params type, one of {BLOCK}, {TX_RESULT} and {EVENT}")
+
+        subscription_hub = SubscriptionHub()
+        subscription = subscription_hub.subscribe(channel, context.get("connection"), type_, params)
+        if type_ == TX_RESULT:
+            # checked after the subscription, so a transaction committed meanwhile is pushed by the follower.
+            # the result is pushed after the response in most cases, since the check waits for the channel
+            subscription_hub.push_committed_tx_result(subscription)
+        return subscription.id
+
+    @staticmethod
+    @subscription_methods.add
+    async def icx_unsubscribe(context, **kwargs):
+        """
+        :return: whether the subscription of the connection is removed
+        """
+        connection: SubscriberConnection = context.get("connection")
+        subscription = connection.subscriptions.get(kwargs.get("subscription"))
+        if subscription is None:
+            return False
+        SubscriptionHub().unsubscribe(subscription)
+        return True
@@ -1,10 +1,8 @@
 """json rpc dispatcher version 3"""
 
-import json
 from typing import TYPE_CHECKING, Union
 
 from iconcommons.logger import Logger
-from jsonrpcserver import async_dispatch
 from jsonrpcserver.methods import Methods
 from jsonrpcserver.response import ExceptionResponse, ApiErrorResponse
 from sanic import response as sanic_response
@@ -13,6 +11,8 @@ from iconrpcserver.default_conf.icon_rpcserver_constant import ConfigKey
 from iconrpcserver.default_conf.icon_rpcserver_constant import DISPATCH_V3_TAG
 from iconrpcserver.dispatcher import GenericJsonRpcServerError
 from iconrpcserver.dispatcher import validate_jsonschema_v3
+from iconrpcserver.utils import json_codec
+from iconrpcserver.utils.json_rpc import async_dispatch, encode_response, is_streamed, stream_response
 from iconrpcserver.utils.message_queue.stub_collection import StubCollection
 
 if TYPE_CHECKING:
@@ -25,7 +25,7 @@ methods = Methods()
 class Version3Dispatcher:
     @staticmethod
     async def dispatch(request: 'SanicRequest', channel_name: str = ""):
-        req_json = request.json
+        req_json = request.load_json(loads=json_codec.loads)
         url = request.url
         channel = channel_name if channel_name else StubCollection().conf[ConfigKey.CHANNEL]
 
@@ -40,7 +40,9 @@ class Version3Dispatcher:
             Logger.info(f'rest_server_v3 request with {req_json}', DISPATCH_V3_TAG)
             Logger.info(f"{client_ip} requested {req_json} on {url}")
 
-            validate_jsonschema_v3(request=req_json)
+            # each request of a batch is validated on its own, so an invalid one does not fail the others
+            if not isinstance(req_json, list):
+                validate_jsonschema_v3(request=req_json)
         except GenericJsonRpcServerError as e:
             response = ApiErrorResponse(id=req_json.get('id', 0),
                                         code=e.code,
@@ -51,6 +53,12 @@ class Version3Dispatcher:
             Logger.exception(e)
             response = ExceptionResponse(e, id=req_json.get('id', 0), debug=False)
         else:
-            response = await async_dispatch(request.body, methods, context=context)
-        Logger.info(f'rest_server_v3 with response {response}', DISPATCH_V3_TAG)
-        return sanic_response.json(response.deserialized(), status=response.http_status, dumps=json.dumps)
+            response = await async_dispatch(request.body, methods, deserialized=req_json, context=context,
+                                            validator=validate_jsonschema_v3,
+                                            concurrency=StubCollection().conf.get(ConfigKey.BATCH_CONCURRENCY, 0))
+        if is_streamed(response):
+            Logger.info(f'rest_server_v3 with streamed response of id {response.id}', DISPATCH_V3_TAG)
+            return stream_response(response)
+        body = encode_response(response)
+        Logger.info(f'rest_server_v3 with response {body.decode()}', DISPATCH_V3_TAG)
+        return sanic_response.raw(body, status=response.http_status, content_type="application/json")
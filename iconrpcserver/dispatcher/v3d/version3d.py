@@ -12,11 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import json
 from typing import TYPE_CHECKING, Union
 
 from iconcommons.logger import Logger
-from jsonrpcserver import async_dispatch
 from jsonrpcserver.methods import Methods
 from jsonrpcserver.response import ExceptionResponse, ApiErrorResponse
 from sanic import response as sanic_response
@@ -24,9 +22,10 @@ from sanic import response as sanic_response
 from iconrpcserver.default_conf.icon_rpcserver_constant import ConfigKey, DISPATCH_V3D_TAG
 from iconrpcserver.dispatcher import GenericJsonRpcServerError
 from iconrpcserver.dispatcher import validate_jsonschema_v3
+from iconrpcserver.utils import json_codec
 from iconrpcserver.utils.icon_service import response_to_json_query
 from iconrpcserver.utils.icon_service.converter import make_request
-from iconrpcserver.utils.json_rpc import get_icon_stub_by_channel_name
+from iconrpcserver.utils.json_rpc import async_dispatch, encode_response, get_icon_stub_by_channel_name
 from iconrpcserver.utils.message_queue.stub_collection import StubCollection
 
 if TYPE_CHECKING:
@@ -43,7 +42,7 @@ class Version3DebugDispatcher:
     """
     @staticmethod
     async def dispatch(request: 'SanicRequest', channel_name: str = ""):
-        req_json = request.json
+        req_json = request.load_json(loads=json_codec.loads)
         url = request.url
         channel = channel_name if channel_name else StubCollection().conf[ConfigKey.CHANNEL]
 
@@ -58,7 +57,9 @@ class Version3DebugDispatcher:
             Logger.info(f'rest_server_v3d request with {req_json}', DISPATCH_V3D_TAG)
             Logger.info(f"{client_ip} requested {req_json} on {url}")
 
-            validate_jsonschema_v3(request=req_json)
+            # each request of a batch is validated on its own, so an invalid one does not fail the others
+            if not isinstance(req_json, list):
+                validate_jsonschema_v3(request=req_json)
         except GenericJsonRpcServerError as e:
             response = ApiErrorResponse(id=req_json.get('id', 0),
                                         code=e.code,
@@ -68,9 +69,12 @@ class Version3DebugDispatcher:
         except Exception as e:
             response = ExceptionResponse(e, id=req_json.get('id', 0), debug=False)
         else:
-            response = await async_dispatch(request.body, methods, context=context)
-        Logger.info(f'rest_server_v3d with response {response}', DISPATCH_V3D_TAG)
-        return sanic_response.json(response.deserialized(), status=response.http_status, dumps=json.dumps)
+            response = await async_dispatch(request.body, methods, deserialized=req_json, context=context,
+                                            validator=validate_jsonschema_v3,
+                                            concurrency=StubCollection().conf.get(ConfigKey.BATCH_CONCURRENCY, 0))
+        body = encode_response(response)
+        Logger.info(f'rest_server_v3d with response {body.decode()}', DISPATCH_V3D_TAG)
+        return sanic_response.raw(body, status=response.http_status, content_type="application/json")
 
     @staticmethod
     @methods.add
@@ -14,15 +14,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import re
 import copy
-from typing import Union, List, Dict, Optional
+from typing import Union, List, Dict, Optional, Tuple
 
+from iconcommons.logger import Logger
 from jsonrpcserver import status
 from jsonschema import Draft4Validator, FormatChecker
 from jsonschema.exceptions import ValidationError
 
 from .exception import GenericJsonRpcServerError, JsonError
+from .schema_compiler import CompiledValidator, UnsupportedSchemaError, compile_schema
+from ..utils.hexadecimal import is_lowercase_hex
 
 node_getChannelInfos: dict = {
     "title": "node_getChannelInfos",
@@ -796,20 +798,17 @@ def validate_jsonschema(request: Union[List, Dict], schemas: dict = SCHEMA_V3):
             validate_jsonschema(req, schemas=schemas)
         return
 
-    # get schema for 'method'
-    schema: Optional[Dict] = None
+    # get validator for 'method'
+    validator: Union[Draft4Validator, CompiledValidator, None] = None
     method = request.get('method', None)
 
     if method and isinstance(method, str):
-        schema = schemas.get(method, None)
-    if schema is None:
+        validator = get_validators(schemas).get(method, None)
+    if validator is None:
         raise GenericJsonRpcServerError(code=JsonError.METHOD_NOT_FOUND,
                                         message=f"JSON schema validation error: Method not found",
                                         http_status=status.HTTP_BAD_REQUEST)
 
-    # create a new validator with format_checker
-    validator = Draft4Validator(schema=schema, format_checker=format_checker)
-
     # check request
     try:
         validator.validate(request)
@@ -835,14 +834,7 @@ def is_lowercase_hex_string(value: str) -> bool:
     :param value: text
     :return: True(lowercase hexadecimal) otherwise False
     """
-
-    try:
-        result = re.match('[0-9a-f]+', value)
-        return len(result.group(0)) == len(value)
-    except:
-        pass
-
-    return False
+    return is_lowercase_hex(value)
 
 
 format_checker = FormatChecker()
@@ -850,8 +842,8 @@ format_checker = FormatChecker()
 
 @format_checker.checks('address')
 def check_address(address: str):
-    if isinstance(address, str) and len(address) == 42 and is_lowercase_hex_string(address[2:]) \
-            and (address.startswith('cx') or address.startswith('hx')):
+    if isinstance(address, str) and len(address) == 42 \
+            and is_lowercase_hex(address, 'hx' if address.startswith('hx') else 'cx'):
         return True
 
     return False
@@ -859,8 +851,7 @@ def check_address(address: str):
 
 @format_checker.checks('address_eoa')
 def check_address_eoa(address: str):
-    if isinstance(address, str) and len(address) == 42 and is_lowercase_hex_string(address[2:]) \
-            and address.startswith('hx'):
+    if isinstance(address, str) and len(address) == 42 and is_lowercase_hex(address, 'hx'):
         return True
 
     return False
@@ -868,8 +859,7 @@ def check_address_eoa(address: str):
 
 @format_checker.checks('address_score')
 def check_address_score(address: str):
-    if isinstance(address, str) and len(address) == 42 and is_lowercase_hex_string(address[2:]) \
-            and address.startswith('cx'):
+    if isinstance(address, str) and len(address) == 42 and is_lowercase_hex(address, 'cx'):
         return True
 
     return False
@@ -888,7 +878,7 @@ def check_int_10(value: str):
 
 @format_checker.checks('int_16')
 def check_int_16(value: str):
-    if isinstance(value, str) and value.startswith('0x') and is_lowercase_hex_string(value[2:]):
+    if isinstance(value, str) and is_lowercase_hex(value, '0x'):
         return True
 
     return False
@@ -896,7 +886,7 @@ def check_int_16(value: str):
 
 @format_checker.checks('hash')
 def check_hash(value: str):
-    if isinstance(value, str) and len(value) == 66 and value.startswith('0x') and is_lowercase_hex_string(value[2:]):
+    if isinstance(value, str) and len(value) == 66 and is_lowercase_hex(value, '0x'):
         return True
 
     return False
@@ -904,7 +894,7 @@ def check_hash(value: str):
 
 @format_checker.checks('hash_v2')
 def check_hash_v2(value: str):
-    if isinstance(value, str) and len(value) == 64 and is_lowercase_hex_string(value):
+    if isinstance(value, str) and len(value) == 64 and is_lowercase_hex(value):
         return True
 
     return False
@@ -912,7 +902,75 @@ def check_hash_v2(value: str):
 
 @format_checker.checks('binary_data')
 def check_binary_data(value: str):
-    if isinstance(value, str) and len(value) % 2 == 0 and value.startswith('0x') and is_lowercase_hex_string(value[2:]):
+    if isinstance(value, str) and len(value) % 2 == 0 and is_lowercase_hex(value, '0x'):
         return True
 
     return False
+
+
+# validators are compiled once per schema collection and reused for every request.
+# key: (id(schemas), compiled), value: (schemas, {method: validator})
+_validator_registry: Dict[Tuple[int, bool], Tuple[dict, Dict[str, Union[Draft4Validator, CompiledValidator]]]] = {}
+_compiled_validation: bool = False
+
+
+def compile_validators(schemas: dict,
+                       compiled: bool = False) -> Dict[str, Union[Draft4Validator, CompiledValidator]]:
+    """Create a validator with format_checker for each method in schemas
+
+    :param schemas: The schema collection. e.g. SCHEMA_V3
+    :param compiled: generate specialized validation functions instead of Draft4Validator if possible
+    :return: validators by method name
+    """
+    validators = {}
+    for method, schema in schemas.items():
+        validator = None
+        if compiled:
+            try:
+                validator = compile_schema(schema, format_checker, name=method)
+            except UnsupportedSchemaError as e:
+                Logger.warning(f"Use Draft4Validator for {method}. {e}")
+        if validator is None:
+            validator = Draft4Validator(schema=schema, format_checker=format_checker)
+        validators[method] = validator
+
+    return validators
+
+
+def get_validators(schemas: dict,
+                   compiled: Optional[bool] = None) -> Dict[str, Union[Draft4Validator, CompiledValidator]]:
+    """Get the compiled validators of schemas. Unknown schemas are compiled and registered on first use.
+
+    :param schemas: The schema collection. e.g. SCHEMA_V3
+    :param compiled: validators of compiled validation mode. current mode is used if None
+    :return: validators by method name
+    """
+    if compiled is None:
+        compiled = _compiled_validation
+
+    key = (id(schemas), compiled)
+    entry = _validator_registry.get(key)
+    if entry is None:
+        # keep a reference to schemas so that its id is never reused while registered
+        entry = (schemas, compile_validators(schemas, compiled))
+        _validator_registry[key] = entry
+
+    return entry[1]
+
+
+def set_compiled_validation(enabled: bool):
+    """Turn on/off compiled validation mode.
+
+    In compiled validation mode, python validation functions generated from the schemas are used
+    instead of Draft4Validator. Error messages are the same in both modes.
+    """
+    global _compiled_validation
+    _compiled_validation = enabled
+
+    if enabled:
+        for schemas in (SCHEMA_NODE, SCHEMA_V2, SCHEMA_V3):
+            get_validators(schemas, compiled=True)
+
+
+for _schemas in (SCHEMA_NODE, SCHEMA_V2, SCHEMA_V3):
+    get_validators(_schemas)
@@ -27,6 +27,7 @@ from iconrpcserver.default_conf.icon_rpcserver_config import default_rpcserver_c
 from iconrpcserver.default_conf.icon_rpcserver_constant import ConfigKey
 from iconrpcserver.icon_rpcserver_cli import ICON_RPCSERVER_CLI, ExitCode
 from iconrpcserver.server.rest_server import ServerComponents
+from iconrpcserver.utils.shared_cache import start_shared_cache_process
 
 
 class StandaloneApplication(gunicorn.app.base.BaseApplication):
@@ -142,6 +143,12 @@ async def _run(conf: 'IconConfig'):
         'capture_output': False
     })
 
+    # Start the cache process shared by the workers.
+    if conf.get(ConfigKey.SHARED_CACHE_PATH):
+        start_shared_cache_process(conf[ConfigKey.SHARED_CACHE_PATH],
+                                   conf.get(ConfigKey.SHARED_CACHE_SIZE, 0),
+                                   conf.get(ConfigKey.SHARED_CACHE_BYTES, 0))
+
     # Launch gunicorn web server.
     ServerComponents.conf = conf
     ServerComponents().ready()
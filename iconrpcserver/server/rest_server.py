@@ -28,9 +28,15 @@ from ..components import SingletonMetaClass
 from ..default_conf.icon_rpcserver_constant import ConfigKey, SSLAuthType
 from ..dispatcher.default import NodeDispatcher, WSDispatcher
 from ..dispatcher.v2 import Version2Dispatcher
-from ..dispatcher.v3 import Version3Dispatcher
+from ..dispatcher.v3 import SubscriptionDispatcher, SubscriptionHub, Version3Dispatcher
 from ..dispatcher.v3d import Version3DebugDispatcher
+from ..utils.cache import BlockCache, QueryCache, TransactionCache
+from ..utils.message_queue.icon_score_inner_stub import QueryBatcher
 from ..utils.message_queue.stub_collection import StubCollection
+from ..utils.new_block_hub import NewBlockHub
+from ..utils.relay import RelayBatcher, RelayHealthTracker, RelaySessionPool
+from ..utils.shared_cache import SharedCacheClient
+from ..utils.ws_send_queue import CATCH_UP, SendQueues
 
 
 class ServerComponents(metaclass=SingletonMetaClass):
@@ -46,6 +52,35 @@ class ServerComponents(metaclass=SingletonMetaClass):
         from iconrpcserver.utils import json_rpc
         json_rpc.monkey_patch()
 
+        # use validation functions generated from JSON schemas instead of jsonschema validators
+        from iconrpcserver.dispatcher import validator
+        validator.set_compiled_validation(ServerComponents.conf.get(ConfigKey.COMPILED_VALIDATION, False))
+
+        # 'json', 'ujson', 'orjson' or 'auto'
+        from iconrpcserver.utils import json_codec
+        json_codec.set_json_codec(ServerComponents.conf.get(ConfigKey.JSON_CODEC, "json"))
+
+        # each worker caches encoded responses of confirmed blocks and transactions,
+        # backed by the cache process shared by the workers if sharedCachePath is set
+        shared_cache = SharedCacheClient(ServerComponents.conf.get(ConfigKey.SHARED_CACHE_PATH, ""))
+        shared_cache = shared_cache if shared_cache.enabled else None
+        BlockCache(ServerComponents.conf.get(ConfigKey.BLOCK_CACHE_SIZE, 0),
+                   ServerComponents.conf.get(ConfigKey.BLOCK_CACHE_BYTES, 0),
+                   shared=shared_cache)
+        TransactionCache(ServerComponents.conf.get(ConfigKey.TX_CACHE_SIZE, 0),
+                         ServerComponents.conf.get(ConfigKey.TX_CACHE_BYTES, 0),
+                         ServerComponents.conf.get(ConfigKey.TX_NOT_INVOKED_TTL, 0),
+                         shared=shared_cache,
+                         not_invoked_size=ServerComponents.conf.get(ConfigKey.TX_NOT_INVOKED_SIZE, 4096))
+        # results of queries are cached until a new block is committed. disabled by default
+        QueryCache(ServerComponents.conf.get(ConfigKey.QUERY_CACHE_SIZE, 0),
+                   ServerComponents.conf.get(ConfigKey.QUERY_CACHE_BYTES, 0),
+                   ServerComponents.conf.get(ConfigKey.QUERY_CACHE_HEIGHT_TTL, 0.5))
+
+        # concurrent identical read-only calls to loopchain and icon service share one call
+        from iconrpcserver.utils import message_queue
+        message_queue.set_stub_single_flight(ServerComponents.conf.get(ConfigKey.STUB_SINGLE_FLIGHT, False))
+
         # Decide whether to create context or not according to whether SSL is applied
 
         rest_ssl_type = ServerComponents.conf[ConfigKey.REST_SSL_TYPE]
@@ -100,6 +135,8 @@ class ServerComponents(metaclass=SingletonMetaClass):
         self.__app.add_route(Avail.as_view(), '/api/v1/avail/peer')
 
         self.__app.add_websocket_route(WSDispatcher.dispatch, '/api/ws/<channel_name:str>')
+        self.__app.add_websocket_route(SubscriptionDispatcher.dispatch, '/api/v3/<channel_name:str>/subscribe')
+        self.__app.add_websocket_route(SubscriptionDispatcher.dispatch, '/api/v3/subscribe')
 
     def ready(self):
         StubCollection().amqp_target = ServerComponents.conf[ConfigKey.AMQP_TARGET]
@@ -123,8 +160,44 @@ class ServerComponents(metaclass=SingletonMetaClass):
                     await StubCollection().create_channel_tx_creator_stub(channel_name)
                     await StubCollection().create_icon_score_stub(channel_name)
 
+            # connections to relay targets are kept alive in each worker
+            RelaySessionPool(self.conf.get(ConfigKey.RELAY_POOL_SIZE, 0),
+                             self.conf.get(ConfigKey.RELAY_KEEPALIVE_TIMEOUT, 15),
+                             self.conf.get(ConfigKey.RELAY_TIMEOUT, 10))
+            # relays are sent in batches of up to relayBatchSize, waiting relayBatchDelay seconds at most.
+            # disabled by default
+            RelayBatcher(self.conf.get(ConfigKey.RELAY_BATCH_SIZE, 0),
+                         self.conf.get(ConfigKey.RELAY_BATCH_DELAY, 0.005))
+            # a relay target is skipped for relayCircuitOpenDuration seconds after relayFailureThreshold failures,
+            # and relays go to relayAlternates(e.g. "https://host:9000") meanwhile
+            RelayHealthTracker(self.conf.get(ConfigKey.RELAY_FAILURE_THRESHOLD, 0),
+                               self.conf.get(ConfigKey.RELAY_CIRCUIT_OPEN_DURATION, 10),
+                               self.conf.get(ConfigKey.RELAY_ALTERNATES, []))
+            # queries called together are sent to iconservice in query_batch messages of up to queryBatchSize.
+            # disabled by default, since iconservice should answer query_batch.
+            # a batch not answered in queryBatchTimeout seconds is queried one by one
+            QueryBatcher(self.conf.get(ConfigKey.QUERY_BATCH_SIZE, 0),
+                         self.conf.get(ConfigKey.QUERY_BATCH_DELAY, 0.001),
+                         self.conf.get(ConfigKey.QUERY_BATCH_TIMEOUT, 5))
+            # frames of the latest wsBlockFrames blocks are kept for the websocket subscribers,
+            # and subscribers behind the last height get wsCatchUpBlocks blocks at a time
+            NewBlockHub(self.conf.get(ConfigKey.WS_BLOCK_FRAMES, 0),
+                        self.conf.get(ConfigKey.WS_CATCH_UP_BLOCKS, 0))
+            # frames to a websocket subscriber are queued up to wsSendHighWatermark.
+            # then wsSlowSubscriber decides: "catchUp" drops the queued blocks and catches up from them
+            # after the queue drains to wsSendLowWatermark, "disconnect" disconnects it
+            SendQueues(self.conf.get(ConfigKey.WS_SEND_HIGH_WATERMARK, 0),
+                       self.conf.get(ConfigKey.WS_SEND_LOW_WATERMARK, 0),
+                       self.conf.get(ConfigKey.WS_SLOW_SUBSCRIBER, CATCH_UP))
+            # clients subscribe to blocks, transaction results and event logs up to wsMaxSubscriptions each
+            SubscriptionHub(self.conf.get(ConfigKey.WS_MAX_SUBSCRIPTIONS, 0))
+
             Logger.debug(f'rest_server:initialize complete.')
 
+        @self.__app.listener("after_server_stop")
+        async def close_tasks(app, loop):
+            await RelaySessionPool().close()
+
     def serve(self, api_port):
         self.ready()
         self.__app.run(host='0.0.0.0', port=api_port, debug=False, ssl=self.ssl_context)
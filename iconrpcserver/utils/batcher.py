@@ -0,0 +1,101 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+
+class _Batch:
+    __slots__ = ("requests", "futures", "timer")
+
+    def __init__(self):
+        self.requests: List[Any] = []
+        self.futures: List[asyncio.Future] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class Batcher:
+    """Requests with the same key are gathered and sent as a batch.
+
+    A batch is sent when it has max_items requests, or max_delay seconds after its first request.
+    So max_delay is the latency added to a request under light load.
+    """
+
+    def __init__(self, max_items: int = 0, max_delay: float = 0.005):
+        """
+        :param max_items: requests in a batch. 0 or 1 disables the batcher
+        :param max_delay: seconds to wait for more requests
+        """
+        self.max_items = max_items
+        self.max_delay = max_delay
+        self.batches = 0
+        self.requests = 0
+        self._batches: Dict[Hashable, _Batch] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_items > 1
+
+    async def submit(self, key: Hashable, request: Any, send: Callable[[List[Any]], Awaitable[List[Any]]]) -> Any:
+        """Put the request into the batch of key, and wait for its result
+
+        :param key: requests of the same key are sent together, e.g. URI of the relay target
+        :param send: sends a batch. it returns the result or the exception of each request in order
+        :return: the result of the request
+        """
+        loop = asyncio.get_event_loop()
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = self._batches[key] = _Batch()
+            batch.timer = loop.call_later(self.max_delay, self._flush, key, send)
+
+        future = loop.create_future()
+        batch.requests.append(request)
+        batch.futures.append(future)
+        if len(batch.requests) >= self.max_items:
+            self._flush(key, send)
+        return await future
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "batch_size": self.requests / self.batches if self.batches else 0.0,
+        }
+
+    def _flush(self, key: Hashable, send: Callable[[List[Any]], Awaitable[List[Any]]]):
+        batch = self._batches.pop(key, None)
+        if batch is not None:
+            batch.timer.cancel()
+            self.batches += 1
+            self.requests += len(batch.requests)
+            asyncio.ensure_future(self._send(batch, send))
+
+    @staticmethod
+    async def _send(batch: _Batch, send: Callable[[List[Any]], Awaitable[List[Any]]]):
+        try:
+            results = await send(batch.requests)
+        except Exception as e:
+            results = [e] * len(batch.futures)
+
+        if len(results) != len(batch.futures):
+            results = [RuntimeError(f"{len(results)} results for {len(batch.futures)} requests")] * len(batch.futures)
+
+        for future, result in zip(batch.futures, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,382 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""In-process caches for responses which do not change.
+
+Each gunicorn worker has its own caches. Block and transaction caches can be backed by the cache process
+shared by the workers, see shared_cache.
+"""
+
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Dict, Hashable, Optional, Tuple, Union
+
+from iconcommons.logger import Logger
+
+from .json_codec import EncodedResult
+from ..components import SingletonMetaClass
+
+if TYPE_CHECKING:
+    from .shared_cache import SharedCacheClient
+
+
+class LRUCache:
+    """LRU cache bounded by the number of items and the total size of items"""
+
+    def __init__(self, max_items: int, max_bytes: int = 0):
+        """
+        :param max_items: the number of items. 0 disables the cache
+        :param max_bytes: total size of items. 0 means no limit
+        """
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items: 'OrderedDict[Hashable, Tuple[Any, int]]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._items
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            value, _ = self._items[key]
+        except KeyError:
+            self.misses += 1
+            return default
+
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any, size: int = 0) -> bool:
+        """Put the value
+
+        :param size: size of the value in bytes
+        :return: False if the value is too large to be cached
+        """
+        if self.max_items <= 0 or (self.max_bytes and size > self.max_bytes):
+            return False
+
+        self.pop(key)
+        self._items[key] = (value, size)
+        self.total_bytes += size
+
+        while len(self._items) > self.max_items or (self.max_bytes and self.total_bytes > self.max_bytes):
+            _, (_, evicted_size) = self._items.popitem(last=False)
+            self.total_bytes -= evicted_size
+            self.evictions += 1
+        return True
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            value, size = self._items.pop(key)
+        except KeyError:
+            return default
+
+        self.total_bytes -= size
+        return value
+
+    def discard(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Remove the items whose keys satisfy predicate
+
+        :return: the number of removed items
+        """
+        keys = [key for key in self._items if predicate(key)]
+        for key in keys:
+            self.pop(key)
+        return len(keys)
+
+    def clear(self):
+        self._items.clear()
+        self.total_bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "items": len(self._items),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def normalize_hash(value: str) -> str:
+    """Hash without '0x' prefix in lowercase"""
+    value = value.lower()
+    return value[2:] if value.startswith("0x") else value
+
+
+def parse_block_height(height: Union[int, str, None]) -> Optional[int]:
+    """Height of block JSON. int in block v0.1a, '0x' prefixed hex string in later versions"""
+    if isinstance(height, int) and not isinstance(height, bool):
+        return height
+    if isinstance(height, str) and height.startswith("0x"):
+        try:
+            return int(height, 16)
+        except ValueError:
+            pass
+    return None
+
+
+class BlockCache(metaclass=SingletonMetaClass):
+    """Responses of confirmed blocks by channel, response kind and block hash.
+
+    Blocks are also indexed by height, so a block cached by a request with its hash is hit by its height and
+    vice versa. Callers must not put unconfirmed blocks or the latest block(height -1).
+    """
+
+    def __init__(self, max_items: int = 0, max_bytes: int = 0, shared: Optional['SharedCacheClient'] = None):
+        """
+        :param max_items: the number of responses. 0 disables the cache of this worker
+        :param max_bytes: total size of the encoded responses
+        :param shared: cache shared by the workers. EncodedResult responses are also put into it
+        """
+        self._responses = LRUCache(max_items, max_bytes)
+        self._hashes = LRUCache(max_items)
+        self._shared = shared
+
+    @property
+    def enabled(self) -> bool:
+        return self._responses.max_items > 0 or self._shared is not None
+
+    @property
+    def max_bytes(self) -> int:
+        return self._responses.max_bytes
+
+    def get(self, channel: str, kind: str, height: Optional[int] = None, block_hash: Optional[str] = None) -> Any:
+        """Get the cached response of a block by height or hash
+
+        :param kind: response kind, e.g. method name
+        :return: cached response. None if it is not cached
+        """
+        if not self.enabled:
+            return None
+
+        if block_hash is None:
+            block_hash = self._hashes.get((channel, height))
+            if block_hash is None:
+                self._responses.misses += 1
+                return None
+        else:
+            block_hash = normalize_hash(block_hash)
+
+        return self._responses.get((channel, kind, block_hash))
+
+    async def fetch(self, channel: str, kind: str, height: Optional[int] = None,
+                    block_hash: Optional[str] = None) -> Any:
+        """Same as get(), but the shared cache is also looked up"""
+        response = self.get(channel, kind, height=height, block_hash=block_hash)
+        if response is not None or self._shared is None:
+            return response
+
+        if block_hash is None:
+            data = await self._shared.get(f"h/{channel}/{height}")
+            if data is None:
+                return None
+            block_hash = data.decode("utf-8")
+        else:
+            block_hash = normalize_hash(block_hash)
+
+        data = await self._shared.get(f"b/{channel}/{kind}/{block_hash}")
+        if data is None:
+            return None
+
+        response = EncodedResult(data)
+        self._put(channel, kind, block_hash, height, response, len(data))
+        return response
+
+    def put(self, channel: str, kind: str, block_hash: str, height: Optional[int], response: Any, size: int):
+        """Cache the response of a confirmed block
+
+        :param height: block height. None if it is unknown
+        :param size: size of encoded response
+        """
+        if not self.enabled or not block_hash:
+            return
+
+        block_hash = normalize_hash(block_hash)
+        self._put(channel, kind, block_hash, height, response, size)
+        if self._shared is not None and isinstance(response, EncodedResult):
+            self._shared.put(f"b/{channel}/{kind}/{block_hash}", response.data)
+            if height is not None:
+                self._shared.put(f"h/{channel}/{height}", block_hash.encode("utf-8"))
+
+    def _put(self, channel: str, kind: str, block_hash: str, height: Optional[int], response: Any, size: int):
+        if self._responses.put((channel, kind, block_hash), response, size) and height is not None:
+            self._hashes.put((channel, height), block_hash)
+
+    def reset(self):
+        self._responses.clear()
+        self._hashes.clear()
+
+    def stats(self) -> dict:
+        return self._responses.stats()
+
+
+class TransactionCache(metaclass=SingletonMetaClass):
+    """Responses of transactions in confirmed blocks by channel, response kind and tx hash.
+
+    It also remembers transactions which are not invoked yet for a short time.
+    """
+
+    def __init__(self, max_items: int = 0, max_bytes: int = 0, not_invoked_ttl: float = 0,
+                 shared: Optional['SharedCacheClient'] = None, not_invoked_size: int = 4096):
+        """
+        :param max_items: the number of responses. 0 disables the cache of this worker
+        :param max_bytes: total size of the encoded responses
+        :param not_invoked_ttl: seconds to remember that a transaction is not invoked. 0 disables it.
+            it does not depend on max_items
+        :param not_invoked_size: the number of transactions remembered as not invoked
+        :param shared: cache shared by the workers. EncodedResult responses are also put into it
+        """
+        self._responses = LRUCache(max_items, max_bytes)
+        self._not_invoked_ttl = not_invoked_ttl
+        self._not_invoked = LRUCache(not_invoked_size if not_invoked_ttl > 0 else 0)
+        self._shared = shared
+
+    @property
+    def enabled(self) -> bool:
+        return self._responses.max_items > 0 or self._shared is not None
+
+    def get(self, channel: str, kind: str, tx_hash: str) -> Any:
+        if not self.enabled:
+            return None
+
+        return self._responses.get((channel, kind, normalize_hash(tx_hash)))
+
+    async def fetch(self, channel: str, kind: str, tx_hash: str) -> Any:
+        """Same as get(), but the shared cache is also looked up"""
+        response = self.get(channel, kind, tx_hash)
+        if response is not None or self._shared is None:
+            return response
+
+        tx_hash = normalize_hash(tx_hash)
+        data = await self._shared.get(f"t/{channel}/{kind}/{tx_hash}")
+        if data is None:
+            return None
+
+        response = EncodedResult(data)
+        self._responses.put((channel, kind, tx_hash), response, len(data))
+        return response
+
+    def put(self, channel: str, kind: str, tx_hash: str, response: Any, size: int):
+        if not self.enabled or not tx_hash:
+            return
+
+        tx_hash = normalize_hash(tx_hash)
+        self._responses.put((channel, kind, tx_hash), response, size)
+        if self._shared is not None and isinstance(response, EncodedResult):
+            self._shared.put(f"t/{channel}/{kind}/{tx_hash}", response.data)
+
+    def is_not_invoked(self, channel: str, tx_hash: str) -> bool:
+        key = (channel, normalize_hash(tx_hash))
+        expires_at = self._not_invoked.get(key)
+        if expires_at is None:
+            return False
+        if expires_at <= time.monotonic():
+            self._not_invoked.pop(key)
+            return False
+        return True
+
+    def put_not_invoked(self, channel: str, tx_hash: str):
+        if tx_hash:
+            self._not_invoked.put((channel, normalize_hash(tx_hash)), time.monotonic() + self._not_invoked_ttl)
+
+    def reset(self):
+        self._responses.clear()
+        self._not_invoked.clear()
+
+    def stats(self) -> dict:
+        return self._responses.stats()
+
+
+class QueryCache(metaclass=SingletonMetaClass):
+    """Results of read-only queries to icon service by channel, the last committed height and request.
+
+    Results only change when a block is committed, so the results of a channel are dropped as a whole
+    when its height advances. The height is learned from the latest blocks and from the status of the channel,
+    and it is trusted for height_ttl seconds. So a result can be stale for height_ttl seconds at most.
+    """
+
+    def __init__(self, max_items: int = 0, max_bytes: int = 0, height_ttl: float = 0):
+        """
+        :param max_items: the number of results. 0 disables the cache
+        :param max_bytes: total size of the encoded results
+        :param height_ttl: seconds to trust the learned height of a channel. The cache is disabled
+            if it is not positive, since each cached query would wait for the status of the channel
+        """
+        if max_items > 0 and height_ttl <= 0:
+            Logger.warning(f"The query cache is disabled, since its height TTL({height_ttl}) is not positive")
+            max_items = 0
+        self._responses = LRUCache(max_items, max_bytes)
+        self._height_ttl = height_ttl
+        # channel: (height, monotonic time when it is learned)
+        self._heights: Dict[str, Tuple[int, float]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self._responses.max_items > 0
+
+    def height(self, channel: str) -> Optional[int]:
+        """The last committed height of the channel
+
+        :return: None if it is unknown or older than height_ttl
+        """
+        height, learned_at = self._heights.get(channel, (None, 0.0))
+        if height is None or learned_at + self._height_ttl <= time.monotonic():
+            return None
+        return height
+
+    def update_height(self, channel: str, height: Optional[int], latest: bool = True):
+        """Learn the committed height of the channel
+
+        :param latest: whether height is the last committed height or just a committed one
+        """
+        if not self.enabled or height is None:
+            return
+
+        known_height, learned_at = self._heights.get(channel, (-1, 0.0))
+        if height > known_height:
+            self._responses.discard(lambda key: key[0] == channel)
+        elif height < known_height:
+            return
+
+        self._heights[channel] = (height, time.monotonic() if latest else learned_at)
+
+    def get(self, channel: str, height: int, request: Hashable) -> Any:
+        if not self.enabled:
+            return None
+
+        return self._responses.get((channel, height, request))
+
+    def put(self, channel: str, height: int, request: Hashable, response: Any, size: int):
+        """Cache the result of the request which is queried at height
+
+        It is ignored if the height of the channel has changed during the query.
+        """
+        if not self.enabled or self._heights.get(channel, (None,))[0] != height:
+            return
+
+        self._responses.put((channel, height, request), response, size)
+
+    def reset(self):
+        self._responses.clear()
+        self._heights.clear()
+
+    def stats(self) -> dict:
+        return self._responses.stats()
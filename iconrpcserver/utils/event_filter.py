@@ -0,0 +1,75 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Index of the event log filters of the subscriptions.
+
+A filter is an event signature, the first indexed topic of a log, and an optional SCORE address.
+Filters are indexed by signature and then by address, so matching a log costs two lookups
+and the matched filters, not a comparison with each filter.
+"""
+
+from typing import Dict, Generic, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class EventFilterIndex(Generic[T]):
+    def __init__(self):
+        # signature -> SCORE address, None for any address -> key -> value
+        self._filters: Dict[str, Dict[Optional[str], Dict[str, T]]] = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, event: str, addr: Optional[str], key: str, value: T):
+        """
+        :param event: signature of the event, e.g. "Transfer(Address,Address,int)"
+        :param addr: SCORE address of the logs. None matches the logs of any SCORE
+        :param key: key of the filter to remove it, e.g. id of the subscription
+        :param value: value yielded for the logs matching the filter
+        """
+        filters = self._filters.setdefault(event, {}).setdefault(addr, {})
+        if key not in filters:
+            self._size += 1
+        filters[key] = value
+
+    def remove(self, event: str, addr: Optional[str], key: str):
+        by_addr = self._filters.get(event)
+        if by_addr is None or key not in by_addr.get(addr, {}):
+            return
+
+        self._size -= 1
+        filters = by_addr[addr]
+        del filters[key]
+        if not filters:
+            del by_addr[addr]
+            if not by_addr:
+                del self._filters[event]
+
+    def match(self, event_log: dict) -> Iterator[T]:
+        """Values of the filters matching the event log"""
+        indexed = event_log.get("indexed")
+        if not indexed:
+            return
+        by_addr = self._filters.get(indexed[0])
+        if by_addr is None:
+            return
+
+        addr = event_log.get("scoreAddress")
+        filters = by_addr.get(addr) if addr is not None else None
+        if filters:
+            yield from filters.values()
+        filters = by_addr.get(None)
+        if filters:
+            yield from filters.values()
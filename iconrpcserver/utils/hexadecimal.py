@@ -0,0 +1,42 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Hexadecimal string checks for the format checkers.
+
+Checks run in linear time without regular expressions or copying the value:
+every lowercase hexadecimal digit is deleted by a translate table, so only non-hex characters are left.
+"""
+
+LOWERCASE_HEX_DIGITS = "0123456789abcdef"
+
+_DELETE_HEX_DIGITS = str.maketrans("", "", LOWERCASE_HEX_DIGITS)
+
+# characters left after deleting hex digits from well-known prefixes
+_PREFIX_RESIDUES = {prefix: prefix.translate(_DELETE_HEX_DIGITS) for prefix in ("", "0x", "hx", "cx")}
+
+
+def is_lowercase_hex(value: str, prefix: str = "") -> bool:
+    """Check whether value is prefix followed by one or more lowercase hexadecimal digits
+
+    :param value: text
+    :param prefix: e.g. '0x', 'hx', 'cx'
+    :return: True(lowercase hexadecimal) otherwise False
+    """
+    if not isinstance(value, str) or len(value) <= len(prefix) or not value.startswith(prefix):
+        return False
+
+    residue = _PREFIX_RESIDUES.get(prefix)
+    if residue is None:
+        residue = prefix.translate(_DELETE_HEX_DIGITS)
+
+    return value.translate(_DELETE_HEX_DIGITS) == residue
@@ -13,20 +13,28 @@
 # limitations under the License.
 
 import copy
+import functools
 import logging
 import traceback
+from typing import Any, Callable
 
 from . import ValueType
 from .templates import (templates, CHANGE,
                         AddChange, RemoveChange, ConvertChange)
 
 
-def convert_params(params, param_type):
+def convert_params(params, param_type, in_place: bool = False):
+    """Convert params by the template of param_type
+
+    :param in_place: modify params instead of copying it. params must not be used by others,
+        e.g. it is decoded for the request
+    """
     if param_type is None:
         return params
 
-    obj = _convert(params, templates[param_type])
-    return obj
+    if in_place:
+        return compiled_templates_in_place[param_type](params)
+    return compiled_templates[param_type](params)
 
 
 def _convert(obj, template):
@@ -177,6 +185,172 @@ def _convert_value_hex_0x_hash_number(value):
             return '-0x' + value
 
 
+def _identity(obj):
+    return obj
+
+
+def _compile_value(value_type: ValueType) -> Callable[[Any], Any]:
+    convert_value = _VALUE_CONVERTERS[value_type]
+    if convert_value is None:
+        return _identity
+
+    def convert(obj):
+        if not obj:
+            return obj
+        try:
+            return convert_value(obj)
+        except BaseException as e:
+            traceback.print_exc()
+            logging.error(f"Error : {e}, value : {value_type}:{obj}")
+        return obj
+
+    return convert
+
+
+def _compile_change(change_dict: dict) -> Callable[[dict], dict]:
+    # validated here rather than on each call
+    for change_value in change_dict.values():
+        if not isinstance(change_value, (AddChange, RemoveChange, ConvertChange)):
+            raise RuntimeError(f"Not expected change, {change_value}")
+    changes = tuple(change_dict.items())
+    targets = {change_value.key for change_value in change_dict.values() if isinstance(change_value, ConvertChange)}
+    if targets & change_dict.keys():
+        # a key is changed twice
+        return lambda obj: _change_key(obj, change_dict)
+
+    # the keys which are removed or moved to the end
+    skipped = frozenset(key for key, change_value in changes if not isinstance(change_value, AddChange))
+
+    def change_key(obj: dict) -> dict:
+        # building a new dict once takes less memory than deleting and adding keys of a copy
+        new_obj = {key: value for key, value in obj.items() if key not in skipped}
+        for key, change_value in changes:
+            if type(change_value) is ConvertChange:
+                if key in obj:
+                    new_obj[change_value.key] = obj[key]
+            elif type(change_value) is AddChange:
+                if key not in new_obj:
+                    new_obj[key] = change_value.value
+        return new_obj
+
+    return change_key
+
+
+def _compile_dict(template: dict, in_place: bool) -> Callable[[Any], Any]:
+    change_key = _compile_change(template[CHANGE]) if CHANGE in template else None
+    converters = tuple((key, converter) for key, converter in
+                       ((key, compile_template(value, in_place)) for key, value in template.items()
+                        if key is not CHANGE)
+                       if converter is not _identity)
+
+    def convert(obj):
+        if not obj:
+            return obj
+        if not isinstance(obj, dict):
+            return _convert(obj, template)
+
+        if change_key is not None:
+            new_obj = change_key(obj)
+            if type(new_obj) is not dict:
+                new_obj = dict(new_obj)
+        elif in_place:
+            new_obj = obj
+        else:
+            new_obj = dict(obj)
+        for key, converter in converters:
+            if key in new_obj:
+                new_obj[key] = converter(new_obj[key])
+        return new_obj
+
+    return convert
+
+
+def _compile_list(template: list, in_place: bool) -> Callable[[Any], Any]:
+    convert_item = compile_template(template[0], in_place)
+
+    def convert(obj):
+        if not obj:
+            return obj
+        if not isinstance(obj, list):
+            return _convert(obj, template)
+        if convert_item is _identity:
+            return obj if in_place else list(obj)
+        if in_place:
+            for i, item in enumerate(obj):
+                obj[i] = convert_item(item)
+            return obj
+        return [convert_item(item) for item in obj]
+
+    return convert
+
+
+def compile_template(template, in_place: bool = False) -> Callable[[Any], Any]:
+    """Specialize _convert() for the template.
+
+    The returned function converts an object as _convert(obj, template) does, with the same order of keys.
+    Objects which do not match the structure of the template are converted by _convert().
+
+    :param in_place: the function modifies dicts and lists of the object and returns them instead of copies,
+        except dicts whose keys are changed
+    """
+    if not template:
+        return _identity
+    if isinstance(template, ValueType):
+        return _compile_value(template)
+    if isinstance(template, dict):
+        return _compile_dict(template, in_place)
+    if isinstance(template, list):
+        return _compile_list(template, in_place)
+    return lambda obj: _convert(obj, template)
+
+
+_VALUE_CONVERTERS = {
+    ValueType.none: None,
+    ValueType.text: _convert_value_text,
+    ValueType.integer: _convert_value_integer,
+    ValueType.integer_str: _convert_value_integer_str,
+    ValueType.hex_number: _convert_value_hex_number,
+    ValueType.hex_0x_number: _convert_value_hex_0x_number,
+    ValueType.hex_hash_number: _convert_value_hex_hash_number,
+    ValueType.hex_0x_hash_number: _convert_value_hex_0x_hash_number,
+}
+
+compiled_templates = {param_type: compile_template(template) for param_type, template in templates.items()}
+compiled_templates_in_place = {param_type: compile_template(template, in_place=True)
+                               for param_type, template in templates.items()}
+
+
+def is_noop_template(param_type, obj_type: type) -> bool:
+    """Whether the template of param_type returns any object of obj_type as it is
+
+    :param param_type: None means no template
+    :param obj_type: type of the payload, e.g. dict or list
+    """
+    template = None if param_type is None else templates.get(param_type)
+    if not template:
+        return True
+    if isinstance(template, dict):
+        # keys are changed before the type of the object is checked
+        return not issubclass(obj_type, dict) and CHANGE not in template
+    if isinstance(template, list):
+        return not issubclass(obj_type, list)
+    if isinstance(template, ValueType):
+        return _VALUE_CONVERTERS[template] is None
+    return False
+
+
+@functools.lru_cache(maxsize=None)
+def compile_item_template(param_type, key: str) -> Callable[[Any], Any]:
+    """Converter of the items of the list at key, as the template of param_type converts them in place
+
+    The list must be at key of the converted object, not of params.
+    """
+    template = templates[param_type].get(key)
+    if not isinstance(template, list) or not template:
+        return _identity
+    return compile_template(template[0], in_place=True)
+
+
 def make_request(method, params, request_type=None):
     raw_request = {
         "method": method,
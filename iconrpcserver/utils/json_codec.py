@@ -0,0 +1,266 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""JSON codec used for requests, responses and the payloads from loopchain.
+
+The codec is selected by ConfigKey.JSON_CODEC: 'json'(default), 'ujson', 'orjson' or 'auto'.
+Fast codecs fall back to stdlib json for the values they do not support, e.g. integers over 64 bits,
+so every codec accepts and produces the same data. Decoding errors are raised as json.JSONDecodeError.
+"""
+
+import json
+from typing import Any, Callable, Dict, Iterator, Optional, Type, Union
+
+from iconcommons.logger import Logger
+
+
+class JsonCodec:
+    """stdlib json"""
+    name = "json"
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return json.loads(data)
+
+    def dumps(self, obj: Any) -> str:
+        return json.dumps(obj)
+
+    def dumpb(self, obj: Any) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+
+class UjsonCodec(JsonCodec):
+    name = "ujson"
+
+    def __init__(self):
+        import ujson
+        self._ujson = ujson
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        try:
+            return self._ujson.loads(data)
+        except (ValueError, OverflowError):
+            return super().loads(data)
+
+    def dumps(self, obj: Any) -> str:
+        try:
+            return self._ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False)
+        except (TypeError, ValueError, OverflowError):
+            return super().dumps(obj)
+
+    def dumpb(self, obj: Any) -> bytes:
+        return self.dumps(obj).encode("utf-8")
+
+
+class OrjsonCodec(JsonCodec):
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        try:
+            return self._orjson.loads(data)
+        except self._orjson.JSONDecodeError:
+            return super().loads(data)
+
+    def dumps(self, obj: Any) -> str:
+        return self.dumpb(obj).decode("utf-8")
+
+    def dumpb(self, obj: Any) -> bytes:
+        try:
+            return self._orjson.dumps(obj)
+        except TypeError:
+            return super().dumpb(obj)
+
+
+CODECS: Dict[str, Type[JsonCodec]] = {
+    JsonCodec.name: JsonCodec,
+    UjsonCodec.name: UjsonCodec,
+    OrjsonCodec.name: OrjsonCodec,
+}
+
+# codecs tried in order for 'auto'
+AUTO_CODECS = (OrjsonCodec.name, UjsonCodec.name, JsonCodec.name)
+
+# size of the chunks of StreamedResult
+STREAM_CHUNK_SIZE = 64 * 1024
+# placeholder of the streamed list in the encoded object
+_STREAM_PLACEHOLDER = "__streamed_items__"
+
+_codec: JsonCodec = JsonCodec()
+
+
+def create_json_codec(name: str) -> JsonCodec:
+    """Create a codec by name
+
+    :param name: 'json', 'ujson', 'orjson' or 'auto'
+    :return: codec. stdlib json codec if the codec is unknown or its package is not installed
+    """
+    names = AUTO_CODECS if name == "auto" else (name,)
+    for each in names:
+        try:
+            return CODECS[each]()
+        except KeyError:
+            Logger.warning(f"Unknown JSON codec: {each}")
+        except ImportError:
+            if name != "auto":
+                Logger.warning(f"JSON codec '{each}' is not installed")
+
+    return JsonCodec()
+
+
+def set_json_codec(name: str):
+    """Use the codec for loads(), dumps() and dumpb()
+
+    :param name: 'json', 'ujson', 'orjson' or 'auto'
+    """
+    global _codec
+    _codec = create_json_codec(name)
+    Logger.info(f"JSON codec: {_codec.name}")
+
+
+def get_json_codec() -> JsonCodec:
+    return _codec
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    return _codec.loads(data)
+
+
+def dumps(obj: Any) -> str:
+    return _codec.dumps(obj)
+
+
+def dumpb(obj: Any) -> bytes:
+    return _codec.dumpb(obj)
+
+
+class EncodedResult:
+    """JSON-RPC result which is already encoded.
+
+    json_rpc.encode_response() puts it into the response as it is, so cached results are not encoded again.
+    """
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __repr__(self) -> str:
+        return f"EncodedResult({self.data!r})"
+
+    def decode(self) -> Any:
+        return loads(self.data)
+
+
+def encode_result(result: Any) -> EncodedResult:
+    return EncodedResult(dumpb(result))
+
+
+class StreamedResult:
+    """JSON-RPC result which is encoded while it is written to the response.
+
+    The result is an object or a list whose largest list is encoded item by item. Items are converted,
+    encoded and released from the list one by one, so the converted result and its encoded bytes are never
+    held as a whole. It can be iterated only once.
+    """
+    __slots__ = ("_head", "_items", "_tail", "_convert", "_on_encoded", "_max_bytes")
+
+    def __init__(self, items: list, convert: Optional[Callable[[Any], Any]] = None,
+                 head: bytes = b"", tail: bytes = b""):
+        """
+        :param items: items of the streamed list. the list is emptied while it is streamed
+        :param convert: converts an item before it is encoded
+        :param head: encoded result before the list
+        :param tail: encoded result after the list
+        """
+        self._head = head
+        self._items = items
+        self._tail = tail
+        self._convert = convert
+        self._on_encoded: Optional[Callable[[EncodedResult], Any]] = None
+        self._max_bytes = 0
+
+    @classmethod
+    def from_dict(cls, obj: dict, key: str, items: list,
+                  convert: Optional[Callable[[Any], Any]] = None) -> 'StreamedResult':
+        """Stream obj whose value of key is items
+
+        :param obj: result without the items. obj[key] is replaced
+        """
+        obj[key] = _STREAM_PLACEHOLDER
+        head, _, tail = dumpb(obj).partition(dumpb(_STREAM_PLACEHOLDER))
+        return cls(items, convert, head, tail)
+
+    def __repr__(self) -> str:
+        return f"StreamedResult({self._head!r}, ..., {self._tail!r})"
+
+    def on_encoded(self, callback: Callable[[EncodedResult], Any], max_bytes: int = 0):
+        """Call back with the whole encoded result after it is streamed, e.g. to cache it.
+
+        The chunks are kept while they are streamed, and dropped as soon as they exceed max_bytes,
+        in which case the callback is not called.
+
+        :param max_bytes: size of the result to call back. 0 means no limit
+        """
+        self._on_encoded = callback
+        self._max_bytes = max_bytes
+
+    def __iter__(self) -> Iterator[bytes]:
+        """Chunks of the encoded result. Each chunk is about STREAM_CHUNK_SIZE bytes"""
+        if self._on_encoded is None:
+            yield from self._chunks()
+            return
+
+        kept: Optional[list] = []
+        size = 0
+        for chunk in self._chunks():
+            if kept is not None:
+                size += len(chunk)
+                if self._max_bytes and size > self._max_bytes:
+                    kept = None
+                else:
+                    kept.append(chunk)
+            yield chunk
+        if kept is not None:
+            self._on_encoded(EncodedResult(b"".join(kept)))
+
+    def _chunks(self) -> Iterator[bytes]:
+        items, self._items = self._items, None
+        if items is None:
+            raise RuntimeError("StreamedResult is already consumed")
+
+        chunk = [self._head, b"["]
+        size = 0
+        for i, item in enumerate(items):
+            items[i] = None
+            if self._convert is not None:
+                item = self._convert(item)
+            data = dumpb(item)
+            chunk.append(b", " + data if i else data)
+            size += len(data)
+            if size >= STREAM_CHUNK_SIZE:
+                yield b"".join(chunk)
+                chunk.clear()
+                size = 0
+        items.clear()
+        chunk.append(b"]")
+        chunk.append(self._tail)
+        yield b"".join(chunk)
+
+    def encode(self) -> EncodedResult:
+        """Encode the whole result at once, e.g. for a batch response"""
+        return EncodedResult(b"".join(self))
@@ -12,17 +12,32 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import collections.abc
+import functools
 import json
 import logging
-from typing import Tuple
+import re
+from typing import Any, Callable, Iterable, List, Optional, Tuple, Union
 
 import aiohttp
 from iconcommons.logger import Logger
 from jsonrpcclient import exceptions, Response
 from jsonrpcclient.clients.aiohttp_client import AiohttpClient
 from jsonrpcserver import status
-
-from . import message_code
+from jsonrpcserver.async_dispatcher import call
+from jsonrpcserver.dispatcher import handle_exceptions, log_request, log_response, response_logger, schema, validate
+from jsonrpcserver.methods import Methods, lookup
+from jsonrpcserver.request import NOCONTEXT, Request
+from jsonrpcserver.exceptions import ApiError
+from jsonrpcserver.response import (ApiErrorResponse, BatchResponse, ExceptionResponse, InvalidJSONResponse,
+                                    InvalidJSONRPCResponse, NotificationResponse, Response, SuccessResponse)
+from jsonschema import ValidationError
+from sanic import response as sanic_response
+
+from . import json_codec, message_code
+from .json_codec import EncodedResult, StreamedResult
+from .relay import TRANSPORT_ERRORS, RelayBatcher, RelayHealthTracker, RelaySessionPool, relay_session
 from ..default_conf.icon_rpcserver_constant import ConfigKey, ApiVersion
 from ..dispatcher import GenericJsonRpcServerError, JsonError
 from ..utils.icon_service.converter import convert_params
@@ -30,6 +45,12 @@ from ..utils.icon_service.templates import ResponseParamType
 from ..utils.message_queue.stub_collection import StubCollection
 
 
+# version of block JSON, which loopchain writes as the first key
+_BLOCK_VERSION = re.compile(r'\A\s*\{\s*"version"\s*:\s*"([^"\\]*)"')
+_JSON_ARRAY = re.compile(r'\s*\[')
+_JSON_ARRAY_BYTES = re.compile(rb'\s*\[')
+
+
 class NewAiohttpClient(AiohttpClient):
     def validate_response(self, response: Response):
         if response.raw is not None and not 200 <= response.raw.status <= 299:
@@ -51,31 +72,119 @@ class NewAiohttpClient(AiohttpClient):
 async def relay_tx_request(relay_target, message, path, version=ApiVersion.v3.name):
     method_name = "icx_sendTransaction"
 
-    relay_uri = f"{relay_target}/{path}"
-    Logger.debug(f'relay_uri: {relay_uri}')
+    Logger.info(f"relay_tx_request : "
+                f"message[{message}], "
+                f"relay_target[{relay_target}], "
+                f"version[{version}], "
+                f"method[{method_name}]")
+    # a tripped target is skipped, and the next candidate is tried when the connection to a target fails
+    health_tracker = RelayHealthTracker()
+    error: Optional[Exception] = None
+    for target in health_tracker.candidates(relay_target):
+        # the probe of a tripped target is claimed only when the relay is sent to it
+        if not health_tracker.acquire(target):
+            continue
+        relay_uri = f"{target}/{path}"
+        Logger.debug(f'relay_uri: {relay_uri}')
+        try:
+            result = await _relay_to_target(target, relay_uri, method_name, message)
+            break
+        except TRANSPORT_ERRORS as e:
+            Logger.warning(f"Failed to relay to {target}: {e!r}")
+            error = e
+    else:
+        if error is not None:
+            raise error
+        raise GenericJsonRpcServerError(
+            code=JsonError.INTERNAL_ERROR,
+            message=f"Relay target is not available: {relay_target}",
+            http_status=status.HTTP_INTERNAL_ERROR
+        )
+
+    Logger.debug(f"relay_tx_request result[{result}]")
+    return result
+
+
+async def _relay_to_target(relay_target: str, relay_uri: str, method_name: str, message: dict):
+    batcher = RelayBatcher()
+    if batcher.enabled:
+        send = functools.partial(_relay_batch_request, relay_target, relay_uri, method_name)
+        return await batcher.submit(relay_uri, message, send)
 
-    async with aiohttp.ClientSession() as session:
-        Logger.info(f"relay_tx_request : "
-                    f"message[{message}], "
-                    f"relay_target[{relay_target}], "
-                    f"version[{version}], "
-                    f"method[{method_name}]")
+    async with relay_session(relay_target) as session:
+        with RelayHealthTracker().measure(relay_target):
+            return await _relay_request(session, relay_uri, method_name, message, RelaySessionPool().timeout)
+
+
+async def _relay_request(session: aiohttp.ClientSession, relay_uri: str, method_name: str, message: dict,
+                         timeout: float):
+    try:
+        response = await NewAiohttpClient(session, relay_uri, timeout=timeout).request(method_name, **message)
+    except exceptions.ReceivedNon2xxResponseError as e:
+        raise GenericJsonRpcServerError(
+            code=JsonError.INTERNAL_ERROR,
+            message=str(e),
+            http_status=status.HTTP_BAD_REQUEST
+        ) from e
+
+    if isinstance(response.data, list):
+        # a batch response to the single request. it is the response of the request only if it is the only one
+        data = json_codec.loads(response.text)
+        result = _relay_result(data[0] if len(data) == 1 and isinstance(data[0], dict) else None)
+        if isinstance(result, GenericJsonRpcServerError):
+            raise result
+        return result
+    return response.data.result
+
+
+async def _relay_batch_request(relay_target: str, relay_uri: str, method_name: str, messages: List[dict]) -> list:
+    """Relay the messages in a batch request
+
+    If the target does not answer with a batch response, e.g. one of the messages is invalid,
+    the messages are relayed one by one.
+
+    :return: the result or the exception of each message
+    """
+    timeout = RelaySessionPool().timeout
+    requests = [{"jsonrpc": "2.0", "method": method_name, "params": message, "id": i}
+                for i, message in enumerate(messages)]
+    async with relay_session(relay_target) as session:
+        with RelayHealthTracker().measure(relay_target):
+            async with session.post(relay_uri, data=json_codec.dumpb(requests),
+                                    headers={"Content-Type": "application/json"},
+                                    timeout=aiohttp.ClientTimeout(total=timeout)) as http_response:
+                text = await http_response.text()
         try:
-            response = await NewAiohttpClient(session, relay_uri, timeout=10).request(method_name, **message)
-        except exceptions.ReceivedNon2xxResponseError as e:
-            raise GenericJsonRpcServerError(
-                code=JsonError.INTERNAL_ERROR,
-                message=str(e),
-                http_status=status.HTTP_BAD_REQUEST
-            ) from e
+            data = json_codec.loads(text)
+        except ValueError:
+            data = None
 
-        if isinstance(response.data, list):
-            raise NotImplementedError(f"Received batch response. Data: {response.data}")
-        else:
-            result = response.data.result
-            Logger.debug(f"relay_tx_request result[{result}]")
+        if not isinstance(data, list):
+            Logger.info(f"Relay one by one. Batch response: {text}")
+            return await asyncio.gather(*[_relay_request(session, relay_uri, method_name, message, timeout)
+                                          for message in messages], return_exceptions=True)
+
+    responses = {response.get("id"): response for response in data if isinstance(response, dict)}
+    return [_relay_result(responses.get(i)) for i in range(len(messages))]
 
-    return result
+
+def _relay_result(response: Optional[dict]) -> Any:
+    """The result of the response in a batch response, or the error as an exception"""
+    if response is None:
+        return GenericJsonRpcServerError(
+            code=JsonError.INTERNAL_ERROR,
+            message="No response in the batch response",
+            http_status=status.HTTP_BAD_REQUEST
+        )
+    if "error" in response:
+        try:
+            code = int(response["error"]["code"])
+            message = response["error"]["message"]
+        except Exception:
+            code = JsonError.INTERNAL_ERROR
+            message = f"ServerError: {response}"
+        return GenericJsonRpcServerError(code=code, message=message, http_status=status.HTTP_BAD_REQUEST)
+    return response.get("result")
 
 
 async def get_block_v2_by_params(block_height=None, block_hash="", with_commit_state=False):
@@ -86,10 +195,10 @@ async def get_block_v2_by_params(block_height=None, block_hash="", with_commit_s
             block_height=block_height,
             block_hash=block_hash
         )
-    block = json.loads(block_data_json)  # if fail, block = {}
+    block = json_codec.loads(block_data_json)  # if fail, block = {}
 
     if block:
-        block = convert_params(block, ResponseParamType.get_block_v0_1a_tx_v2)
+        block = convert_params(block, ResponseParamType.get_block_v0_1a_tx_v2, in_place=True)
 
     result = {
         'response_code': response_code,
@@ -102,13 +211,38 @@ async def get_block_v2_by_params(block_height=None, block_hash="", with_commit_s
     return block_hash, result
 
 
+def peek_block_version(block_data_json: Union[str, bytes]) -> Optional[str]:
+    """Version of block JSON without decoding it
+
+    :return: None if the version is not the first key of the block
+    """
+    if isinstance(block_data_json, bytes):
+        block_data_json = block_data_json[:256].decode("utf-8", errors="ignore")
+    match = _BLOCK_VERSION.match(block_data_json, 0, 256)
+    return match.group(1) if match else None
+
+
+def is_json_array(data: Union[str, bytes]) -> bool:
+    """Whether the JSON is an array, by its first character. The data is not copied"""
+    return (_JSON_ARRAY_BYTES if isinstance(data, bytes) else _JSON_ARRAY).match(data) is not None
+
+
+def to_encoded_result(data: Union[str, bytes]) -> EncodedResult:
+    return EncodedResult(data if isinstance(data, bytes) else data.encode("utf-8"))
+
+
 async def get_block_by_params(
         channel_name=None,
         block_height=None,
         block_hash="",
         with_commit_state=False,
-        unconfirmed=False
+        unconfirmed=False,
+        passthrough: Optional[Callable[[str], bool]] = None
 ):
+    """
+    :param passthrough: whether the block of the version is returned without conversion.
+        such blocks are not decoded, and result['block'] is EncodedResult of block JSON
+    """
     channel_name = StubCollection().conf[ConfigKey.CHANNEL] if channel_name is None else channel_name
 
     try:
@@ -127,11 +261,15 @@ async def get_block_by_params(
             unconfirmed=unconfirmed
         )
 
-    try:
-        block = json.loads(block_data_json) if response_code == message_code.Response.success else {}
-    except Exception as e:
-        logging.error(f"get_block_by_params error caused by : {e}")
-        block = {}
+    if response_code == message_code.Response.success and passthrough is not None and \
+            is_passthrough_block(block_data_json, passthrough, with_commit_state):
+        block = to_encoded_result(block_data_json)
+    else:
+        try:
+            block = json_codec.loads(block_data_json) if response_code == message_code.Response.success else {}
+        except Exception as e:
+            logging.error(f"get_block_by_params error caused by : {e}")
+            block = {}
 
     result = {
         'response_code': response_code,
@@ -139,17 +277,31 @@ async def get_block_by_params(
         'confirm_info': confirm_info.decode('utf-8')
     }
 
-    if 'commit_state' in result['block'] and not with_commit_state:
-        del result['block']['commit_state']
+    if isinstance(block, dict) and 'commit_state' in block and not with_commit_state:
+        del block['commit_state']
 
     return block_hash, result
 
 
+def is_passthrough_block(block_data_json: Union[str, bytes], passthrough: Callable[[str], bool],
+                         with_commit_state: bool) -> bool:
+    version = peek_block_version(block_data_json)
+    if version is None or not passthrough(version):
+        return False
+    # commit_state is removed from the block
+    commit_state = b'"commit_state"' if isinstance(block_data_json, bytes) else '"commit_state"'
+    return with_commit_state or commit_state not in block_data_json
+
+
 async def get_block_recipts_by_params(
         channel_name: str = None,
         block_height: int = None,
-        block_hash: str = ""
-) -> Tuple[int, list]:
+        block_hash: str = "",
+        passthrough: bool = False
+) -> Tuple[int, Union[list, EncodedResult]]:
+    """
+    :param passthrough: return the receipts as EncodedResult without decoding them, if they are a JSON array
+    """
     channel_name = StubCollection().conf[ConfigKey.CHANNEL] if channel_name is None else channel_name
 
     try:
@@ -167,8 +319,11 @@ async def get_block_recipts_by_params(
             block_hash=block_hash
         )
 
+    if passthrough and response_code == message_code.Response.success and is_json_array(block_receipts):
+        return response_code, to_encoded_result(block_receipts)
+
     try:
-        block_receipts: list = json.loads(block_receipts)
+        block_receipts: list = json_codec.loads(block_receipts)
     except Exception as e:
         logging.error(f"get_block_receipts_by_params error caused by : {e}")
         block_receipts: list = []
@@ -202,6 +357,162 @@ def get_channel_stub_by_channel_name(channel_name):
         return channel_stub
 
 
+async def safe_call(request: Request, methods: Methods, *, debug: bool) -> Response:
+    """Call the method of request like jsonrpcserver, but check the result with the configured JSON codec"""
+    with handle_exceptions(request, debug) as handler:
+        result = await call(lookup(methods, request.method), *request.args, **request.kwargs)
+        # Ensure value returned from the method is JSON-serializable
+        if not isinstance(result, (EncodedResult, StreamedResult)):
+            json_codec.dumpb(result)
+        handler.response = SuccessResponse(result=result, id=request.id)
+    return handler.response
+
+
+class OrderedBatchResponse(BatchResponse):
+    """BatchResponse which keeps the responses in the order of the requests"""
+
+    def __init__(self, responses: Iterable[Response], http_status: int = status.HTTP_OK):
+        Response.__init__(self, http_status=http_status)
+        self.responses = [r for r in responses if r.wanted]
+
+    @property
+    def wanted(self) -> bool:
+        # nothing is answered to a batch of notifications
+        return bool(self.responses)
+
+
+def create_batch_requests(deserialized: List[dict], context: Any, validator: Optional[Callable[[dict], None]],
+                          debug: bool) -> List[Union[Request, Response]]:
+    """Create the requests of a batch in order.
+
+    A request which fails the validation is replaced with its error response, so the others are still called.
+
+    :param validator: validates each request, e.g. with the schema of its method
+    """
+    requests = []
+    for item in deserialized:
+        try:
+            if validator is not None:
+                validator(item)
+        except ApiError as e:
+            error = ApiErrorResponse(str(e), code=e.code, data=e.data, id=item.get("id"), debug=debug)
+            requests.append(error if "id" in item else NotificationResponse())
+        except Exception as e:
+            Logger.exception(e)
+            error = ExceptionResponse(e, id=item.get("id"), debug=debug)
+            requests.append(error if "id" in item else NotificationResponse())
+        else:
+            requests.append(Request(context=context, convert_camel_case=False, **item))
+    return requests
+
+
+async def call_requests(requests: Union[Request, Iterable[Union[Request, Response]]], methods: Methods, debug: bool,
+                        concurrency: int = 0) -> Response:
+    """
+    :param requests: a request, or the requests of a batch. a response in the batch is answered as it is
+    :param concurrency: the number of requests of a batch called at the same time. 0 means no limit
+    """
+    if not isinstance(requests, collections.abc.Iterable):
+        return await safe_call(requests, methods, debug=debug)
+
+    semaphore = asyncio.Semaphore(concurrency) if concurrency > 0 else None
+
+    async def _call(request: Union[Request, Response]) -> Response:
+        if isinstance(request, Response):
+            return request
+        if semaphore is None:
+            return await safe_call(request, methods, debug=debug)
+        async with semaphore:
+            return await safe_call(request, methods, debug=debug)
+
+    return OrderedBatchResponse(await asyncio.gather(*[_call(request) for request in requests]))
+
+
+async def async_dispatch(
+        request: Union[str, bytes],
+        methods: Methods,
+        *,
+        deserialized: Union[dict, list, None] = None,
+        context: Any = NOCONTEXT,
+        debug: bool = False,
+        validator: Optional[Callable[[dict], None]] = None,
+        concurrency: int = 0
+) -> Response:
+    """Dispatch a request which is already deserialized.
+
+    It works like jsonrpcserver.async_dispatch() except that the request is not decoded again
+    when the deserialized request is given. The requests of a batch are called concurrently, and answered in order.
+
+    :param request: raw JSON-RPC request. it is used for logging, and it is decoded only without deserialized
+    :param methods: methods to dispatch
+    :param deserialized: JSON-RPC request decoded from request
+    :param context: context passed to the methods
+    :param debug: include internal error details in the response
+    :param validator: validates each request of a batch. a single request should be validated by the caller
+    :param concurrency: the number of requests of a batch called at the same time. 0 means no limit
+    :return: response
+    """
+    log_request(request)
+    response: Response
+    try:
+        if deserialized is None:
+            deserialized = json_codec.loads(request)
+        deserialized = validate(deserialized, schema)
+    except json.JSONDecodeError as e:
+        response = InvalidJSONResponse(data=str(e), debug=debug)
+    except ValidationError:
+        response = InvalidJSONRPCResponse(data=None, debug=debug)
+    else:
+        if isinstance(deserialized, list):
+            requests = create_batch_requests(deserialized, context, validator, debug)
+        else:
+            requests = Request(context=context, convert_camel_case=False, **deserialized)
+        response = await call_requests(requests, methods, debug=debug, concurrency=concurrency)
+    if response_logger.isEnabledFor(logging.INFO) and not has_streamed(response):
+        log_response(encode_response(response))
+    return response
+
+
+def is_streamed(response: Response) -> bool:
+    """Whether the response should be written by stream_response()"""
+    return isinstance(response, SuccessResponse) and isinstance(response.result, StreamedResult)
+
+
+def has_streamed(response: Response) -> bool:
+    """Whether the response or a response of the batch has StreamedResult, which can be encoded only once"""
+    if isinstance(response, BatchResponse):
+        return any(is_streamed(r) for r in response.responses)
+    return is_streamed(response)
+
+
+def stream_response(response: SuccessResponse) -> sanic_response.StreamingHTTPResponse:
+    """Write the response with StreamedResult in chunks"""
+    async def _write(http_response: sanic_response.StreamingHTTPResponse):
+        await http_response.write(b'{"jsonrpc": "2.0", "result": ')
+        for chunk in response.result:
+            await http_response.write(chunk)
+        await http_response.write(b', "id": ' + json_codec.dumpb(response.id) + b'}')
+
+    return sanic_response.stream(_write, status=response.http_status, content_type="application/json")
+
+
+def encode_response(response: Response) -> bytes:
+    """Encode the response with the configured JSON codec.
+
+    EncodedResult is put into the response without encoding. StreamedResult is consumed.
+    """
+    if not response.wanted:
+        return b""
+    if isinstance(response, BatchResponse):
+        return b"[" + b", ".join(encode_response(r) for r in response.responses) + b"]"
+    if is_streamed(response):
+        response = SuccessResponse(result=response.result.encode(), id=response.id)
+    if isinstance(response, SuccessResponse) and isinstance(response.result, EncodedResult):
+        return b''.join((b'{"jsonrpc": "2.0", "result": ', response.result.data,
+                         b', "id": ', json_codec.dumpb(response.id), b'}'))
+    return json_codec.dumpb(response.deserialized())
+
+
 def monkey_patch():
     from typing import Optional, Union, Dict
     from jsonrpcserver import dispatcher, log
@@ -12,13 +12,50 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import inspect
 import os
 import signal
-from typing import Optional
+from typing import FrozenSet, Optional
 
 from iconcommons import Logger
 
+from ..single_flight import SingleFlight, freeze
+
+# shared by all stubs of a worker. None disables single flight
+stub_single_flight: Optional[SingleFlight] = SingleFlight()
+
+
+def set_stub_single_flight(enabled: bool):
+    global stub_single_flight
+    stub_single_flight = SingleFlight() if enabled else None
+
 
 def earlgrey_close(func: str, exc: Optional[BaseException]):
     Logger.error(tag="MQ", msg=f"[{func}] connection closed. {exc}")
     os.killpg(0, signal.SIGKILL)
+
+
+class SingleFlightStubMixin:
+    """Concurrent calls of a read-only task with the same params share one message queue call.
+
+    Callers share the returned object, so they must not modify it.
+    It should be placed before MessageQueueStub in the bases.
+    """
+    # names of read-only tasks
+    SINGLE_FLIGHT_TASKS: FrozenSet[str] = frozenset()
+
+    async def _call_async_rpc(self, func_name, func, priority, *args, **kwargs):
+        call_async_rpc = super()._call_async_rpc
+        single_flight = stub_single_flight
+        if single_flight is None or func.__name__ not in self.SINGLE_FLIGHT_TASKS:
+            return await call_async_rpc(func_name, func, priority, *args, **kwargs)
+
+        params = inspect.signature(func).bind(*args, **kwargs)
+        params.apply_defaults()
+        key = (self._route_key, func_name, freeze(params.arguments))
+        try:
+            hash(key)
+        except TypeError:
+            return await call_async_rpc(func_name, func, priority, *args, **kwargs)
+
+        return await single_flight.do(key, lambda: call_async_rpc(func_name, func, priority, *args, **kwargs))
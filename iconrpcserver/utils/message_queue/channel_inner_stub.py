@@ -16,7 +16,7 @@ from typing import Tuple, List, Dict, Union, NoReturn, Optional
 
 from earlgrey import MessageQueueStub, message_queue_task
 
-from ...utils.message_queue import earlgrey_close
+from ...utils.message_queue import SingleFlightStubMixin, earlgrey_close
 
 
 class ChannelInnerTask:
@@ -183,8 +183,13 @@ class ChannelInnerTask:
         pass
 
 
-class ChannelInnerStub(MessageQueueStub[ChannelInnerTask]):
+class ChannelInnerStub(SingleFlightStubMixin, MessageQueueStub[ChannelInnerTask]):
     TaskType = ChannelInnerTask
+    SINGLE_FLIGHT_TASKS = frozenset((
+        "get_invoke_result", "get_tx_info", "get_tx_by_address", "get_block_v2", "get_block", "get_tx_proof",
+        "get_receipt_proof", "prove_tx", "prove_receipt", "get_citizens", "get_reps_by_hash", "get_status",
+        "get_block_receipts"
+    ))
 
     def _callback_connection_close(self, sender, exc: Optional[BaseException], *args, **kwargs):
         earlgrey_close(func="ChannelInnerStub", exc=exc)
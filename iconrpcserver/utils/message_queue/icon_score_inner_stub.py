@@ -11,11 +11,20 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from typing import Optional
+import asyncio
+import time
+from typing import List, Optional, Union
 
 from earlgrey import MessageQueueStub, message_queue_task
+from iconcommons import Logger
 
-from ...utils.message_queue import earlgrey_close
+from ...components import SingletonMetaClass
+from ...utils.batcher import Batcher
+from ...utils.message_queue import SingleFlightStubMixin, earlgrey_close
+
+# seconds query_batch is not tried after it fails, doubled by each failure in a row
+QUERY_BATCH_BACKOFF = 1
+QUERY_BATCH_MAX_BACKOFF = 300
 
 
 class IconScoreInnerTask:
@@ -36,6 +45,11 @@ class IconScoreInnerTask:
     async def query(self, request: dict) -> dict:
         pass
 
+    @message_queue_task
+    async def query_batch(self, requests: List[dict]) -> List[dict]:
+        """Query the requests in one message. Each request is answered like query, in order"""
+        pass
+
     @message_queue_task
     async def call(self, request: dict) -> dict:
         pass
@@ -61,8 +75,60 @@ class IconScoreInnerTask:
         pass
 
 
-class IconScoreInnerStub(MessageQueueStub[IconScoreInnerTask]):
+class IconScoreInnerStub(SingleFlightStubMixin, MessageQueueStub[IconScoreInnerTask]):
     TaskType = IconScoreInnerTask
+    SINGLE_FLIGHT_TASKS = frozenset(("query",))
+    # query_batch is not tried until query_batch_retry_at after it fails
+    query_batch_retry_at = 0.0
+    query_batch_backoff = 0.0
 
     def _callback_connection_close(self, sender, exc: Optional[BaseException], *args, **kwargs):
         earlgrey_close(func="IconScoreInnerStub", exc=exc)
+
+
+class QueryBatcher(Batcher, metaclass=SingletonMetaClass):
+    """Queries to the same channel are gathered and sent to iconservice in one query_batch message.
+
+    Queries called together, e.g. by a JSON-RPC batch request, are sent in a batch after max_delay seconds.
+    """
+
+    def __init__(self, max_items: int = 0, max_delay: float = 0.001, timeout: float = 5):
+        """
+        :param timeout: seconds to wait for the answer of query_batch, since iconservice without it does not answer
+        """
+        super().__init__(max_items, max_delay)
+        self.timeout = timeout
+
+
+async def query_batch(score_stub: IconScoreInnerStub, requests: List[dict],
+                      timeout: float = 5) -> List[Union[dict, Exception]]:
+    """Query the requests with query_batch task.
+
+    iconservice without query_batch does not answer it at all, so query_batch is abandoned after timeout seconds.
+    If query_batch fails or times out, the requests are queried one by one,
+    and query_batch is not tried again for a backoff doubled by each failure in a row.
+
+    :param timeout: seconds to wait for the answer of query_batch
+    :return: the response or the exception of each request
+    """
+    if time.monotonic() >= score_stub.query_batch_retry_at:
+        try:
+            responses = await asyncio.wait_for(score_stub.async_task().query_batch(requests), timeout)
+        except Exception as e:
+            _on_query_batch_failure(score_stub, e)
+        else:
+            if score_stub.query_batch_backoff:
+                Logger.info("query_batch is available again", "MQ")
+                score_stub.query_batch_backoff = 0.0
+            return responses
+
+    return await asyncio.gather(*[score_stub.async_task().query(request) for request in requests],
+                                return_exceptions=True)
+
+
+def _on_query_batch_failure(score_stub: IconScoreInnerStub, e: Exception):
+    if not score_stub.query_batch_backoff:
+        Logger.warning(f"query_batch is not available. Query one by one until it is answered: {e!r}", "MQ")
+    score_stub.query_batch_backoff = min(max(score_stub.query_batch_backoff * 2, QUERY_BATCH_BACKOFF),
+                                         QUERY_BATCH_MAX_BACKOFF)
+    score_stub.query_batch_retry_at = time.monotonic() + score_stub.query_batch_backoff
@@ -15,7 +15,7 @@ from typing import Optional
 
 from earlgrey import MessageQueueStub, message_queue_task
 
-from . import earlgrey_close
+from . import SingleFlightStubMixin, earlgrey_close
 
 
 class PeerInnerTask:
@@ -29,8 +29,9 @@ class PeerInnerTask:
         pass
 
 
-class PeerInnerStub(MessageQueueStub[PeerInnerTask]):
+class PeerInnerStub(SingleFlightStubMixin, MessageQueueStub[PeerInnerTask]):
     TaskType = PeerInnerTask
+    SINGLE_FLIGHT_TASKS = frozenset(("get_channel_infos", "get_node_info_detail"))
 
     def _callback_connection_close(self, sender, exc: Optional[BaseException], *args, **kwargs):
         earlgrey_close(func="IconScoreInnerStub", exc=exc)
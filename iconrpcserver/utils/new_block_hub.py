@@ -0,0 +1,154 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""New blocks announced to the websocket subscribers of a worker.
+
+Each block is fetched from the channel once by a long-poll shared by the subscribers waiting for its height,
+and its node_ws_PublishNewBlock frame is encoded once. The frames of the latest heights are kept,
+so subscribers a few blocks behind get them without fetching. Subscribers further behind fetch their own blocks,
+a range of heights at a time, and may get them in node_ws_PublishNewBlocks frames of several blocks.
+"""
+
+import asyncio
+import itertools
+from typing import Dict, List, Optional
+
+from iconcommons.logger import Logger
+
+from . import json_codec
+from .cache import parse_block_height
+from .json_rpc import get_channel_stub_by_channel_name
+from .single_flight import SingleFlight
+from ..components import SingletonMetaClass
+
+PUBLISH_NEW_BLOCK = "node_ws_PublishNewBlock"
+PUBLISH_NEW_BLOCKS = "node_ws_PublishNewBlocks"
+
+TAG = "WS_HUB"
+
+
+class NewBlock:
+    __slots__ = ("height", "block", "confirm_info", "params", "frame")
+
+    def __init__(self, height: int, block: dict, confirm_info: str, params: str, frame: str):
+        """
+        :param block: decoded block. it is shared by the subscribers, so it must not be modified
+        :param params: encoded params of node_ws_PublishNewBlock
+        :param frame: encoded node_ws_PublishNewBlock request
+        """
+        self.height = height
+        self.block = block
+        self.confirm_info = confirm_info
+        self.params = params
+        self.frame = frame
+
+
+class NewBlockHub(metaclass=SingletonMetaClass):
+    """New blocks of the channels shared by the websocket subscribers of a worker"""
+
+    def __init__(self, max_frames: int = 0, catch_up_blocks: int = 0):
+        """
+        :param max_frames: the number of the latest blocks kept for each channel.
+            0 keeps none, and only the subscribers waiting for a block at the same time share it
+        :param catch_up_blocks: blocks fetched at a time for a subscriber behind the last height.
+            0 or 1 disables the catch-up, and the blocks are fetched one by one
+        """
+        self.max_frames = max_frames
+        self.catch_up_blocks = catch_up_blocks
+        self.fetches = 0
+        self.hits = 0
+        self._blocks: Dict[str, Dict[int, NewBlock]] = {}
+        self._flight = SingleFlight()
+        self._ids = itertools.count(1)
+
+    async def get(self, channel_name: str, height: int, subscriber_id: str) -> Optional[NewBlock]:
+        """The block of the height. It waits for the block if the height is not reached yet
+
+        :param subscriber_id: id of the subscriber which asks. it is passed to the channel when the block is fetched
+        :return: None if the channel answers with an error
+        """
+        new_block = self._blocks.get(channel_name, {}).get(height)
+        if new_block is not None:
+            self.hits += 1
+            return new_block
+
+        return await self._flight.do((channel_name, height),
+                                     lambda: self._fetch(channel_name, height, subscriber_id))
+
+    async def get_range(self, channel_name: str, height: int, count: int, subscriber_id: str) -> List[NewBlock]:
+        """The blocks from the height. They are fetched concurrently
+
+        :return: the blocks in order. it stops before the first block answered with an error
+        """
+        new_blocks = await asyncio.gather(*[self.get(channel_name, height + i, subscriber_id) for i in range(count)])
+        for i, new_block in enumerate(new_blocks):
+            if new_block is None:
+                return new_blocks[:i]
+        return new_blocks
+
+    async def last_height(self, channel_name: str) -> Optional[int]:
+        """The last height of the channel. Subscribers asking at the same time share a request for the status"""
+        async def _get_status() -> Optional[int]:
+            channel_stub = get_channel_stub_by_channel_name(channel_name)
+            status_data: dict = await channel_stub.async_task().get_status()
+            return parse_block_height(status_data.get('block_height'))
+
+        return await self._flight.do((channel_name, "status"), _get_status)
+
+    def encode_blocks(self, new_blocks: List[NewBlock]) -> str:
+        """node_ws_PublishNewBlocks request. Its blocks are the params of node_ws_PublishNewBlock of each block"""
+        return ''.join((
+            '{"jsonrpc": "2.0", "method": "', PUBLISH_NEW_BLOCKS, '", "params": {"blocks": [',
+            ', '.join(new_block.params for new_block in new_blocks), ']}, "id": ', str(next(self._ids)), '}'
+        ))
+
+    def stats(self) -> dict:
+        return {
+            "fetches": self.fetches,
+            "hits": self.hits,
+            "shared": self._flight.shared,
+            "blocks": sum(len(blocks) for blocks in self._blocks.values()),
+        }
+
+    async def _fetch(self, channel_name: str, height: int, subscriber_id: str) -> Optional[NewBlock]:
+        self.fetches += 1
+        channel_stub = get_channel_stub_by_channel_name(channel_name)
+        new_block_dumped, confirm_info_bytes = await channel_stub.async_task().announce_new_block(
+            subscriber_block_height=height,
+            subscriber_id=subscriber_id
+        )
+        block: dict = json_codec.loads(new_block_dumped)
+        if "error" in block:
+            Logger.error(f"announce_new_block error: {block}, to citizen({subscriber_id})", TAG)
+            return None
+
+        confirm_info = confirm_info_bytes.decode('utf-8')
+        # the block is put into the frame as it is dumped by the channel
+        params = ''.join(('{"block": ', new_block_dumped, ', "confirm_info": ', json_codec.dumps(confirm_info), '}'))
+        frame = ''.join(('{"jsonrpc": "2.0", "method": "', PUBLISH_NEW_BLOCK, '", "params": ', params,
+                         ', "id": ', str(next(self._ids)), '}'))
+        new_block = NewBlock(height, block, confirm_info, params, frame)
+        self._put(channel_name, new_block)
+        return new_block
+
+    def _put(self, channel_name: str, new_block: NewBlock):
+        if self.max_frames <= 0:
+            return
+        blocks = self._blocks.setdefault(channel_name, {})
+        if len(blocks) >= self.max_frames:
+            # blocks of subscribers catching up do not evict the latest ones
+            lowest = min(blocks)
+            if new_block.height < lowest:
+                return
+            del blocks[lowest]
+        blocks[new_block.height] = new_block
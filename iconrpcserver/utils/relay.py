@@ -0,0 +1,250 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""HTTP sessions to the relay targets of transactions, and the batcher of relays.
+
+Citizen nodes relay every transaction to a rep. Each worker keeps a session for each relay target,
+so the connections to the target are kept alive and reused instead of connecting for each transaction.
+Under heavy load, the relays can also be sent to the target in JSON-RPC batch requests.
+The health of each target is tracked, so a relay fails fast or goes to an alternate while the target is down.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional
+
+import aiohttp
+from iconcommons.logger import Logger
+
+from .batcher import Batcher
+from ..components import SingletonMetaClass
+
+TAG = "RELAY"
+
+
+class RelaySessionPool(metaclass=SingletonMetaClass):
+    """Sessions of a worker by relay target.
+
+    A session is created on the first relay to its target, since the target changes with the leader.
+    The sessions of the least recently used targets are closed over max_targets.
+    """
+
+    def __init__(self, limit: int = 0, keepalive_timeout: float = 15, timeout: float = 10, max_targets: int = 16):
+        """
+        :param limit: connections to a target. 0 disables the pool, and a session is made for each relay
+        :param keepalive_timeout: seconds to keep an idle connection
+        :param timeout: seconds to wait for the answer of a relay
+        :param max_targets: the number of targets whose sessions are kept
+        """
+        self.limit = limit
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        self.max_targets = max_targets
+        self._sessions: 'OrderedDict[str, aiohttp.ClientSession]' = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.limit > 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def session(self, target: str) -> aiohttp.ClientSession:
+        """The session to the target. It must be called in the event loop of the worker"""
+        session = self._sessions.get(target)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, keepalive_timeout=self.keepalive_timeout)
+            session = aiohttp.ClientSession(connector=connector)
+            self._sessions[target] = session
+            Logger.info(f"Session to {target} is created", TAG)
+        self._sessions.move_to_end(target)
+
+        while len(self._sessions) > self.max_targets:
+            evicted_target, evicted = self._sessions.popitem(last=False)
+            Logger.info(f"Session to {evicted_target} is closed", TAG)
+            asyncio.ensure_future(evicted.close())
+        return session
+
+    async def close(self):
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        for session in sessions:
+            await session.close()
+
+
+@asynccontextmanager
+async def relay_session(target: str) -> AsyncIterator[aiohttp.ClientSession]:
+    """The session of the pool, or a session only for this relay if the pool is disabled"""
+    session_pool = RelaySessionPool()
+    if session_pool.enabled:
+        yield session_pool.session(target)
+    else:
+        async with aiohttp.ClientSession() as session:
+            yield session
+
+
+class RelayBatcher(Batcher, metaclass=SingletonMetaClass):
+    """Relays to the same target are gathered and sent as a batch.
+
+    A batch is sent when it has max_items requests, or max_delay seconds after its first request.
+    So max_delay is the latency added to a relay under light load.
+    """
+
+
+# failures of the connection to a target. errors answered by the target are not failures of the target
+TRANSPORT_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, OSError)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class _TargetHealth:
+    __slots__ = ("state", "opened_at", "probing", "latency", "error_rate", "requests", "failures",
+                 "consecutive_failures")
+
+    def __init__(self):
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+
+
+class RelayHealthTracker(metaclass=SingletonMetaClass):
+    """Health of the relay targets with a circuit breaker for each target.
+
+    A target is tripped(open) after failure_threshold consecutive transport failures, and relays to it fail fast.
+    After open_duration seconds, one relay probes the target(half open). It closes the circuit if it succeeds.
+    While a target is tripped, relays go to the alternates, and to the other targets which answered before.
+    """
+
+    def __init__(self, failure_threshold: int = 0, open_duration: float = 10, alternates: Iterable[str] = (),
+                 alpha: float = 0.2, max_targets: int = 16):
+        """
+        :param failure_threshold: consecutive failures to trip a target. 0 disables the tracker
+        :param open_duration: seconds to fail fast before probing a tripped target
+        :param alternates: relay targets to try when the given target is tripped or fails
+        :param alpha: weight of the latest relay in the moving averages of latency and error rate
+        :param max_targets: the number of targets whose health is kept
+        """
+        self.failure_threshold = failure_threshold
+        self.open_duration = open_duration
+        self.alternates = list(alternates)
+        self.alpha = alpha
+        self.max_targets = max_targets
+        self._targets: 'OrderedDict[str, _TargetHealth]' = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.failure_threshold > 0
+
+    def available(self, target: str) -> bool:
+        """Whether a relay can be sent to the target. A tripped target lets one relay through after open_duration
+
+        It does not claim the probe of a tripped target. acquire claims it right before the relay is sent.
+        """
+        health = self._targets.get(target)
+        if health is None or health.state == CLOSED:
+            return True
+        if health.probing:
+            return False
+        return health.state == HALF_OPEN or time.monotonic() - health.opened_at >= self.open_duration
+
+    def acquire(self, target: str) -> bool:
+        """Claim the relay to the target. Only one relay probes a tripped target until measure records its result"""
+        if not self.available(target):
+            return False
+        health = self._targets.get(target)
+        if health is not None and health.state != CLOSED:
+            health.state = HALF_OPEN
+            health.probing = True
+        return True
+
+    def candidates(self, target: str) -> List[str]:
+        """Targets to try in order: the target, the alternates, then the others by latency. Tripped ones are skipped"""
+        if not self.enabled:
+            return [target]
+
+        others = sorted((other for other, health in self._targets.items()
+                         if other != target and other not in self.alternates and health.latency is not None),
+                        key=lambda other: self._targets[other].latency)
+        candidates = []
+        for candidate in [target, *self.alternates, *others]:
+            if candidate not in candidates and self.available(candidate):
+                candidates.append(candidate)
+        return candidates
+
+    @contextmanager
+    def measure(self, target: str) -> Iterator[None]:
+        """Record the latency and the result of a relay to the target"""
+        if not self.enabled:
+            yield
+            return
+
+        start = time.monotonic()
+        try:
+            yield
+        except TRANSPORT_ERRORS:
+            self._record(target, time.monotonic() - start, failed=True)
+            raise
+        except BaseException:
+            self._record(target, time.monotonic() - start, failed=False)
+            raise
+        else:
+            self._record(target, time.monotonic() - start, failed=False)
+
+    def stats(self) -> Dict[str, dict]:
+        return {
+            target: {
+                "state": health.state,
+                "latency": health.latency,
+                "error_rate": health.error_rate,
+                "requests": health.requests,
+                "failures": health.failures,
+            }
+            for target, health in self._targets.items()
+        }
+
+    def _record(self, target: str, latency: float, failed: bool):
+        health = self._targets.get(target)
+        if health is None:
+            health = self._targets[target] = _TargetHealth()
+        self._targets.move_to_end(target)
+        while len(self._targets) > self.max_targets:
+            self._targets.popitem(last=False)
+
+        health.requests += 1
+        health.error_rate += self.alpha * (float(failed) - health.error_rate)
+        health.probing = False
+        if not failed:
+            health.latency = latency if health.latency is None else health.latency + self.alpha * (
+                    latency - health.latency)
+            health.consecutive_failures = 0
+            if health.state != CLOSED:
+                Logger.info(f"Relay target {target} is recovered", TAG)
+                health.state = CLOSED
+            return
+
+        health.failures += 1
+        health.consecutive_failures += 1
+        if health.state == HALF_OPEN or (health.state == CLOSED
+                                         and health.consecutive_failures >= self.failure_threshold):
+            Logger.warning(f"Relay target {target} is tripped after {health.consecutive_failures} failures", TAG)
+            health.state = OPEN
+            health.opened_at = time.monotonic()
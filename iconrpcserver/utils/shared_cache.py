@@ -0,0 +1,247 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Cache shared by the gunicorn workers.
+
+A cache process started with the gunicorn master holds one LRU cache of bytes, and workers reach it over a Unix socket.
+Each request is a header(op, key size, value size) followed by the key and the value.
+GET and STATS are answered with the size of the value followed by the value, PUT is not answered.
+The shared cache is best effort: a worker treats any failure of the cache process as a miss.
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import struct
+import time
+from collections import deque
+from typing import Deque, Optional
+
+from iconcommons.logger import Logger
+
+from .cache import LRUCache
+from .single_flight import SingleFlight
+from ..components import SingletonMetaClass
+
+OP_GET = 1
+OP_PUT = 2
+OP_STATS = 3
+
+REQUEST_HEADER = struct.Struct(">BII")
+RESPONSE_HEADER = struct.Struct(">I")
+MISS = 0xFFFFFFFF
+
+# seconds to wait before connecting again after a failure
+RECONNECT_INTERVAL = 1.0
+# puts are dropped while the cache process does not read this many bytes
+MAX_WRITE_BUFFER = 4 * 1024 * 1024
+
+TAG = "SHARED_CACHE"
+
+
+def _request(op: int, key: bytes, value: bytes = b"") -> bytes:
+    return REQUEST_HEADER.pack(op, len(key), len(value)) + key + value
+
+
+class SharedCacheServer:
+    def __init__(self, max_items: int, max_bytes: int):
+        """
+        :param max_items: the number of items
+        :param max_bytes: total size of values
+        """
+        self._cache = LRUCache(max_items, max_bytes)
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+    async def start(self, path: str) -> asyncio.AbstractServer:
+        if os.path.exists(path):
+            os.unlink(path)
+        return await asyncio.start_unix_server(self._handle, path=path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                op, key_size, value_size = REQUEST_HEADER.unpack(await reader.readexactly(REQUEST_HEADER.size))
+                key = await reader.readexactly(key_size)
+                value = await reader.readexactly(value_size) if value_size else b""
+                if op == OP_GET:
+                    data = self._cache.get(key)
+                elif op == OP_PUT:
+                    self._cache.put(key, value, size=len(value))
+                    continue
+                elif op == OP_STATS:
+                    data = json.dumps(self.stats()).encode("utf-8")
+                else:
+                    Logger.warning(f"Unknown op: {op}", TAG)
+                    break
+
+                if data is None:
+                    writer.write(RESPONSE_HEADER.pack(MISS))
+                else:
+                    writer.write(RESPONSE_HEADER.pack(len(data)) + data)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def run_shared_cache_server(path: str, max_items: int, max_bytes: int):
+    """Serve the shared cache until SIGTERM or SIGINT"""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    server = loop.run_until_complete(SharedCacheServer(max_items, max_bytes).start(path))
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, loop.stop)
+
+    try:
+        loop.run_forever()
+    finally:
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+        loop.close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def start_shared_cache_process(path: str, max_items: int, max_bytes: int) -> multiprocessing.Process:
+    """Start the cache process. It is terminated with the process which started it"""
+    process = multiprocessing.Process(target=run_shared_cache_server, args=(path, max_items, max_bytes),
+                                      name="icon_rpcserver_cache", daemon=True)
+    process.start()
+    Logger.info(f"Shared cache process({process.pid}) on {path}", TAG)
+    return process
+
+
+class SharedCacheClient(metaclass=SingletonMetaClass):
+    """Connection of a worker to the cache process.
+
+    It connects on the first use in each worker. Requests are pipelined and answered in order.
+    """
+
+    def __init__(self, path: str = "", timeout: float = 1.0):
+        """
+        :param path: Unix socket path of the cache process. empty string disables the shared cache
+        :param timeout: seconds to wait for a connection or an answer
+        """
+        self._path = path
+        self._timeout = timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: Deque[asyncio.Future] = deque()
+        self._connect_flight = SingleFlight()
+        self._reconnect_at = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._path)
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """
+        :return: cached value. None if it is not cached or the cache process is not available
+        """
+        return await self._call(_request(OP_GET, key.encode("utf-8")))
+
+    def put(self, key: str, value: bytes):
+        """Put the value without waiting. It is dropped if the worker is not connected yet"""
+        if self._writer is None:
+            if self.enabled:
+                asyncio.ensure_future(self._connect())
+            return
+        if self._writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            return
+
+        self._writer.write(_request(OP_PUT, key.encode("utf-8"), value))
+
+    async def stats(self) -> Optional[dict]:
+        data = await self._call(_request(OP_STATS, b""))
+        return None if data is None else json.loads(data)
+
+    async def close(self):
+        if self._writer is not None:
+            writer = self._writer
+            self._disconnect()
+            await writer.wait_closed()
+
+    async def _call(self, request: bytes) -> Optional[bytes]:
+        if not await self._connect():
+            return None
+
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self._pending.append(future)
+        self._writer.write(request)
+        # the future stays in the pending queue after timeout, so the following answers are not mixed up
+        timer = loop.call_later(self._timeout, self._expire, future)
+        try:
+            return await future
+        finally:
+            timer.cancel()
+
+    def _expire(self, future: asyncio.Future):
+        if not future.done():
+            Logger.warning(f"No answer in {self._timeout}s", TAG)
+            future.set_result(None)
+
+    async def _connect(self) -> bool:
+        if self._writer is not None:
+            return True
+        if not self.enabled or time.monotonic() < self._reconnect_at:
+            return False
+        return await self._connect_flight.do(None, self._open)
+
+    async def _open(self) -> bool:
+        if self._writer is not None:
+            return True
+        try:
+            self._reader, self._writer = await asyncio.wait_for(asyncio.open_unix_connection(self._path),
+                                                                self._timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            Logger.warning(f"Failed to connect to {self._path}: {e!r}", TAG)
+            self._reconnect_at = time.monotonic() + RECONNECT_INTERVAL
+            return False
+
+        asyncio.ensure_future(self._read_answers(self._reader))
+        return True
+
+    async def _read_answers(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                size, = RESPONSE_HEADER.unpack(await reader.readexactly(RESPONSE_HEADER.size))
+                data = None if size == MISS else await reader.readexactly(size)
+                future = self._pending.popleft()
+                if not future.done():
+                    future.set_result(data)
+        except (asyncio.IncompleteReadError, ConnectionError, IndexError) as e:
+            if self._reader is reader:
+                Logger.warning(f"Disconnected from {self._path}: {e!r}", TAG)
+        finally:
+            if self._reader is reader:
+                self._disconnect()
+
+    def _disconnect(self):
+        writer, self._reader, self._writer = self._writer, None, None
+        self._reconnect_at = time.monotonic() + RECONNECT_INTERVAL
+        if writer is not None:
+            writer.close()
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_result(None)
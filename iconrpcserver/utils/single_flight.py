@@ -0,0 +1,77 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one call.
+
+    Callers which arrive while a call for the key is in flight wait for its result or exception.
+    The call keeps running even if the caller which started it is cancelled.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        # the number of calls made, and the number of callers which waited for a call in flight
+        self.calls = 0
+        self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Call func, or wait for the call in flight with the same key
+
+        :param key: key of the call
+        :param func: returns an awaitable
+        :return: result of the call
+        """
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func())
+            self._calls[key] = future
+            future.add_done_callback(lambda f: self._forget(key, f))
+            self.calls += 1
+        else:
+            self.shared += 1
+
+        return await asyncio.shield(future)
+
+    def _forget(self, key: Hashable, future: asyncio.Future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        """
+        :return: the number of calls, shared callers and the ratio of shared callers to all callers
+        """
+        callers = self.calls + self.shared
+        return {
+            "calls": self.calls,
+            "shared": self.shared,
+            "coalescing_ratio": self.shared / callers if callers else 0.0,
+        }
+
+
+def freeze(value: Any) -> Hashable:
+    """Hashable key of JSON-like params. Values of different types, e.g. 1 and True, have different keys"""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return dict, tuple(sorted((key, freeze(each)) for key, each in value.items()))
+    if isinstance(value, (list, tuple)):
+        return list, tuple(freeze(each) for each in value)
+    return type(value), value
@@ -0,0 +1,238 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Bounded queues of the frames sent to websocket subscribers.
+
+Frames are sent to a subscriber by a writer task, so a publisher does not wait for each send.
+When a queue reaches the high watermark, the subscriber is slow. By the policy, the subscriber is either
+disconnected, or it catches up: the queued frames of blocks are dropped, and once the queue drains to
+the low watermark, its publisher resumes from the first dropped block, fetching the blocks a range at a time.
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, AsyncIterator, Deque, Dict, Optional, Tuple
+
+from iconcommons.logger import Logger
+
+from ..components import SingletonMetaClass
+
+if TYPE_CHECKING:
+    from websockets import WebSocketCommonProtocol
+
+# policies for slow subscribers
+CATCH_UP = "catchUp"
+DISCONNECT = "disconnect"
+
+TAG = "WS_QUEUE"
+
+
+class SlowSubscriberError(Exception):
+    pass
+
+
+class SubscriberBehindError(Exception):
+    """The frames of blocks to a slow subscriber are dropped. Its publisher catches up from next_height"""
+
+    def __init__(self, next_height: int):
+        super().__init__(f"Catch up from {next_height}")
+        self.next_height = next_height
+
+
+class SendQueue:
+    def __init__(self, ws: 'WebSocketCommonProtocol', subscriber_id: str,
+                 high_watermark: int = 0, low_watermark: int = 0, policy: str = CATCH_UP, alpha: float = 0.2):
+        """
+        :param subscriber_id: id of the subscriber in logs and metrics
+        :param high_watermark: frames in the queue of a slow subscriber. 0 disables the queue,
+            and the publisher waits for each send
+        :param low_watermark: frames in the queue when the publisher of a slow subscriber resumes
+        :param policy: CATCH_UP or DISCONNECT
+        :param alpha: weight of the latest send in the moving average of send latency
+        """
+        self.subscriber_id = subscriber_id
+        self.high_watermark = high_watermark
+        self.low_watermark = min(low_watermark, high_watermark)
+        self.policy = policy
+        self.alpha = alpha
+        self.sent = 0
+        self.slow = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.send_latency = 0.0
+        self.max_send_latency = 0.0
+        self._ws = ws
+        # frames and the first height of the blocks in them. None for frames which are not of blocks
+        self._frames: Deque[Tuple[str, Optional[int]]] = deque()
+        self._drained = asyncio.Event()
+        self._writer: Optional[asyncio.Future] = None
+        self._error: Optional[BaseException] = None
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    async def put(self, frame: str, height: Optional[int] = None):
+        """Queue the frame. While the subscriber is slow, frames of blocks are dropped, and other frames wait
+
+        :param height: first height of the blocks in the frame. None if the frame is not of blocks
+        :raise SlowSubscriberError: the subscriber is slow, and the policy is DISCONNECT
+        :raise SubscriberBehindError: the frames of blocks are dropped, and the frame is not queued either.
+            the publisher catches up from its next_height after the queue drains
+        :raise ConnectionClosed: the error which stopped the writer
+        """
+        self._raise_error()
+        if self.high_watermark <= 0 and self._writer is None:
+            await self._send(frame)
+            return
+
+        if len(self._frames) >= self.high_watermark:
+            self.slow += 1
+            if self.policy == DISCONNECT:
+                raise SlowSubscriberError(f"{len(self._frames)} frames are not sent")
+
+            if height is not None:
+                dropped_height = self._drop_blocks()
+                next_height = height if dropped_height is None else dropped_height
+                Logger.info(f"Subscriber({self.subscriber_id}) falls behind. Catch up from {next_height}", TAG)
+                await self._wait_drained()
+                raise SubscriberBehindError(next_height)
+
+            Logger.info(f"Subscriber({self.subscriber_id}) falls behind. {len(self._frames)} frames are not sent", TAG)
+            await self._wait_drained()
+
+        self._append(frame, height)
+
+    def put_nowait(self, frame: str):
+        """Queue the frame without waiting, for a publisher shared by subscribers which can not wait for one of them.
+        Without the queue, the frames are sent in order by the writer
+
+        :raise SlowSubscriberError: the subscriber is slow, regardless of the policy
+        :raise ConnectionClosed: the error which stopped the writer
+        """
+        self._raise_error()
+        if 0 < self.high_watermark <= len(self._frames):
+            self.slow += 1
+            raise SlowSubscriberError(f"{len(self._frames)} frames are not sent")
+        self._append(frame, None)
+
+    async def flush(self):
+        """Wait until the frames in the queue are sent"""
+        if self._writer is not None:
+            await asyncio.shield(self._writer)
+        self._raise_error()
+
+    def close(self):
+        """Drop the frames which are not sent"""
+        self._frames.clear()
+        if self._writer is not None:
+            self._writer.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "depth": len(self._frames),
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "slow": self.slow,
+            "dropped": self.dropped,
+            "send_latency": self.send_latency,
+            "max_send_latency": self.max_send_latency,
+        }
+
+    def _append(self, frame: str, height: Optional[int]):
+        self._frames.append((frame, height))
+        self.max_depth = max(self.max_depth, len(self._frames))
+        if self._writer is None:
+            self._writer = asyncio.ensure_future(self._write())
+
+    async def _send(self, frame: str):
+        start = time.monotonic()
+        await self._ws.send(frame)
+        latency = time.monotonic() - start
+        self.sent += 1
+        self.send_latency += self.alpha * (latency - self.send_latency)
+        self.max_send_latency = max(self.max_send_latency, latency)
+
+    async def _write(self):
+        try:
+            while self._frames:
+                await self._send(self._frames[0][0])
+                self._frames.popleft()
+                if len(self._frames) <= self.low_watermark:
+                    self._drained.set()
+        except Exception as e:
+            self._error = e
+            self._frames.clear()
+        finally:
+            self._writer = None
+            self._drained.set()
+
+    def _drop_blocks(self) -> Optional[int]:
+        """Drop the queued frames of blocks, but the one being sent
+
+        :return: first height of the dropped blocks. None if none is dropped
+        """
+        if not self._frames:
+            return None
+        head, *rest = self._frames
+        dropped = [height for _, height in rest if height is not None]
+        if dropped:
+            self._frames = deque([head, *(item for item in rest if item[1] is None)])
+            self.dropped += len(dropped)
+        return dropped[0] if dropped else None
+
+    async def _wait_drained(self):
+        if len(self._frames) > self.low_watermark:
+            self._drained.clear()
+            await self._drained.wait()
+        self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+
+class SendQueues(metaclass=SingletonMetaClass):
+    """Send queues of the websocket subscribers of a worker"""
+
+    def __init__(self, high_watermark: int = 0, low_watermark: int = 0, policy: str = CATCH_UP):
+        """
+        :param high_watermark: frames in the queue of a slow subscriber. 0 disables the queues
+        :param low_watermark: frames in the queue when the publisher of a slow subscriber resumes
+        :param policy: CATCH_UP to drop the frames of blocks to the slow subscriber and catch up later,
+            or DISCONNECT
+        """
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.policy = policy
+        self._queues: Dict[int, SendQueue] = {}
+
+    def __len__(self) -> int:
+        return len(self._queues)
+
+    @asynccontextmanager
+    async def open(self, ws: 'WebSocketCommonProtocol', subscriber_id: str) -> AsyncIterator[SendQueue]:
+        """The send queue of the subscriber. Frames in the queue are sent before it is closed without an error"""
+        queue = SendQueue(ws, subscriber_id, self.high_watermark, self.low_watermark, self.policy)
+        self._queues[id(queue)] = queue
+        try:
+            yield queue
+            await queue.flush()
+        finally:
+            queue.close()
+            del self._queues[id(queue)]
+
+    def stats(self) -> Dict[str, dict]:
+        """Metrics of the queue of each subscriber"""
+        return {queue.subscriber_id: queue.stats() for queue in self._queues.values()}
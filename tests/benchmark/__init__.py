@@ -0,0 +1,40 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Micro benchmarks. They are not collected by pytest.
+
+Run each module directly, e.g. `python -m tests.benchmark.bench_validator`
+"""
+
+import time
+from typing import Callable
+
+
+def measure(func: Callable, duration: float = 1.0) -> float:
+    """Call func repeatedly for about `duration` seconds
+
+    :return: calls per second
+    """
+    count = 0
+    start = time.perf_counter()
+    deadline = start + duration
+    while True:
+        func()
+        count += 1
+        now = time.perf_counter()
+        if now >= deadline:
+            return count / (now - start)
+
+
+def report(name: str, before: float, after: float, unit: str = "req/s"):
+    print(f"{name:<32} before: {before:>12,.0f} {unit}  after: {after:>12,.0f} {unit}  x{after / before:.2f}")
@@ -0,0 +1,49 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compare validation throughput of cached Draft4Validators and compiled validation mode."""
+
+from iconrpcserver.dispatcher import validator
+from tests import create_address, create_tx_hash
+from tests.benchmark import measure, report
+from tests.benchmark.bench_validator import REQUESTS
+
+HOT_REQUESTS = {
+    "icx_call": REQUESTS["icx_call"],
+    "icx_getBalance": {
+        "jsonrpc": "2.0",
+        "method": "icx_getBalance",
+        "id": 1234,
+        "params": {"address": create_address(b'owner')}
+    },
+    "icx_sendTransaction": REQUESTS["icx_sendTransaction"],
+    "icx_getTransactionResult": {
+        "jsonrpc": "2.0",
+        "method": "icx_getTransactionResult",
+        "id": 1234,
+        "params": {"txHash": create_tx_hash(b'tx')}
+    },
+}
+
+
+def main():
+    for method, request in HOT_REQUESTS.items():
+        validator.set_compiled_validation(False)
+        before = measure(lambda: validator.validate_jsonschema_v3(request))
+        validator.set_compiled_validation(True)
+        after = measure(lambda: validator.validate_jsonschema_v3(request))
+        report(method, before, after)
+
+
+if __name__ == "__main__":
+    main()
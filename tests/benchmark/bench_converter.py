@@ -0,0 +1,110 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compare the recursive converter with the compiled templates on blocks with 1k-10k transactions.
+
+Memory allocated by the conversion of a decoded block is measured with tracemalloc for each mode.
+"""
+
+import json
+import tracemalloc
+from typing import Callable, Tuple
+
+from iconrpcserver.utils.icon_service import ResponseParamType
+from iconrpcserver.utils.icon_service.converter import _convert, compiled_templates, compiled_templates_in_place
+from iconrpcserver.utils.icon_service.templates import templates
+from tests import create_address, create_tx_hash
+from tests.benchmark import measure, report
+
+
+def create_block_v0_3(tx_count: int) -> dict:
+    transactions = [
+        {
+            "version": "0x3",
+            "from": create_address(f"from{i}".encode()),
+            "to": create_address(f"to{i}".encode()),
+            "value": hex(i * 10 ** 18),
+            "stepLimit": "0x12345",
+            "timestamp": hex(1600000000000000 + i),
+            "nid": "0x1",
+            "nonce": hex(i),
+            "signature": "VAia7YZ2Ji6igKWzjR2YsGa2m53nKPrfK7uXYW78QLE+ATehAVZPC40szvAiA6NEU5gCYB4c4qaQzqDh2ugcHgA=",
+            "txHash": create_tx_hash(f"tx{i}".encode()),
+        }
+        for i in range(tx_count)
+    ]
+    return {
+        "version": "0.3",
+        "prevHash": create_tx_hash(b"prev"),
+        "transactionsHash": create_tx_hash(b"transactions"),
+        "stateHash": create_tx_hash(b"state"),
+        "receiptsHash": create_tx_hash(b"receipts"),
+        "repsHash": create_tx_hash(b"reps"),
+        "nextRepsHash": create_tx_hash(b"reps"),
+        "leaderVotesHash": create_tx_hash(b"leaderVotes"),
+        "prevVotesHash": create_tx_hash(b"prevVotes"),
+        "logsBloom": "0x" + "0" * 512,
+        "timestamp": hex(1600000000000000),
+        "transactions": transactions,
+        "leaderVotes": [],
+        "prevVotes": [],
+        "hash": create_tx_hash(b"block"),
+        "height": "0x64",
+        "leader": create_address(b"leader"),
+        "signature": "OPHFV8Zfyr//lP+SmKsr/RK3yawJDtolrfsdqDFKh3wxmyMh243zVp7CTLRu5wG5PdneX7mHzuLA9x41mqzjrAE=",
+        "nextLeader": create_address(b"leader"),
+    }
+
+
+def measure_memory(convert: Callable, block_json: str) -> Tuple[int, int]:
+    """
+    :return: peak memory allocated during the conversion, and memory held by the result except the block
+    """
+    block = json.loads(block_json)
+    tracemalloc.start()
+    result = convert(block)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak, current
+
+
+def main():
+    param_types = (ResponseParamType.get_block_v0_3_tx_v3, ResponseParamType.get_block_v0_1a_tx_v3,
+                   ResponseParamType.get_block_v0_1a_tx_v2)
+    for tx_count in (1000, 5000, 10000):
+        block = create_block_v0_3(tx_count)
+        block_json = json.dumps(block)
+        for param_type in param_types:
+            template, compiled = templates[param_type], compiled_templates[param_type]
+            assert _convert(block, template) == compiled(block)
+            before = measure(lambda: _convert(block, template))
+            after = measure(lambda: compiled(block))
+            report(f"{tx_count} txs {param_type.name}", before, after, unit="blocks/s")
+            in_place = compiled_templates_in_place[param_type]
+            before = measure(lambda: compiled(json.loads(block_json)))
+            after = measure(lambda: in_place(json.loads(block_json)))
+            report(f"{tx_count} txs {param_type.name} decode+convert in place", before, after, unit="blocks/s")
+
+        print(f"{tx_count} txs: {len(block_json) // 1024}KiB JSON")
+        for param_type in param_types:
+            for name, convert in (("recursive", lambda block: _convert(block, templates[param_type])),
+                                  ("compiled", compiled_templates[param_type]),
+                                  ("in place", compiled_templates_in_place[param_type])):
+                peak, current = measure_memory(convert, block_json)
+                print(f"  {param_type.name:<24} {name:<10} peak: {peak / 1024:>10,.0f} KiB  "
+                      f"held: {current / 1024:>10,.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
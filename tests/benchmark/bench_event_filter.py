@@ -0,0 +1,144 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Matching the event logs of a block with 10k event subscriptions, by each filter and through EventFilterIndex.
+
+The publish time is of SubscriptionHub with a local stand-in channel which answers get_block_receipts at once,
+so it includes decoding the receipts and encoding the pushes, but not the message queue and the network.
+"""
+
+import asyncio
+import json
+import random
+import time
+
+from iconrpcserver.dispatcher.v3.subscription import EVENT, SubscriberConnection, SubscriptionHub
+from iconrpcserver.utils import message_code
+from iconrpcserver.utils.event_filter import EventFilterIndex
+from iconrpcserver.utils.message_queue.stub_collection import StubCollection
+from iconrpcserver.utils.new_block_hub import NewBlock
+from iconrpcserver.utils.ws_send_queue import SendQueue
+from tests import create_address, create_tx_hash
+
+CHANNEL = "icon_dex"
+SUBSCRIPTIONS = 10000
+SCORES = [create_address(str(i).encode(), is_eoa=False) for i in range(4000)]
+EVENTS = [f"Event{i}(Address,int)" for i in range(20)]
+LOGS_PER_TX = 4
+
+
+def create_receipts(height: int, logs: int) -> list:
+    rand = random.Random(height)
+    return [
+        {
+            "txHash": create_tx_hash(f"{height}/{i}".encode()),
+            "eventLogs": [{"scoreAddress": rand.choice(SCORES), "indexed": [rand.choice(EVENTS), "hx1"], "data": []}
+                          for _ in range(LOGS_PER_TX)]
+        }
+        for i in range(logs // LOGS_PER_TX)
+    ]
+
+
+class StandInChannelStub:
+    def __init__(self, logs: int, blocks: int):
+        self.receipts = {height: json.dumps(create_receipts(height, logs)) for height in range(1, blocks + 1)}
+
+    def async_task(self):
+        return self
+
+    async def get_block_receipts(self, block_height: int, block_hash: str):
+        return message_code.Response.success, self.receipts[block_height]
+
+
+class StandInWebSocket:
+    def __init__(self):
+        self.frames = 0
+
+    async def send(self, frame: str):
+        self.frames += 1
+
+
+def create_filters() -> list:
+    rand = random.Random(0)
+    # a few filters are of any SCORE, and half of the SCOREs are subscribed
+    return [(rand.choice(EVENTS), None if i % 1000 == 0 else rand.choice(SCORES[:2000]))
+            for i in range(SUBSCRIPTIONS)]
+
+
+def match_by_filters(filters: list, receipts: list) -> int:
+    matches = 0
+    for receipt in receipts:
+        for event_log in receipt["eventLogs"]:
+            for event, addr in filters:
+                if event_log["indexed"][0] == event and (addr is None or event_log["scoreAddress"] == addr):
+                    matches += 1
+    return matches
+
+
+def match_by_index(index: EventFilterIndex, receipts: list) -> int:
+    matches = 0
+    for receipt in receipts:
+        for event_log in receipt["eventLogs"]:
+            for _ in index.match(event_log):
+                matches += 1
+    return matches
+
+
+async def publish(filters: list, logs: int, blocks: int):
+    SubscriptionHub.clear()
+    hub = SubscriptionHub()
+    StubCollection().channel_stubs[CHANNEL] = StandInChannelStub(logs, blocks)
+    ws = StandInWebSocket()
+    connection = SubscriberConnection(ws, SendQueue(ws, "bench"), "bench")
+    for event, addr in filters:
+        hub.subscribe(CHANNEL, connection, EVENT, {"event": event, "addr": addr})
+    for follower in hub._followers.values():
+        follower.cancel()
+
+    start = time.perf_counter()
+    for height in range(1, blocks + 1):
+        await hub._publish(CHANNEL, NewBlock(height, {"hash": create_tx_hash(str(height).encode())}, "", "", ""))
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+    await connection.send_queue.flush()
+    print(f"  publish with the index: {elapsed / blocks * 1000:>8.1f}ms a block, {hub.pushes // blocks} pushes")
+
+
+async def run():
+    filters = create_filters()
+    index = EventFilterIndex()
+    for i, (event, addr) in enumerate(filters):
+        index.add(event, addr, hex(i), i)
+
+    for logs in (1000, 5000):
+        receipts = create_receipts(1, logs)
+        print(f"{SUBSCRIPTIONS} event subscriptions, {logs} logs a block")
+
+        start = time.perf_counter()
+        matches = match_by_filters(filters, receipts)
+        print(f"  match by each filter:   {(time.perf_counter() - start) * 1000:>8.1f}ms a block, {matches} matches")
+
+        start = time.perf_counter()
+        for _ in range(10):
+            matches = match_by_index(index, receipts)
+        print(f"  match by the index:     {(time.perf_counter() - start) * 100:>8.1f}ms a block, {matches} matches")
+
+        await publish(filters, logs, 10)
+
+
+def main():
+    asyncio.get_event_loop().run_until_complete(run())
+
+
+if __name__ == "__main__":
+    main()
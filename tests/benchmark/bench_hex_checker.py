@@ -0,0 +1,77 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compare the regex based format checkers with the translate based ones.
+
+binary_data is measured with the sizes of deploy transaction content up to REQUEST_MAX_SIZE.
+"""
+
+import re
+
+from iconrpcserver.default_conf.icon_rpcserver_config import default_rpcserver_config
+from iconrpcserver.default_conf.icon_rpcserver_constant import ConfigKey
+from iconrpcserver.dispatcher.validator import check_address, check_binary_data, check_hash
+from tests.benchmark import measure, report
+
+
+def is_lowercase_hex_string_with_regex(value: str) -> bool:
+    """The former behavior"""
+    try:
+        result = re.match('[0-9a-f]+', value)
+        return len(result.group(0)) == len(value)
+    except:
+        pass
+
+    return False
+
+
+def check_address_with_regex(address: str):
+    return isinstance(address, str) and len(address) == 42 \
+        and address[:2] in ('hx', 'cx') and is_lowercase_hex_string_with_regex(address[2:])
+
+
+def check_hash_with_regex(value: str):
+    return isinstance(value, str) and len(value) == 66 \
+        and value.startswith('0x') and is_lowercase_hex_string_with_regex(value[2:])
+
+
+def check_binary_data_with_regex(value: str):
+    return isinstance(value, str) and len(value) % 2 == 0 \
+        and value.startswith('0x') and is_lowercase_hex_string_with_regex(value[2:])
+
+
+REQUEST_MAX_SIZE = default_rpcserver_config[ConfigKey.REQUEST_MAX_SIZE]
+
+
+def main():
+    address = "hx" + "0123456789abcdef" * 2 + "01234567"
+    before = measure(lambda: check_address_with_regex(address))
+    after = measure(lambda: check_address(address))
+    report("address", before, after, unit="checks/s")
+
+    tx_hash = "0x" + "0123456789abcdef" * 4
+    before = measure(lambda: check_hash_with_regex(tx_hash))
+    after = measure(lambda: check_hash(tx_hash))
+    report("hash", before, after, unit="checks/s")
+
+    size = 1024
+    while size <= REQUEST_MAX_SIZE:
+        content = "0x" + "0123456789abcdef" * ((size - 2) // 16)
+        before = measure(lambda: check_binary_data_with_regex(content))
+        after = measure(lambda: check_binary_data(content))
+        report(f"binary_data {len(content)} bytes", before, after, unit="checks/s")
+        size *= 16 if size < REQUEST_MAX_SIZE // 16 else 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compare the JSON codecs on large blocks, compared with stdlib json.
+
+Codecs which are not installed are skipped.
+"""
+
+import json
+
+from iconrpcserver.utils.json_codec import AUTO_CODECS, JsonCodec, create_json_codec
+from tests import create_address, create_tx_hash
+from tests.benchmark import measure, report
+
+
+def create_block(tx_count: int) -> dict:
+    transactions = [
+        {
+            "version": "0x3",
+            "from": create_address(f"from{i}".encode()),
+            "to": create_address(f"to{i}".encode()),
+            "value": hex(i * 10 ** 18),
+            "stepLimit": "0x12345",
+            "timestamp": hex(1600000000000000 + i),
+            "nid": "0x1",
+            "nonce": hex(i),
+            "signature": "VAia7YZ2Ji6igKWzjR2YsGa2m53nKPrfK7uXYW78QLE+ATehAVZPC40szvAiA6NEU5gCYB4c4qaQzqDh2ugcHgA=",
+            "txHash": create_tx_hash(f"tx{i}".encode()),
+        }
+        for i in range(tx_count)
+    ]
+    return {
+        "jsonrpc": "2.0",
+        "id": 1234,
+        "result": {
+            "version": "0.5",
+            "prev_block_hash": create_tx_hash(b"prev")[2:],
+            "merkle_tree_root_hash": create_tx_hash(b"root")[2:],
+            "time_stamp": 1600000000000000,
+            "confirmed_transaction_list": transactions,
+            "block_hash": create_tx_hash(b"block")[2:],
+            "height": 100,
+            "peer_id": create_address(b"leader"),
+            "signature": "VAia7YZ2Ji6igKWzjR2YsGa2m53nKPrfK7uXYW78QLE+ATehAVZPC40szvAiA6NEU5gCYB4c4qaQzqDh2ugcHgA=",
+        }
+    }
+
+
+def main():
+    stdlib = JsonCodec()
+    codecs = [create_json_codec(name) for name in AUTO_CODECS if name != stdlib.name]
+    for tx_count in (10, 1000, 5000):
+        block = create_block(tx_count)
+        encoded = json.dumps(block)
+        for codec in codecs:
+            if codec.name == stdlib.name:
+                # not installed
+                continue
+            name = f"{tx_count} txs {len(encoded) // 1024}KiB {codec.name}"
+            before = measure(lambda: stdlib.dumpb(block))
+            after = measure(lambda: codec.dumpb(block))
+            report(f"{name} dumps", before, after, unit="blocks/s")
+            before = measure(lambda: stdlib.loads(encoded))
+            after = measure(lambda: codec.loads(encoded))
+            report(f"{name} loads", before, after, unit="blocks/s")
+
+
+if __name__ == "__main__":
+    main()
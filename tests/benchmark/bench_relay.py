@@ -0,0 +1,80 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compare relaying transactions with a session for each relay, with the session pool and with the batcher.
+
+The relay target is a local stand-in in the same event loop, so connecting is cheap compared to a real rep
+and the measured time includes the time of the stand-in.
+"""
+
+import asyncio
+import time
+
+from iconrpcserver.utils.json_rpc import relay_tx_request
+from iconrpcserver.utils.relay import RelayBatcher, RelaySessionPool
+from tests.benchmark import report
+from tests.test_relay import start_relay_target
+
+RELAYS = 1000
+CONCURRENCY = 50
+
+
+async def relay(target: str, concurrency: int) -> float:
+    """
+    :return: relays per second
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _relay():
+        async with semaphore:
+            await relay_tx_request(target, {"from": "hx" + "a" * 40}, "api/v3")
+
+    start = time.perf_counter()
+    await asyncio.gather(*[_relay() for _ in range(RELAYS)])
+    return RELAYS / (time.perf_counter() - start)
+
+
+async def measure_relays(target: str, limit: int, concurrency: int, batch_size: int = 0) -> float:
+    RelaySessionPool.clear()
+    RelayBatcher.clear()
+    session_pool = RelaySessionPool(limit)
+    RelayBatcher(batch_size, max_delay=0.002)
+    try:
+        return await relay(target, concurrency)
+    finally:
+        await session_pool.close()
+        RelayBatcher.clear()
+
+
+async def run():
+    async with start_relay_target() as (target, peers):
+        for concurrency in (1, CONCURRENCY):
+            before = await measure_relays(target, 0, concurrency)
+            connections = len(set(peers))
+            after = await measure_relays(target, 32, concurrency)
+            report(f"{concurrency} concurrent relays", before, after, unit="tx/s")
+            print(f"  connections: {connections} -> {len(set(peers)) - connections}")
+            peers.clear()
+
+        for batch_size in (4, 16, 64):
+            before = await measure_relays(target, 32, CONCURRENCY)
+            after = await measure_relays(target, 32, CONCURRENCY, batch_size)
+            report(f"batches of {batch_size}", before, after, unit="tx/s")
+
+
+def main():
+    asyncio.get_event_loop().run_until_complete(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compare the caches of each worker with the cache shared by the workers.
+
+Workers get blocks in a skewed distribution and cache them in a cache of the same capacity.
+Hit rate and total RSS of the worker processes(and the cache process) are reported. Linux only.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from iconrpcserver.utils.cache import LRUCache
+from iconrpcserver.utils.shared_cache import SharedCacheClient, start_shared_cache_process
+
+WORKERS = 4
+BLOCKS = 4096
+REQUESTS = 20000
+CACHE_ITEMS = 512
+BLOCK_SIZE = 16 * 1024
+
+
+def rss_kib(pid="self") -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def requests(seed: int):
+    weights = [1 / (i + 1) for i in range(BLOCKS)]
+    return random.Random(seed).choices(range(BLOCKS), weights=weights, k=REQUESTS)
+
+
+def load_block(height: int) -> bytes:
+    return str(height).encode().ljust(BLOCK_SIZE, b" ")
+
+
+def run_local_worker(seed: int, results: multiprocessing.Queue):
+    cache = LRUCache(CACHE_ITEMS)
+    hits = 0
+    for height in requests(seed):
+        if cache.get(height) is None:
+            block = load_block(height)
+            cache.put(height, block, size=len(block))
+        else:
+            hits += 1
+    results.put((hits, rss_kib()))
+
+
+def run_shared_worker(seed: int, path: str, results: multiprocessing.Queue):
+    async def run() -> int:
+        client = SharedCacheClient(path)
+        hits = 0
+        for height in requests(seed):
+            key = f"b/{height}"
+            if await client.get(key) is None:
+                client.put(key, load_block(height))
+            else:
+                hits += 1
+        await client.close()
+        return hits
+
+    hits = asyncio.get_event_loop().run_until_complete(run())
+    results.put((hits, rss_kib()))
+
+
+def run_workers(target, *args) -> (float, int, float):
+    results = multiprocessing.Queue()
+    start = time.perf_counter()
+    workers = [multiprocessing.Process(target=target, args=(seed, *args, results)) for seed in range(WORKERS)]
+    for worker in workers:
+        worker.start()
+    answers = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    hit_rate = sum(hits for hits, _ in answers) / (REQUESTS * WORKERS)
+    return hit_rate, sum(rss for _, rss in answers), elapsed
+
+
+def report(name: str, hit_rate: float, rss: int, elapsed: float):
+    throughput = REQUESTS * WORKERS / elapsed
+    print(f"{name:<12} hit rate: {hit_rate:>6.1%}  RSS: {rss / 1024:>8,.1f} MiB  {throughput:>10,.0f} req/s")
+
+
+def main():
+    print(f"{WORKERS} workers, {BLOCKS} blocks of {BLOCK_SIZE // 1024}KiB, cache of {CACHE_ITEMS} blocks")
+    report("per-worker", *run_workers(run_local_worker))
+
+    # the same capacity, and the same total capacity as the caches of the workers
+    for name, cache_items in (("shared", CACHE_ITEMS), (f"shared x{WORKERS}", CACHE_ITEMS * WORKERS)):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache.sock")
+            process = start_shared_cache_process(path, cache_items, 0)
+            while not os.path.exists(path):
+                time.sleep(0.01)
+            hit_rate, rss, elapsed = run_workers(run_shared_worker, path)
+            report(name, hit_rate, rss + rss_kib(process.pid), elapsed)
+            process.terminate()
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
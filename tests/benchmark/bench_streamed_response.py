@@ -0,0 +1,64 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compare the peak memory of encoding a converted block at once with streaming it.
+
+Memory allocated after the block is decoded is measured with tracemalloc, as if the response was written.
+"""
+
+import json
+import tracemalloc
+from typing import Callable
+
+from iconrpcserver.utils import json_codec
+from iconrpcserver.utils.icon_service import ResponseParamType
+from iconrpcserver.utils.icon_service.converter import compile_item_template, convert_params
+from iconrpcserver.utils.json_codec import StreamedResult
+from tests.benchmark.bench_converter import create_block_v0_3
+
+PARAM_TYPE = ResponseParamType.get_block_v0_3_tx_v3
+
+
+def encode(block: dict) -> int:
+    body = json_codec.dumpb(convert_params(block, PARAM_TYPE, in_place=True))
+    # the response is logged as text
+    return len(body.decode())
+
+
+def stream(block: dict) -> int:
+    transactions, block["transactions"] = block["transactions"], []
+    response = convert_params(block, PARAM_TYPE, in_place=True)
+    result = StreamedResult.from_dict(response, "transactions", transactions,
+                                      compile_item_template(PARAM_TYPE, "transactions"))
+    return sum(len(chunk) for chunk in result)
+
+
+def measure_peak(write: Callable[[dict], int], block_json: str) -> int:
+    block = json.loads(block_json)
+    tracemalloc.start()
+    write(block)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    for tx_count in (1000, 10000, 50000):
+        block_json = json.dumps(create_block_v0_3(tx_count))
+        encoded, streamed = (measure_peak(write, block_json) for write in (encode, stream))
+        print(f"{tx_count:>6} txs {len(block_json) // 1024:>8,} KiB JSON  peak encoded: {encoded // 1024:>8,} KiB  "
+              f"streamed: {streamed // 1024:>6,} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compare validation throughput of a validator created per request and a cached one."""
+
+from jsonschema import Draft4Validator
+
+from iconrpcserver.dispatcher.validator import SCHEMA_V3, format_checker, validate_jsonschema_v3
+from tests import create_address, create_tx_hash
+from tests.benchmark import measure, report
+
+REQUESTS = {
+    "icx_call": {
+        "jsonrpc": "2.0",
+        "method": "icx_call",
+        "id": 1234,
+        "params": {
+            "from": create_address(b'from'),
+            "to": create_address(b'score', is_eoa=False),
+            "dataType": "call",
+            "data": {
+                "method": "balanceOf",
+                "params": {"_owner": create_address(b'owner')}
+            }
+        }
+    },
+    "icx_sendTransaction": {
+        "jsonrpc": "2.0",
+        "method": "icx_sendTransaction",
+        "id": 1234,
+        "params": {
+            "version": "0x3",
+            "from": create_address(b'from'),
+            "to": create_address(b'to'),
+            "value": "0xde0b6b3a7640000",
+            "stepLimit": "0x12345",
+            "timestamp": "0x563a6cf330136",
+            "nid": "0x3",
+            "nonce": "0x1",
+            "signature": "VAia7YZ2Ji6igKWzjR2YsGa2m53nKPrfK7uXYW78QLE+ATehAVZPC40szvAiA6NEU5gCYB4c4qaQzqDh2ugcHgA="
+        }
+    },
+    "icx_getBlockByHeight": {
+        "jsonrpc": "2.0",
+        "method": "icx_getBlockByHeight",
+        "id": 1234,
+        "params": {"height": "0x100"}
+    },
+}
+
+
+def validate_with_new_validator(request: dict):
+    """The former behavior: a validator is created for every request"""
+    validator = Draft4Validator(schema=SCHEMA_V3[request["method"]], format_checker=format_checker)
+    validator.validate(request)
+
+
+def main():
+    for method, request in REQUESTS.items():
+        before = measure(lambda: validate_with_new_validator(request))
+        after = measure(lambda: validate_jsonschema_v3(request))
+        report(method, before, after)
+
+
+if __name__ == "__main__":
+    main()
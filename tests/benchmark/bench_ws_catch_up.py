@@ -0,0 +1,101 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Time for a citizen 10k blocks behind to reach the last height, with and without the catch-up.
+
+The channel is a local stand-in which answers announce_new_block after LATENCY seconds, like a message queue call.
+The websocket is a stand-in which only counts the frames, so the time does not include the network.
+"""
+
+import asyncio
+import json
+import time
+
+from websockets import exceptions
+
+from iconrpcserver.dispatcher.default.websocket import WSDispatcher
+from iconrpcserver.utils.message_queue.stub_collection import StubCollection
+from iconrpcserver.utils.new_block_hub import NewBlockHub
+from iconrpcserver.utils.ws_send_queue import SendQueues
+from tests import create_address, create_tx_hash
+
+CHANNEL = "icon_dex"
+BLOCKS = 10000
+LATENCY = 0.001
+
+
+class StandInChannelStub:
+    def __init__(self, last_height: int):
+        self.last_height = last_height
+        self.calls = 0
+
+    def async_task(self):
+        return self
+
+    async def get_status(self) -> dict:
+        return {"block_height": self.last_height}
+
+    async def announce_new_block(self, subscriber_block_height: int, subscriber_id: str):
+        self.calls += 1
+        await asyncio.sleep(LATENCY)
+        block = {
+            "version": "0.5",
+            "height": subscriber_block_height,
+            "hash": create_tx_hash(str(subscriber_block_height).encode()),
+            "leader": create_address(b"leader"),
+            "transactions": [{"txHash": create_tx_hash(f"{subscriber_block_height}/{i}".encode())} for i in range(8)],
+        }
+        return json.dumps(block), b"votes" * 100
+
+
+class StandInWebSocket:
+    def __init__(self, last_height: int):
+        self.last_block = f'"height": {last_height},'
+        self.frames = 0
+        self.bytes = 0
+
+    async def send(self, frame: str):
+        self.frames += 1
+        self.bytes += len(frame)
+        if self.last_block in frame:
+            raise exceptions.ConnectionClosed(1000, "synced")
+
+
+async def sync(catch_up_blocks: int, batch_size: int):
+    NewBlockHub.clear()
+    SendQueues.clear()
+    NewBlockHub(16, catch_up_blocks)
+    SendQueues(64, 16)
+    channel_stub = StandInChannelStub(BLOCKS)
+    StubCollection().channel_stubs[CHANNEL] = channel_stub
+    ws = StandInWebSocket(BLOCKS)
+
+    start = time.perf_counter()
+    await WSDispatcher.publish_new_block(ws, CHANNEL, 1, "citizen", batch_size)
+    elapsed = time.perf_counter() - start
+    print(f"catch-up blocks {catch_up_blocks:>3}, batch size {batch_size:>3}: {elapsed:>6.2f}s  "
+          f"{channel_stub.calls:>6} calls  {ws.frames:>6} frames  {ws.bytes / 1024 / 1024:>6.1f} MiB")
+
+
+async def run():
+    print(f"{BLOCKS} blocks behind, {LATENCY * 1000}ms for announce_new_block")
+    for catch_up_blocks, batch_size in ((0, 0), (64, 0), (64, 32), (256, 64)):
+        await sync(catch_up_blocks, batch_size)
+
+
+def main():
+    asyncio.get_event_loop().run_until_complete(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -703,6 +703,8 @@ def create_icon_score_stub(**kwargs) -> IconScoreInnerStub:
 
     stub: IconScoreInnerStub = MagicMock(IconScoreInnerStub)
     stub.async_task.return_value = task
+    stub.query_batch_retry_at = 0.0
+    stub.query_batch_backoff = 0.0
 
     return stub
 
@@ -1,13 +1,20 @@
+import asyncio
 import copy
+import json
 from typing import TYPE_CHECKING
 
 import pytest
 from mock import AsyncMock
 
-from iconrpcserver.dispatcher.v3.icx import IcxDispatcher
+from iconrpcserver.default_conf.icon_rpcserver_constant import ConfigKey
+from iconrpcserver.dispatcher.v3.icx import IcxDispatcher, tx_result_flight
 from iconrpcserver.utils import message_code
+from iconrpcserver.utils.cache import BlockCache, QueryCache, TransactionCache
 from iconrpcserver.utils.json_rpc import relay_tx_request
-from tests.dispatcher.conftest import TestDispatcher, REQUESTS_V3
+from iconrpcserver.utils.message_queue.icon_score_inner_stub import QueryBatcher
+from iconrpcserver.utils.message_queue.stub_collection import StubCollection
+from tests.dispatcher.conftest import (TestDispatcher, REQUESTS_V3, CHANNEL_NAME, create_channel_stub,
+                                      create_icon_score_stub)
 
 if TYPE_CHECKING:
     from httpx import Response
@@ -191,6 +198,21 @@ class TestVersion3Dispatcher(TestDispatcher):
         for json_data in result_json:
             assert 'error' not in json_data, f"request = {json_request_batch}"
 
+    async def test_batch_with_invalid_request(self, test_cli):
+        # Given I receives a batch request with an unknown method between icx_getBalance requests
+        json_request_batch = copy.deepcopy(self.REQUESTS["icx_getBalance_batch"])
+        json_request_batch.insert(1, {"jsonrpc": "2.0", "method": "icx_unknown", "id": 0})
+        for i, json_request in enumerate(json_request_batch):
+            json_request["id"] = i
+
+        # When I call dispatch method
+        response: Response = await test_cli.post(self.URI, json=json_request_batch)
+        result_json: list = response.json()
+
+        # Then only the invalid request is answered with an error, in the order of the requests
+        assert [json_data["id"] for json_data in result_json] == list(range(len(json_request_batch)))
+        assert ['error' in json_data for json_data in result_json] == [False, True, False]
+
     async def test_icx_getScoreApi(self, test_cli):
         # Given I receives icx_getScoreApi request
         json_request = copy.deepcopy(self.REQUESTS["icx_getScoreApi"])
@@ -480,3 +502,391 @@ class TestVersion3Dispatcher(TestDispatcher):
         # Then response is not error
         for json_data in result_json:
             assert 'error' not in json_data, f"request = {json_request_batch}"
+
+
+@pytest.fixture
+def block_cache():
+    BlockCache.clear()
+    yield BlockCache(max_items=16, max_bytes=1024 * 1024)
+    BlockCache.clear()
+
+
+@pytest.fixture
+def query_cache():
+    QueryCache.clear()
+    yield QueryCache(max_items=16, max_bytes=1024 * 1024, height_ttl=60)
+    QueryCache.clear()
+
+
+@pytest.fixture
+def tx_cache():
+    TransactionCache.clear()
+    yield TransactionCache(max_items=16, max_bytes=1024 * 1024)
+    TransactionCache.clear()
+
+
+@pytest.mark.asyncio
+class TestVersion3BlockCache:
+    URI = "/api/v3"
+
+    @staticmethod
+    def get_await_count(method: str) -> int:
+        return getattr(StubCollection().channel_stubs[CHANNEL_NAME].async_task(), method).await_count
+
+    def get_block_count(self) -> int:
+        return self.get_await_count("get_block")
+
+    async def post(self, test_cli, method: str, params: dict = None) -> dict:
+        json_request = {"jsonrpc": "2.0", "method": method, "id": 1234}
+        if params is not None:
+            json_request["params"] = params
+        response: Response = await test_cli.post(self.URI, json=json_request)
+        result_json: dict = response.json()
+        assert "error" not in result_json, f"request = {json_request}"
+        return result_json["result"]
+
+    async def test_block_is_cached_by_height_and_hash(self, block_cache, test_cli):
+        StubCollection().channel_stubs[CHANNEL_NAME] = create_channel_stub(response_code=message_code.Response.success)
+
+        block = await self.post(test_cli, "icx_getBlockByHeight", {"height": "0x10"})
+        assert self.get_block_count() == 1
+
+        # Then the same block is returned from the cache by height or hash
+        assert await self.post(test_cli, "icx_getBlockByHeight", {"height": "0x10"}) == block
+        assert await self.post(test_cli, "icx_getBlockByHash", {"hash": "0x" + block["block_hash"]}) == block
+        assert self.get_block_count() == 1
+
+        # And icx_getBlock caches its own response
+        await self.post(test_cli, "icx_getBlock", {"height": "0x10"})
+        await self.post(test_cli, "icx_getBlock", {"hash": "0x" + block["block_hash"]})
+        assert self.get_block_count() == 2
+        assert block_cache.stats()["hits"] == 3
+
+    async def test_latest_and_unconfirmed_blocks_are_not_cached(self, block_cache, test_cli):
+        StubCollection().channel_stubs[CHANNEL_NAME] = create_channel_stub(response_code=message_code.Response.success)
+
+        await self.post(test_cli, "icx_getBlock")
+        await self.post(test_cli, "icx_getBlock")
+        await self.post(test_cli, "icx_getLastBlock")
+        assert self.get_block_count() == 3
+        assert block_cache.stats()["items"] == 0
+
+    async def test_failure_is_not_cached(self, block_cache, test_cli):
+        StubCollection().channel_stubs[CHANNEL_NAME] = create_channel_stub(response_code=message_code.Response.fail_wrong_block_height)
+
+        response: Response = await test_cli.post(self.URI, json={
+            "jsonrpc": "2.0", "method": "icx_getBlockByHeight", "id": 1234, "params": {"height": "0x10"}
+        })
+        assert "error" in response.json()
+        assert block_cache.stats()["items"] == 0
+
+    async def test_block_receipts_are_cached(self, block_cache, test_cli):
+        StubCollection().channel_stubs[CHANNEL_NAME] = create_channel_stub(response_code=message_code.Response.success)
+
+        receipts = await self.post(test_cli, "icx_getBlockReceipts", {"height": "0x696"})
+        assert await self.post(test_cli, "icx_getBlockReceipts", {"height": "0x696"}) == receipts
+        # the block hash is known from the receipts
+        assert await self.post(test_cli, "icx_getBlockReceipts", {"hash": "0x" + receipts[0]["blockHash"]}) == receipts
+        assert self.get_await_count("get_block_receipts") == 1
+
+        await self.post(test_cli, "icx_getBlockReceipts")
+        assert self.get_await_count("get_block_receipts") == 2
+
+    async def test_transactions_are_cached(self, tx_cache, test_cli):
+        StubCollection().channel_stubs[CHANNEL_NAME] = create_channel_stub(response_code=message_code.Response.success)
+        params = {"txHash": "0x9c60c91c5821ba70dee43d7ddc2a5b03b2958d8dffac6d35488b43b8a62ee372"}
+
+        tx_result = await self.post(test_cli, "icx_getTransactionResult", params)
+        assert await self.post(test_cli, "icx_getTransactionResult", params) == tx_result
+        assert self.get_await_count("get_invoke_result") == 1
+
+        tx = await self.post(test_cli, "icx_getTransactionByHash", params)
+        assert await self.post(test_cli, "icx_getTransactionByHash", params) == tx
+        assert self.get_await_count("get_tx_info") == 1
+        assert tx_cache.stats()["hits"] == 2
+
+    async def test_batch_with_cached_results(self, block_cache, test_cli):
+        StubCollection().channel_stubs[CHANNEL_NAME] = create_channel_stub(response_code=message_code.Response.success)
+        batch = [
+            {"jsonrpc": "2.0", "method": "icx_getBlockByHeight", "id": i, "params": {"height": "0x10"}}
+            for i in range(3)
+        ]
+
+        response: Response = await test_cli.post(self.URI, json=batch)
+        results = response.json()
+        assert sorted(result["id"] for result in results) == [0, 1, 2]
+        assert all(result["result"] == results[0]["result"] for result in results)
+
+    async def test_concurrent_polls_share_one_request(self, test_cli):
+        stub = create_channel_stub(response_code=message_code.Response.fail_tx_not_invoked)
+        StubCollection().channel_stubs[CHANNEL_NAME] = stub
+        task = stub.async_task()
+
+        shared = tx_result_flight.shared
+
+        async def get_invoke_result(tx_hash):
+            # answer after the other polls join this call
+            for _ in range(100):
+                if tx_result_flight.shared - shared >= 19:
+                    break
+                await asyncio.sleep(0.01)
+            return message_code.Response.fail_tx_not_invoked, None
+
+        task.get_invoke_result.side_effect = get_invoke_result
+        json_request = {"jsonrpc": "2.0", "method": "icx_getTransactionResult", "id": 1234,
+                        "params": {"txHash": "0x" + "c" * 64}}
+
+        responses = await asyncio.gather(*[test_cli.post(self.URI, json=json_request) for _ in range(20)])
+
+        assert all("error" in response.json() for response in responses)
+        assert task.get_invoke_result.await_count == 1
+
+    # not-invoked answers are remembered even when the cache of responses is disabled
+    @pytest.mark.parametrize("max_items", [16, 0])
+    async def test_not_invoked_is_cached_for_ttl(self, test_cli, max_items):
+        TransactionCache.clear()
+        TransactionCache(max_items=max_items, max_bytes=1024 * 1024, not_invoked_ttl=60)
+        try:
+            stub = create_channel_stub(response_code=message_code.Response.fail_tx_not_invoked)
+            StubCollection().channel_stubs[CHANNEL_NAME] = stub
+            json_request = {"jsonrpc": "2.0", "method": "icx_getTransactionResult", "id": 1234,
+                            "params": {"txHash": "0x" + "d" * 64}}
+
+            for _ in range(3):
+                response: Response = await test_cli.post(self.URI, json=json_request)
+                assert response.json()["error"]["message"] == \
+                    message_code.responseCodeMap[message_code.Response.fail_tx_not_invoked][1]
+            assert stub.async_task().get_invoke_result.await_count == 1
+        finally:
+            TransactionCache.clear()
+
+    async def test_queries_are_cached_until_height_advances(self, query_cache, test_cli):
+        channel_stub = create_channel_stub(response_code=message_code.Response.success)
+        channel_stub.async_task().get_status.return_value = {"block_height": 100}
+        StubCollection().channel_stubs[CHANNEL_NAME] = channel_stub
+        score_stub = create_icon_score_stub()
+        StubCollection().icon_score_stubs[CHANNEL_NAME] = score_stub
+        params = {"address": "hxb0776ee37f5b45bfaea8cff1d8232fbb6122ec32"}
+
+        balance = await self.post(test_cli, "icx_getBalance", params)
+        assert await self.post(test_cli, "icx_getBalance", params) == balance
+        await self.post(test_cli, "icx_getBalance", {"address": "hx5bfdb090f43a808005ffc27c25b213145e80b7cd"})
+        await self.post(test_cli, "icx_getTotalSupply")
+        assert score_stub.async_task().query.await_count == 3
+        assert channel_stub.async_task().get_status.await_count == 1
+
+        # the latest block is higher than the polled height
+        await self.post(test_cli, "icx_getLastBlock")
+        assert await self.post(test_cli, "icx_getBalance", params) == balance
+        assert score_stub.async_task().query.await_count == 4
+        assert query_cache.stats()["hits"] == 1
+
+
+@pytest.fixture
+def query_batcher():
+    QueryBatcher.clear()
+    yield QueryBatcher(max_items=4, max_delay=0.01, timeout=0.05)
+    QueryBatcher.clear()
+
+
+@pytest.mark.asyncio
+class TestVersion3QueryBatch:
+    URI = "/api/v3"
+    ADDRESSES = ["hx" + f"{i:040x}" for i in range(6)]
+
+    @staticmethod
+    def answer(request: dict) -> str:
+        return "0x" + request["params"]["address"][-2:]
+
+    async def post_balances(self, test_cli) -> list:
+        batch = [{"jsonrpc": "2.0", "method": "icx_getBalance", "id": i, "params": {"address": address}}
+                 for i, address in enumerate(self.ADDRESSES)]
+        response: Response = await test_cli.post(self.URI, json=batch)
+        return [result["result"] for result in response.json()]
+
+    async def test_queries_are_sent_in_batches(self, query_batcher, test_cli):
+        score_stub = create_icon_score_stub()
+        task = score_stub.async_task()
+        task.query_batch.side_effect = lambda requests: [self.answer(request) for request in requests]
+        StubCollection().icon_score_stubs[CHANNEL_NAME] = score_stub
+
+        assert await self.post_balances(test_cli) == ["0x" + address[-2:] for address in self.ADDRESSES]
+        assert [len(call.args[0]) for call in task.query_batch.await_args_list] == [4, 2]
+        assert task.query.await_count == 0
+
+    async def test_queries_one_by_one_without_query_batch(self, query_batcher, test_cli):
+        score_stub = create_icon_score_stub()
+        task = score_stub.async_task()
+        task.query_batch.side_effect = RuntimeError("Unknown task")
+        task.query.side_effect = self.answer
+        StubCollection().icon_score_stubs[CHANNEL_NAME] = score_stub
+
+        for _ in range(2):
+            assert await self.post_balances(test_cli) == ["0x" + address[-2:] for address in self.ADDRESSES]
+        # Then query_batch is not tried again after it fails
+        assert task.query_batch.await_count == 1
+        assert task.query.await_count == 2 * len(self.ADDRESSES)
+
+    async def test_query_batch_is_tried_again_after_timeout(self, query_batcher, test_cli):
+        score_stub = create_icon_score_stub()
+        task = score_stub.async_task()
+
+        async def never_answer(requests):
+            # iconservice without query_batch neither answers nor rejects it
+            await asyncio.get_event_loop().create_future()
+
+        task.query_batch.side_effect = never_answer
+        task.query.side_effect = self.answer
+        StubCollection().icon_score_stubs[CHANNEL_NAME] = score_stub
+
+        # a batch which is not answered is queried one by one after the timeout
+        assert await asyncio.wait_for(self.post_balances(test_cli), 1) == \
+            ["0x" + address[-2:] for address in self.ADDRESSES]
+        # both batches are sent before the first one times out, and the backoff is doubled by each
+        assert task.query_batch.await_count == 2
+        assert task.query.await_count == len(self.ADDRESSES)
+        assert score_stub.query_batch_backoff == 2
+
+        # Then query_batch is tried again after the backoff
+        score_stub.query_batch_retry_at = 0.0
+        task.query_batch.side_effect = lambda requests: [self.answer(request) for request in requests]
+        assert await self.post_balances(test_cli) == ["0x" + address[-2:] for address in self.ADDRESSES]
+        assert task.query.await_count == len(self.ADDRESSES)
+        assert score_stub.query_batch_backoff == 0
+
+
+@pytest.mark.asyncio
+class TestVersion3StreamedResponse:
+    URI = "/api/v3"
+    METHODS = [
+        ("icx_getBlock", None),
+        ("icx_getBlock", {"height": "0x10"}),
+        ("icx_getBlockByHeight", {"height": "0x10"}),
+        ("icx_getLastBlock", None),
+        ("icx_getBlockReceipts", {"height": "0x696"}),
+    ]
+
+    async def post(self, test_cli, json_request) -> "Response":
+        StubCollection().channel_stubs[CHANNEL_NAME] = create_channel_stub(response_code=message_code.Response.success)
+        return await test_cli.post(self.URI, json=json_request)
+
+    @pytest.mark.parametrize("method,params", METHODS)
+    async def test_streamed_response_is_same_as_encoded_one(self, method, params, block_cache, test_cli):
+        json_request = {"jsonrpc": "2.0", "method": method, "id": 1234}
+        if params is not None:
+            json_request["params"] = params
+        expected = (await self.post(test_cli, json_request)).json()
+        assert "error" not in expected
+        block_cache.reset()
+
+        # When lists of a single item are streamed
+        StubCollection().conf[ConfigKey.STREAM_RESPONSE_ITEMS] = 1
+        response: Response = await self.post(test_cli, json_request)
+
+        assert response.json() == expected
+        # Then the blocks are streamed, and the confirmed ones are cached after they are streamed
+        assert response.headers.get("transfer-encoding") == "chunked"
+        assert block_cache.stats()["items"] == int(params is not None)
+
+    @pytest.mark.parametrize("method,params", [("icx_getBlockByHeight", {"height": "0x10"}),
+                                               ("icx_getBlockReceipts", {"height": "0x696"})])
+    async def test_streamed_response_larger_than_block_cache(self, method, params, test_cli):
+        BlockCache.clear()
+        block_cache = BlockCache(max_items=16, max_bytes=64)
+        StubCollection().conf[ConfigKey.STREAM_RESPONSE_ITEMS] = 1
+        try:
+            response: Response = await self.post(test_cli, {"jsonrpc": "2.0", "method": method, "id": 1,
+                                                            "params": params})
+
+            # Then the response is streamed but not cached
+            assert response.headers.get("transfer-encoding") == "chunked"
+            assert "error" not in response.json()
+            assert block_cache.stats()["items"] == 0
+        finally:
+            BlockCache.clear()
+
+    @pytest.mark.parametrize("method,params", [("icx_getBlock", {"height": "0x10"}),
+                                               ("icx_getBlockByHeight", {"height": "0x10"})])
+    async def test_streamed_without_block_cache(self, method, params, test_cli):
+        StubCollection().conf[ConfigKey.STREAM_RESPONSE_ITEMS] = 1
+        response: Response = await self.post(test_cli, {"jsonrpc": "2.0", "method": method, "id": 1, "params": params})
+
+        assert response.headers.get("transfer-encoding") == "chunked"
+        assert "error" not in response.json()
+
+    async def test_batch_with_streamed_results(self, test_cli):
+        batch = [{"jsonrpc": "2.0", "method": method, "id": i, "params": params}
+                 for i, (method, params) in enumerate(self.METHODS) if params is not None]
+        expected = (await self.post(test_cli, batch)).json()
+
+        StubCollection().conf[ConfigKey.STREAM_RESPONSE_ITEMS] = 1
+        response: Response = await self.post(test_cli, batch)
+
+        assert sorted(response.json(), key=lambda r: r["id"]) == sorted(expected, key=lambda r: r["id"])
+
+
+@pytest.mark.asyncio
+class TestVersion3Passthrough:
+    URI = "/api/v3"
+
+    @staticmethod
+    def set_block(block: dict) -> str:
+        stub = create_channel_stub(response_code=message_code.Response.success)
+        # spaces are kept in the response only if the block is not decoded
+        block_data_json = json.dumps(block, indent=1)
+        response_code, block_hash, confirm_info, _ = stub.async_task().get_block.return_value
+        stub.async_task().get_block.return_value = (response_code, block_hash, confirm_info, block_data_json)
+        StubCollection().channel_stubs[CHANNEL_NAME] = stub
+        return block_data_json
+
+    async def post(self, test_cli, method: str, params: dict = None) -> "Response":
+        json_request = {"jsonrpc": "2.0", "method": method, "id": 1234}
+        if params is not None:
+            json_request["params"] = params
+        return await test_cli.post(self.URI, json=json_request)
+
+    async def test_block_without_template_is_not_decoded(self, block_cache, test_cli):
+        block = {"version": "0.5", "height": "0x10", "hash": "0x" + "a" * 64, "transactions": []}
+        block_data_json = self.set_block(block)
+
+        for params in (None, {"height": "0x10"}, {"hash": "0x" + "d" * 64}):
+            response: Response = await self.post(test_cli, "icx_getBlock", params)
+            assert block_data_json in response.text
+            assert response.json()["result"] == block
+
+        # Then the blocks are cached as they are
+        assert (await self.post(test_cli, "icx_getBlock", {"height": "0x10"})).json()["result"] == block
+        assert block_cache.stats()["hits"] == 1
+
+    async def test_block_with_template_is_converted(self, test_cli):
+        block = {"version": "0.3", "height": "0x10", "hash": "a" * 64, "transactions": []}
+        block_data_json = self.set_block(block)
+
+        response: Response = await self.post(test_cli, "icx_getBlock")
+        assert block_data_json not in response.text
+        assert response.json()["result"]["version"] == "0.3"
+
+        # commit_state is removed
+        block = {"version": "0.5", "height": "0x10", "commit_state": {"icon_dex": "abc"}}
+        self.set_block(block)
+        response = await self.post(test_cli, "icx_getBlock")
+        assert response.json()["result"] == {"version": "0.5", "height": "0x10"}
+
+    async def test_block_receipts_are_not_decoded(self, block_cache, test_cli):
+        stub = create_channel_stub(response_code=message_code.Response.success)
+        response_code, block_receipts = stub.async_task().get_block_receipts.return_value
+        receipts = json.loads(block_receipts)
+        block_receipts = json.dumps(receipts, indent=1)
+        stub.async_task().get_block_receipts.return_value = (response_code, block_receipts)
+        StubCollection().channel_stubs[CHANNEL_NAME] = stub
+
+        for params in (None, {"hash": "0x" + "e" * 64}):
+            response: Response = await self.post(test_cli, "icx_getBlockReceipts", params)
+            assert block_receipts in response.text
+            assert response.json()["result"] == receipts
+        assert block_cache.stats()["items"] == 1
+
+        # receipts are decoded to learn their block hash
+        response = await self.post(test_cli, "icx_getBlockReceipts", {"height": "0x696"})
+        assert block_receipts not in response.text
+        assert response.json()["result"] == receipts
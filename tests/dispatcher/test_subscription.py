@@ -0,0 +1,335 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+import pytest
+from mock import AsyncMock, MagicMock
+from websockets import exceptions
+
+from iconrpcserver.dispatcher import JsonError
+from iconrpcserver.dispatcher.v3 import subscription
+from iconrpcserver.dispatcher.v3.subscription import SubscriberConnection, SubscriptionDispatcher, SubscriptionHub
+from iconrpcserver.utils import message_code
+from iconrpcserver.utils.message_queue.channel_inner_stub import ChannelInnerStub, ChannelInnerTask
+from iconrpcserver.utils.message_queue.stub_collection import StubCollection
+from iconrpcserver.utils.new_block_hub import NewBlockHub
+from iconrpcserver.utils.ws_send_queue import SendQueue, SendQueues
+from .conftest import CHANNEL_STUB_NAME
+
+TIP = 10
+SCORE = "cx" + "1" * 40
+OTHER_SCORE = "cx" + "2" * 40
+TRANSFER = "Transfer(Address,Address,int)"
+APPROVAL = "Approval(Address,Address,int)"
+
+
+def tx_hash_of(height: int) -> str:
+    return f"0x{height:064x}"
+
+
+def create_following_channel_stub() -> ChannelInnerStub:
+    """Channel stub whose blocks above the tip are committed every 10ms. Each block has a transaction with 3 logs"""
+    committed = {"height": TIP}
+
+    async def announce_new_block(subscriber_block_height: int, subscriber_id: str):
+        if subscriber_block_height > TIP:
+            await asyncio.sleep(0.01 * (subscriber_block_height - TIP))
+        committed["height"] = max(committed["height"], subscriber_block_height)
+        block = {"height": subscriber_block_height, "hash": f"{subscriber_block_height:064x}",
+                 "transactions": [{"txHash": tx_hash_of(subscriber_block_height)}]}
+        return json.dumps(block), b"votes"
+
+    async def get_block_receipts(block_height: int, block_hash: str):
+        event_logs = [{"scoreAddress": SCORE, "indexed": [TRANSFER, "hx1", "hx2"], "data": ["0x1"]},
+                      {"scoreAddress": OTHER_SCORE, "indexed": [TRANSFER, "hx1", "hx2"], "data": ["0x2"]},
+                      {"scoreAddress": SCORE, "indexed": [APPROVAL, "hx1", "hx2"], "data": ["0x3"]}]
+        receipts = [{"txHash": tx_hash_of(block_height)[2:], "eventLogs": event_logs}]
+        return message_code.Response.success, json.dumps(receipts)
+
+    async def get_invoke_result(tx_hash: str):
+        if int(tx_hash, 16) > committed["height"]:
+            return message_code.Response.fail_tx_not_invoked, ""
+        return message_code.Response.success, json.dumps({"txHash": tx_hash, "status": "0x1"})
+
+    task = AsyncMock(ChannelInnerTask)
+    task.announce_new_block.side_effect = announce_new_block
+    task.get_block_receipts.side_effect = get_block_receipts
+    task.get_invoke_result.side_effect = get_invoke_result
+    task.get_status.return_value = {"block_height": TIP}
+    stub = MagicMock(ChannelInnerStub)
+    stub.async_task.return_value = task
+    StubCollection().channel_stubs[CHANNEL_STUB_NAME] = stub
+    return stub
+
+
+class SubscriberWebSocket:
+    def __init__(self):
+        self.requests = asyncio.Queue()
+        self.received = asyncio.Queue()
+        self.closed = False
+
+    async def recv(self) -> str:
+        request = await self.requests.get()
+        if request is None:
+            raise exceptions.ConnectionClosed(1000, "")
+        return request
+
+    async def send(self, frame: str):
+        await self.received.put(json.loads(frame))
+
+    async def close(self):
+        self.closed = True
+        await self.requests.put(None)
+
+
+class Client:
+    def __init__(self, ws: SubscriberWebSocket):
+        self.ws = ws
+        self.pushes = []
+        self._id = 0
+
+    async def call(self, method: str, **params) -> dict:
+        self._id += 1
+        await self.ws.requests.put(json.dumps({"jsonrpc": "2.0", "method": method, "params": params, "id": self._id}))
+        while True:
+            message = await asyncio.wait_for(self.ws.received.get(), 1)
+            if message.get("id") == self._id:
+                return message
+            self.pushes.append(message["params"])
+
+    async def wait_for_block(self, height: int):
+        """Collect the pushes until the block of the height"""
+        while True:
+            message = await asyncio.wait_for(self.ws.received.get(), 1)
+            self.pushes.append(message["params"])
+            if message["params"]["result"].get("height") == hex(height) and "log" not in message["params"]["result"]:
+                return
+
+    def drain(self):
+        while not self.ws.received.empty():
+            self.pushes.append(self.ws.received.get_nowait()["params"])
+
+
+@asynccontextmanager
+async def connect():
+    ws = SubscriberWebSocket()
+    request = MagicMock(remote_addr="127.0.0.1", port=9000)
+    dispatching = asyncio.ensure_future(SubscriptionDispatcher.dispatch(request, ws, CHANNEL_STUB_NAME))
+    try:
+        yield Client(ws)
+    finally:
+        await ws.close()
+        await asyncio.wait_for(dispatching, 1)
+
+
+@pytest.fixture
+def subscription_hub():
+    NewBlockHub.clear()
+    SendQueues.clear()
+    SubscriptionHub.clear()
+    NewBlockHub(max_frames=4)
+    SendQueues(high_watermark=16, low_watermark=4)
+    yield SubscriptionHub(max_subscriptions=3)
+    NewBlockHub.clear()
+    SendQueues.clear()
+    SubscriptionHub.clear()
+
+
+@pytest.mark.asyncio
+class TestSubscription:
+    async def test_matching_data_is_pushed(self, subscription_hub):
+        stub = create_following_channel_stub()
+        async with connect() as client, connect() as other_client:
+            block_id = (await client.call("icx_subscribe", type="block"))["result"]
+            tx_id = (await client.call("icx_subscribe", type="txResult", txHash=tx_hash_of(TIP + 2)))["result"]
+            event_id = (await client.call("icx_subscribe", type="event", event=TRANSFER, addr=SCORE))["result"]
+            any_score_id = (await other_client.call("icx_subscribe", type="event", event=TRANSFER))["result"]
+
+            await client.wait_for_block(TIP + 3)
+            await asyncio.sleep(0.001)
+            client.drain()
+            other_client.drain()
+
+        # Then the blocks are pushed from the next block
+        blocks = [push["result"] for push in client.pushes if push["subscription"] == block_id]
+        assert blocks[0] == {"height": hex(TIP + 1), "hash": f"0x{TIP + 1:064x}"}
+
+        # the result of the transaction is pushed once
+        tx_results = [push["result"] for push in client.pushes if push["subscription"] == tx_id]
+        assert tx_results == [{"txHash": tx_hash_of(TIP + 2), "status": "0x1"}]
+
+        # and only the event logs matching the filter are pushed
+        events = [push["result"] for push in client.pushes if push["subscription"] == event_id]
+        assert len(events) >= 3
+        assert events[0] == {"height": hex(TIP + 1), "hash": f"0x{TIP + 1:064x}", "txHash": tx_hash_of(TIP + 1),
+                             "index": "0x0", "log": {"scoreAddress": SCORE, "indexed": [TRANSFER, "hx1", "hx2"],
+                                                     "data": ["0x1"]}}
+        other_events = [push["result"] for push in other_client.pushes if push["subscription"] == any_score_id]
+        assert [event["index"] for event in other_events[:4]] == ["0x0", "0x1", "0x0", "0x1"]
+
+        # Each block and its receipts are fetched once for all the subscriptions
+        task = stub.async_task()
+        assert task.announce_new_block.await_count <= subscription_hub.blocks + 1
+        assert task.get_block_receipts.await_count == subscription_hub.blocks
+        assert subscription_hub.stats()["subscriptions"] == 0
+        assert subscription_hub.stats()["channels"] == 0
+
+    async def test_committed_tx_result_is_pushed(self, subscription_hub):
+        create_following_channel_stub()
+        async with connect() as client:
+            tx_id = (await client.call("icx_subscribe", type="txResult", txHash=tx_hash_of(TIP)))["result"]
+            message = await asyncio.wait_for(client.ws.received.get(), 1)
+
+            # Then the result of the transaction committed before the subscription is pushed at once
+            assert message["params"] == {"subscription": tx_id,
+                                         "result": {"txHash": tx_hash_of(TIP), "status": "0x1"}}
+            assert subscription_hub.stats()["subscriptions"] == 0
+            assert (await client.call("icx_unsubscribe", subscription=tx_id))["result"] is False
+
+    async def test_block_is_pushed_once_when_receipts_fail(self, subscription_hub, monkeypatch):
+        monkeypatch.setattr(subscription, "RETRY_DELAY", 0)
+        stub = create_following_channel_stub()
+        task = stub.async_task()
+        get_block_receipts = task.get_block_receipts.side_effect
+        failed = []
+
+        async def fail_once(block_height: int, block_hash: str):
+            if block_height == TIP + 1 and not failed:
+                failed.append(block_height)
+                raise asyncio.TimeoutError("Message timed-out")
+            return await get_block_receipts(block_height, block_hash)
+
+        task.get_block_receipts.side_effect = fail_once
+        async with connect() as client:
+            block_id = (await client.call("icx_subscribe", type="block"))["result"]
+            event_id = (await client.call("icx_subscribe", type="event", event=TRANSFER, addr=SCORE))["result"]
+            await client.wait_for_block(TIP + 2)
+            await asyncio.sleep(0.001)
+            client.drain()
+
+        # Then the block is pushed once, and its event logs are pushed after the receipts are fetched again
+        blocks = [push["result"]["height"] for push in client.pushes if push["subscription"] == block_id]
+        assert blocks[:2] == [hex(TIP + 1), hex(TIP + 2)]
+        assert len(blocks) == len(set(blocks))
+        events = [push["result"]["height"] for push in client.pushes if push["subscription"] == event_id]
+        assert events[:2] == [hex(TIP + 1), hex(TIP + 2)]
+        assert failed == [TIP + 1]
+
+    async def test_height_of_announced_block_is_pushed(self, subscription_hub):
+        stub = create_following_channel_stub()
+        task = stub.async_task()
+        announce_new_block = task.announce_new_block.side_effect
+
+        async def skip_block(subscriber_block_height: int, subscriber_id: str):
+            # the channel announces the next block instead of the one asked
+            if subscriber_block_height == TIP + 1:
+                subscriber_block_height += 1
+            return await announce_new_block(subscriber_block_height, subscriber_id)
+
+        task.announce_new_block.side_effect = skip_block
+        async with connect() as client:
+            block_id = (await client.call("icx_subscribe", type="block"))["result"]
+            await client.call("icx_subscribe", type="event", event=TRANSFER, addr=SCORE)
+            await client.wait_for_block(TIP + 3)
+
+        # Then the height is of the block itself, and its receipts are fetched by the height
+        blocks = [push["result"]["height"] for push in client.pushes if push["subscription"] == block_id]
+        assert blocks[:2] == [hex(TIP + 2), hex(TIP + 3)]
+        assert task.get_block_receipts.await_args_list[0].kwargs["block_height"] == TIP + 2
+
+    async def test_block_published_again_is_pushed_once(self, subscription_hub):
+        create_following_channel_stub()
+        async with connect() as client:
+            block_id = (await client.call("icx_subscribe", type="block"))["result"]
+            event_id = (await client.call("icx_subscribe", type="event", event=TRANSFER, addr=SCORE))["result"]
+            await client.wait_for_block(TIP + 1)
+
+            new_block = await NewBlockHub().get(CHANNEL_STUB_NAME, TIP + 1, "test")
+            await subscription_hub._publish(CHANNEL_STUB_NAME, new_block)
+            await client.wait_for_block(TIP + 2)
+            await asyncio.sleep(0.001)
+            client.drain()
+
+        # Then the subscriptions which are pushed the block are not pushed it again
+        blocks = [push["result"]["height"] for push in client.pushes if push["subscription"] == block_id]
+        assert blocks.count(hex(TIP + 1)) == 1
+        events = [push["result"]["height"] for push in client.pushes if push["subscription"] == event_id]
+        assert events.count(hex(TIP + 1)) == 1
+
+    async def test_slow_tx_result_does_not_hold_blocks(self, subscription_hub, monkeypatch):
+        monkeypatch.setattr(subscription, "RETRY_DELAY", 0.1)
+        stub = create_following_channel_stub()
+        task = stub.async_task()
+        get_invoke_result = task.get_invoke_result.side_effect
+        failed = []
+
+        async def fail_once(tx_hash: str):
+            response = await get_invoke_result(tx_hash)
+            if response[0] == message_code.Response.success and not failed:
+                failed.append(tx_hash)
+                raise asyncio.TimeoutError("Message timed-out")
+            return response
+
+        task.get_invoke_result.side_effect = fail_once
+        async with connect() as client:
+            block_id = (await client.call("icx_subscribe", type="block"))["result"]
+            tx_id = (await client.call("icx_subscribe", type="txResult", txHash=tx_hash_of(TIP + 1)))["result"]
+            await client.wait_for_block(TIP + 3)
+            while not any(push["subscription"] == tx_id for push in client.pushes):
+                client.pushes.append((await asyncio.wait_for(client.ws.received.get(), 1))["params"])
+
+        # Then the blocks are pushed while the result of the transaction is fetched again
+        assert failed == [tx_hash_of(TIP + 1)]
+        pushes = [push["result"].get("height", push["subscription"]) for push in client.pushes]
+        assert pushes.index(tx_id) > pushes.index(hex(TIP + 3))
+
+    async def test_unsubscribe(self, subscription_hub):
+        stub = create_following_channel_stub()
+        async with connect() as client:
+            subscription_id = (await client.call("icx_subscribe", type="block"))["result"]
+            await client.wait_for_block(TIP + 1)
+
+            assert (await client.call("icx_unsubscribe", subscription=subscription_id))["result"] is True
+            assert (await client.call("icx_unsubscribe", subscription=subscription_id))["result"] is False
+
+            # Then the channel is not followed without subscriptions
+            assert subscription_hub.stats()["channels"] == 0
+            # and the receipts are not fetched without event subscriptions
+            assert not stub.async_task().get_block_receipts.called
+
+    @pytest.mark.parametrize("params,code", [
+        ({"type": "blocks"}, JsonError.INVALID_PARAMS),
+        ({"type": "txResult", "txHash": "0x1234"}, JsonError.INVALID_PARAMS),
+        ({"type": "event"}, JsonError.INVALID_PARAMS),
+        ({"type": "event", "event": TRANSFER, "addr": "hx" + "1" * 40}, JsonError.INVALID_PARAMS),
+    ])
+    async def test_invalid_subscription(self, subscription_hub, params, code):
+        create_following_channel_stub()
+        async with connect() as client:
+            response = await client.call("icx_subscribe", **params)
+            assert response["error"]["code"] == code
+
+    async def test_too_many_subscriptions(self, subscription_hub):
+        create_following_channel_stub()
+        async with connect() as client:
+            for _ in range(3):
+                assert "result" in await client.call("icx_subscribe", type="block")
+            response = await client.call("icx_subscribe", type="block")
+            assert response["error"]["code"] == JsonError.INVALID_REQUEST
+
+    async def test_slow_subscriber_is_disconnected(self):
+        ws = SubscriberWebSocket()
+
+        async def send(frame: str):
+            await asyncio.sleep(0.01)
+
+        ws.send = send
+        connection = SubscriberConnection(ws, SendQueue(ws, "peer", high_watermark=2), "peer")
+
+        for i in range(4):
+            connection.push("0x1", {"height": hex(i)})
+        await asyncio.sleep(0)
+
+        assert connection.closing
+        assert ws.closed
+        connection.send_queue.close()
@@ -1,12 +1,18 @@
+import asyncio
 import json
 
 import pytest
-from mock import AsyncMock
+from mock import AsyncMock, MagicMock
 from jsonrpcclient.requests import Request
+from websockets import exceptions
 
 from iconrpcserver.dispatcher.default.websocket import WSDispatcher
 from iconrpcserver.utils import message_code
+from iconrpcserver.utils.message_queue.channel_inner_stub import ChannelInnerStub, ChannelInnerTask
 from iconrpcserver.utils.message_queue.stub_collection import StubCollection
+from iconrpcserver.utils.new_block_hub import NewBlockHub
+from iconrpcserver.utils.ws_send_queue import (CATCH_UP, DISCONNECT, SendQueue, SendQueues, SlowSubscriberError,
+                                                SubscriberBehindError)
 from .conftest import CHANNEL_STUB_NAME
 
 
@@ -61,13 +67,13 @@ class TestWSDispatcherBasic:
 
 @pytest.mark.asyncio
 class TestWSDispatcherRegister:
-    async def test_do_publish_if_register_succeed(self, request_dict):
+    async def test_do_publish_if_register_succeed(self, request_dict, monkeypatch):
         channel_stub = StubCollection().channel_stubs[CHANNEL_STUB_NAME]
         channel_stub.register_citizen = AsyncMock(return_value=True)
 
-        WSDispatcher.publish_heartbeat = AsyncMock()
-        WSDispatcher.publish_new_block = AsyncMock()
-        WSDispatcher.publish_unregister = AsyncMock()
+        monkeypatch.setattr(WSDispatcher, "publish_heartbeat", AsyncMock())
+        monkeypatch.setattr(WSDispatcher, "publish_new_block", AsyncMock())
+        monkeypatch.setattr(WSDispatcher, "publish_unregister", AsyncMock())
 
         await WSDispatcher.node_ws_Subscribe(**request_dict)
 
@@ -75,13 +81,13 @@ class TestWSDispatcherRegister:
         assert WSDispatcher.publish_new_block.called
         assert WSDispatcher.publish_unregister.called
 
-    async def test_no_publish_if_register_fail(self, request_dict):
+    async def test_no_publish_if_register_fail(self, request_dict, monkeypatch):
         channel_stub = StubCollection().channel_stubs[CHANNEL_STUB_NAME]
         channel_stub.register_citizen = AsyncMock(return_value=False)
 
-        WSDispatcher.publish_heartbeat = AsyncMock()
-        WSDispatcher.publish_new_block = AsyncMock()
-        WSDispatcher.publish_unregister = AsyncMock()
+        monkeypatch.setattr(WSDispatcher, "publish_heartbeat", AsyncMock())
+        monkeypatch.setattr(WSDispatcher, "publish_new_block", AsyncMock())
+        monkeypatch.setattr(WSDispatcher, "publish_unregister", AsyncMock())
 
         await WSDispatcher.node_ws_Subscribe(**request_dict)
 
@@ -89,13 +95,13 @@ class TestWSDispatcherRegister:
         assert not WSDispatcher.publish_new_block.called
         assert WSDispatcher.publish_unregister.called
 
-    async def test_no_publish_if_exc_during_register(self, request_dict):
+    async def test_no_publish_if_exc_during_register(self, request_dict, monkeypatch):
         channel_stub = StubCollection().channel_stubs[CHANNEL_STUB_NAME]
         channel_stub.register_citizen = AsyncMock(return_value=False)
 
-        WSDispatcher.publish_heartbeat = AsyncMock()
-        WSDispatcher.publish_new_block = AsyncMock()
-        WSDispatcher.publish_unregister = AsyncMock()
+        monkeypatch.setattr(WSDispatcher, "publish_heartbeat", AsyncMock())
+        monkeypatch.setattr(WSDispatcher, "publish_new_block", AsyncMock())
+        monkeypatch.setattr(WSDispatcher, "publish_unregister", AsyncMock())
 
         await WSDispatcher.node_ws_Subscribe(**request_dict)
 
@@ -103,3 +109,248 @@ class TestWSDispatcherRegister:
         assert not WSDispatcher.publish_new_block.called
         assert WSDispatcher.publish_unregister.called
 
+
+
+def create_announcing_channel_stub(tip: int) -> ChannelInnerStub:
+    """Channel stub which announces blocks up to the tip. A block above the tip is announced after a while"""
+    async def announce_new_block(subscriber_block_height: int, subscriber_id: str):
+        if subscriber_block_height > tip:
+            await asyncio.sleep(0.01)
+        if subscriber_block_height < 0:
+            return json.dumps({"error": "Invalid height"}), b""
+        block = {"height": subscriber_block_height, "hash": f"{subscriber_block_height:064x}"}
+        return json.dumps(block), f"votes of {subscriber_block_height}".encode()
+
+    task = AsyncMock(ChannelInnerTask)
+    task.announce_new_block.side_effect = announce_new_block
+    task.get_status.return_value = {"block_height": tip}
+    stub = MagicMock(ChannelInnerStub)
+    stub.async_task.return_value = task
+    StubCollection().channel_stubs[CHANNEL_STUB_NAME] = stub
+    return stub
+
+
+@pytest.fixture
+def new_block_hub():
+    NewBlockHub.clear()
+    yield NewBlockHub(max_frames=4)
+    NewBlockHub.clear()
+
+
+@pytest.mark.asyncio
+class TestNewBlockHub:
+    async def test_frame_is_node_ws_publish_new_block(self, new_block_hub):
+        create_announcing_channel_stub(tip=10)
+
+        new_block = await new_block_hub.get(CHANNEL_STUB_NAME, 3, "0xaaaaaa")
+
+        frame = json.loads(new_block.frame)
+        expected = dict(Request(WSDispatcher.PUBLISH_NEW_BLOCK, block={"height": 3, "hash": f"{3:064x}"},
+                                confirm_info="votes of 3"))
+        frame.pop("id"), expected.pop("id")
+        assert frame == expected
+        assert new_block.block == {"height": 3, "hash": f"{3:064x}"}
+
+    async def test_subscribers_share_new_block(self, new_block_hub):
+        stub = create_announcing_channel_stub(tip=10)
+
+        # subscribers waiting for the next block share one long-poll
+        new_blocks = await asyncio.gather(*[new_block_hub.get(CHANNEL_STUB_NAME, 11, f"peer{i}") for i in range(100)])
+        assert all(new_block is new_blocks[0] for new_block in new_blocks)
+        assert stub.async_task().announce_new_block.await_count == 1
+
+        # and the latest blocks are kept for the subscribers behind
+        assert await new_block_hub.get(CHANNEL_STUB_NAME, 11, "peer") is new_blocks[0]
+        assert new_block_hub.stats() == {"fetches": 1, "hits": 1, "shared": 99, "blocks": 1}
+
+    async def test_blocks_of_lagging_subscribers_do_not_evict_latest(self, new_block_hub):
+        stub = create_announcing_channel_stub(tip=100)
+        for height in range(97, 101):
+            await new_block_hub.get(CHANNEL_STUB_NAME, height, "peer")
+
+        await new_block_hub.get(CHANNEL_STUB_NAME, 1, "lagging")
+        for height in range(97, 101):
+            await new_block_hub.get(CHANNEL_STUB_NAME, height, "peer")
+        assert stub.async_task().announce_new_block.await_count == 5
+
+        assert await new_block_hub.get(CHANNEL_STUB_NAME, -1, "peer") is None
+
+    async def test_publish_new_block_sends_shared_frames(self, new_block_hub):
+        create_announcing_channel_stub(tip=3)
+        websockets = [MockWebSocket() for _ in range(3)]
+        for i, ws in enumerate(websockets):
+            ws.send = AsyncMock(side_effect=[None] * (4 - i) + [exceptions.ConnectionClosed(1000, "")])
+
+        await asyncio.gather(*[WSDispatcher.publish_new_block(ws, CHANNEL_STUB_NAME, 1 + i, f"peer{i}")
+                               for i, ws in enumerate(websockets)])
+
+        frames = [[call.args[0] for call in ws.send.await_args_list] for ws in websockets]
+        assert [json.loads(frame)["params"]["block"]["height"] for frame in frames[0][:4]] == [1, 2, 3, 4]
+        # Then the subscribers get the same frames of the same heights
+        assert frames[1][:3] == frames[0][1:4]
+        assert frames[2][:2] == frames[0][2:4]
+        assert new_block_hub.fetches == 5
+
+
+@pytest.mark.asyncio
+class TestCatchUp:
+    @staticmethod
+    def heights(frame: str) -> list:
+        data = json.loads(frame)
+        if data["method"] == "node_ws_PublishNewBlocks":
+            return [params["block"]["height"] for params in data["params"]["blocks"]]
+        assert data["method"] == WSDispatcher.PUBLISH_NEW_BLOCK
+        return [data["params"]["block"]["height"]]
+
+    @pytest.mark.parametrize("batch_size,expected", [
+        (0, [[height] for height in range(1, 22)]),
+        (5, [[1, 2, 3, 4, 5], [6, 7, 8], [9, 10, 11, 12, 13], [14, 15, 16], [17, 18, 19, 20], [21]]),
+    ])
+    async def test_catch_up_then_live(self, batch_size, expected):
+        NewBlockHub.clear()
+        NewBlockHub(max_frames=4, catch_up_blocks=8)
+        try:
+            stub = create_announcing_channel_stub(tip=20)
+            ws = MockWebSocket()
+            ws.send = AsyncMock(side_effect=[None] * len(expected) + [exceptions.ConnectionClosed(1000, "")])
+
+            await WSDispatcher.publish_new_block(ws, CHANNEL_STUB_NAME, 1, "peer", batch_size)
+
+            frames = [call.args[0] for call in ws.send.await_args_list]
+            assert [self.heights(frame) for frame in frames[:-1]] == expected
+            assert stub.async_task().get_status.await_count == 2
+        finally:
+            NewBlockHub.clear()
+
+    async def test_catch_up_stops_at_error(self, new_block_hub):
+        stub = create_announcing_channel_stub(tip=10)
+        stub.async_task().get_status.return_value = {"block_height": "0x1"}
+        NewBlockHub().catch_up_blocks = 4
+        ws = MockWebSocket()
+        ws.send = AsyncMock()
+
+        await WSDispatcher.publish_new_block(ws, CHANNEL_STUB_NAME, -2, "peer")
+        assert not ws.send.called
+
+
+class SlowWebSocket:
+    def __init__(self, delay: float = 0.001):
+        self.delay = delay
+        self.frames = []
+        self.close = AsyncMock()
+
+    async def send(self, frame):
+        await asyncio.sleep(self.delay)
+        self.frames.append(frame)
+
+
+@pytest.fixture
+def send_queues():
+    SendQueues.clear()
+    yield SendQueues(high_watermark=4, low_watermark=1, policy=DISCONNECT)
+    SendQueues.clear()
+
+
+@pytest.mark.asyncio
+class TestSendQueue:
+    async def test_publisher_waits_for_slow_subscriber(self):
+        ws = SlowWebSocket()
+        queue = SendQueue(ws, "peer", high_watermark=4, low_watermark=1, policy=CATCH_UP)
+
+        depths = []
+        for i in range(20):
+            await queue.put(str(i))
+            depths.append(len(queue))
+        await queue.flush()
+
+        assert ws.frames == [str(i) for i in range(20)]
+        assert max(depths) == 4
+        assert queue.stats()["slow"] > 0
+        assert queue.stats()["max_depth"] == 4
+        assert queue.stats()["sent"] == 20
+        assert queue.stats()["max_send_latency"] >= 0.001
+
+    async def test_frames_of_blocks_are_dropped_for_slow_subscriber(self):
+        ws = SlowWebSocket()
+        queue = SendQueue(ws, "peer", high_watermark=4, low_watermark=1, policy=CATCH_UP)
+        await queue.put("response")
+        for height in range(1, 4):
+            await queue.put(str(height), height)
+
+        # When the queue is full, the frames of blocks behind the one being sent are dropped
+        with pytest.raises(SubscriberBehindError) as e:
+            await queue.put("4", 4)
+        assert e.value.next_height == 1
+        await queue.flush()
+
+        # Then the frames which are not of blocks are sent, and the publisher catches up from the first dropped one
+        assert ws.frames == ["response"]
+        assert queue.stats()["dropped"] == 3
+
+    async def test_slow_subscriber_is_disconnected(self):
+        queue = SendQueue(SlowWebSocket(), "peer", high_watermark=4, low_watermark=1, policy=DISCONNECT)
+        for i in range(4):
+            await queue.put(str(i))
+        with pytest.raises(SlowSubscriberError):
+            await queue.put("4")
+        queue.close()
+
+    async def test_error_of_writer_is_raised_to_publisher(self):
+        ws = MockWebSocket()
+        ws.send = AsyncMock(side_effect=exceptions.ConnectionClosed(1000, ""))
+        queue = SendQueue(ws, "peer", high_watermark=4, low_watermark=1)
+
+        await queue.put("0")
+        await asyncio.sleep(0)
+        with pytest.raises(exceptions.ConnectionClosed):
+            await queue.put("1")
+
+    @pytest.mark.parametrize("batch_size", [0, 3])
+    async def test_publish_new_block_catches_up_slow_subscriber(self, batch_size, monkeypatch):
+        NewBlockHub.clear()
+        SendQueues.clear()
+        NewBlockHub(max_frames=4, catch_up_blocks=8)
+        SendQueues(high_watermark=4, low_watermark=1, policy=CATCH_UP)
+        dropped = []
+        drop_blocks = SendQueue._drop_blocks
+
+        def _drop_blocks(queue):
+            height = drop_blocks(queue)
+            dropped.append(height)
+            return height
+
+        monkeypatch.setattr(SendQueue, "_drop_blocks", _drop_blocks)
+        try:
+            create_announcing_channel_stub(tip=40)
+            ws = SlowWebSocket(delay=0.002)
+            sent = 0
+
+            async def send(frame):
+                nonlocal sent
+                sent += 1
+                if sent > 12:
+                    raise exceptions.ConnectionClosed(1000, "")
+                await asyncio.sleep(ws.delay)
+                ws.frames.append(frame)
+
+            ws.send = send
+            await WSDispatcher.publish_new_block(ws, CHANNEL_STUB_NAME, 1, "peer", batch_size)
+
+            # Then the blocks are dropped and sent again, so the subscriber gets every block once in order
+            heights = [height for frame in ws.frames for height in TestCatchUp.heights(frame)]
+            assert heights == list(range(1, len(heights) + 1))
+            assert any(height is not None for height in dropped)
+        finally:
+            NewBlockHub.clear()
+            SendQueues.clear()
+
+    async def test_publish_new_block_disconnects_slow_subscriber(self, new_block_hub, send_queues):
+        create_announcing_channel_stub(tip=100)
+        ws = SlowWebSocket(delay=0.01)
+
+        await WSDispatcher.publish_new_block(ws, CHANNEL_STUB_NAME, 1, "peer")
+
+        error = json.loads(ws.frames[-1])
+        assert error["params"]["code"] == message_code.Response.fail_subscribe_limit
+        ws.close.assert_awaited()
+        assert len(send_queues) == 0
@@ -0,0 +1,196 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from iconrpcserver.utils.cache import BlockCache, LRUCache, QueryCache, TransactionCache, parse_block_height
+
+CHANNEL = "icon_dex"
+BLOCK_HASH = "d071ae4d4663bdbe4b5f635399323504edfcb7352b3ca7aabd2486873b6708ba"
+
+
+@pytest.fixture
+def block_cache():
+    BlockCache.clear()
+    yield BlockCache(max_items=4, max_bytes=1024)
+    BlockCache.clear()
+
+
+class TestLRUCache:
+    def test_get_and_put(self):
+        cache = LRUCache(max_items=2)
+        assert cache.get("a") is None
+        assert cache.put("a", 1)
+        assert cache.get("a") == 1
+        assert "a" in cache
+        assert cache.stats() == {"items": 1, "bytes": 0, "hits": 1, "misses": 1, "evictions": 0}
+
+    def test_evict_least_recently_used_item(self):
+        cache = LRUCache(max_items=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        assert "b" not in cache
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.evictions == 1
+
+    def test_evict_by_bytes(self):
+        cache = LRUCache(max_items=10, max_bytes=100)
+        cache.put("a", 1, size=60)
+        cache.put("b", 2, size=30)
+        assert cache.total_bytes == 90
+
+        cache.put("c", 3, size=30)
+        assert "a" not in cache
+        assert cache.total_bytes == 60
+
+        # too large to be cached
+        assert not cache.put("d", 4, size=101)
+        assert "d" not in cache
+        assert len(cache) == 2
+
+    def test_replace_and_pop(self):
+        cache = LRUCache(max_items=10, max_bytes=100)
+        cache.put("a", 1, size=60)
+        cache.put("a", 2, size=10)
+        assert cache.total_bytes == 10
+        assert cache.pop("a") == 2
+        assert cache.total_bytes == 0
+        assert cache.pop("a") is None
+
+    def test_disabled(self):
+        cache = LRUCache(max_items=0)
+        assert not cache.put("a", 1)
+        assert len(cache) == 0
+
+
+class TestBlockCache:
+    def test_disabled_by_default(self):
+        BlockCache.clear()
+        try:
+            block_cache = BlockCache()
+            block_cache.put(CHANNEL, "kind", BLOCK_HASH, 1, {"height": 1}, size=10)
+            assert not block_cache.enabled
+            assert block_cache.get(CHANNEL, "kind", height=1) is None
+        finally:
+            BlockCache.clear()
+
+    def test_hit_by_height_and_hash(self, block_cache: BlockCache):
+        response = {"height": "0x1"}
+        block_cache.put(CHANNEL, "kind", "0x" + BLOCK_HASH, 1, response, size=10)
+
+        assert block_cache.get(CHANNEL, "kind", height=1) is response
+        assert block_cache.get(CHANNEL, "kind", block_hash=BLOCK_HASH) is response
+        assert block_cache.get(CHANNEL, "kind", block_hash="0x" + BLOCK_HASH.upper()) is response
+        assert block_cache.get(CHANNEL, "other_kind", height=1) is None
+        assert block_cache.get("other_channel", "kind", height=1) is None
+        assert block_cache.get(CHANNEL, "kind", height=2) is None
+        assert block_cache.stats()["hits"] == 3
+        assert block_cache.stats()["misses"] == 3
+
+    def test_unknown_height(self, block_cache: BlockCache):
+        block_cache.put(CHANNEL, "kind", BLOCK_HASH, None, {}, size=10)
+
+        assert block_cache.get(CHANNEL, "kind", block_hash=BLOCK_HASH) == {}
+        assert block_cache.get(CHANNEL, "kind", height=1) is None
+
+
+@pytest.mark.parametrize("height,expected", [
+    (10, 10),
+    ("0xa", 10),
+    ("10", None),
+    ("0xz", None),
+    (True, None),
+    (None, None),
+])
+def test_parse_block_height(height, expected):
+    assert parse_block_height(height) == expected
+
+
+class TestTransactionCache:
+    TX_HASH = "0x" + "b" * 64
+
+    def test_not_invoked_expires(self, monkeypatch):
+        now = [100.0]
+        monkeypatch.setattr("iconrpcserver.utils.cache.time.monotonic", lambda: now[0])
+        TransactionCache.clear()
+        try:
+            tx_cache = TransactionCache(max_items=4, max_bytes=1024, not_invoked_ttl=0.5)
+            assert not tx_cache.is_not_invoked(CHANNEL, self.TX_HASH)
+
+            tx_cache.put_not_invoked(CHANNEL, self.TX_HASH)
+            assert tx_cache.is_not_invoked(CHANNEL, self.TX_HASH[2:])
+            assert not tx_cache.is_not_invoked("other_channel", self.TX_HASH)
+
+            now[0] += 0.5
+            assert not tx_cache.is_not_invoked(CHANNEL, self.TX_HASH)
+        finally:
+            TransactionCache.clear()
+
+    def test_not_invoked_disabled(self):
+        TransactionCache.clear()
+        try:
+            tx_cache = TransactionCache(max_items=4, max_bytes=1024)
+            tx_cache.put_not_invoked(CHANNEL, self.TX_HASH)
+            assert not tx_cache.is_not_invoked(CHANNEL, self.TX_HASH)
+        finally:
+            TransactionCache.clear()
+
+
+class TestQueryCache:
+    REQUEST = ("icx_getBalance", "hx" + "a" * 40)
+
+    def test_results_are_dropped_when_height_advances(self, monkeypatch):
+        now = [100.0]
+        monkeypatch.setattr("iconrpcserver.utils.cache.time.monotonic", lambda: now[0])
+        QueryCache.clear()
+        try:
+            query_cache = QueryCache(max_items=4, max_bytes=1024, height_ttl=0.5)
+            assert query_cache.height(CHANNEL) is None
+
+            query_cache.update_height(CHANNEL, 10)
+            assert query_cache.height(CHANNEL) == 10
+            query_cache.put(CHANNEL, 10, self.REQUEST, "0x1", size=3)
+            # a result queried at an old height is ignored
+            query_cache.put(CHANNEL, 9, self.REQUEST, "0x0", size=3)
+            assert query_cache.get(CHANNEL, 10, self.REQUEST) == "0x1"
+
+            # an older block does not change the height
+            query_cache.update_height(CHANNEL, 5, latest=False)
+            assert query_cache.get(CHANNEL, 10, self.REQUEST) == "0x1"
+
+            query_cache.update_height(CHANNEL, 11, latest=False)
+            assert query_cache.stats()["items"] == 0
+            assert query_cache.height(CHANNEL) == 11
+
+            # the height is not trusted after height_ttl
+            now[0] += 0.5
+            assert query_cache.height(CHANNEL) is None
+        finally:
+            QueryCache.clear()
+
+    @pytest.mark.parametrize("max_items,height_ttl", [(0, 0.5), (4, 0), (4, -1)])
+    def test_disabled(self, max_items, height_ttl):
+        QueryCache.clear()
+        try:
+            query_cache = QueryCache(max_items=max_items, height_ttl=height_ttl)
+            assert not query_cache.enabled
+            query_cache.update_height(CHANNEL, 10)
+            query_cache.put(CHANNEL, 10, self.REQUEST, "0x1", size=3)
+            assert query_cache.get(CHANNEL, 10, self.REQUEST) is None
+        finally:
+            QueryCache.clear()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import unittest
+from typing import Iterator, Optional
+
+import tests.test_jsonschema_validator as base
+from iconrpcserver.dispatcher import GenericJsonRpcServerError, validator
+from iconrpcserver.dispatcher.schema_compiler import CompiledValidator
+
+INVALID_VALUES = [None, True, 0, 1, 1.5, "", "0x", "0xZZ", "2.0", "hx" + "a" * 40, [], ["a"], {}, {"a": 1}]
+
+
+def _message(request, schemas: dict, compiled: bool) -> Optional[str]:
+    validator.set_compiled_validation(compiled)
+    try:
+        validator.validate_jsonschema(request, schemas)
+    except GenericJsonRpcServerError as e:
+        return f"{e.code} {e}"
+    except Exception as e:
+        return type(e).__name__
+    finally:
+        validator.set_compiled_validation(False)
+    return None
+
+
+def _mutations(data) -> Iterator:
+    """Yield copies of data where one key is removed, one value is replaced or one key is added"""
+    if isinstance(data, dict):
+        for key in data:
+            removed = copy.copy(data)
+            del removed[key]
+            yield removed
+            for value in INVALID_VALUES:
+                yield {**data, key: value}
+            for mutated in _mutations(data[key]):
+                yield {**data, key: mutated}
+        yield {**data, "invalid_key": "invalid_value"}
+        yield {**data, "additionalProperties": "value"}
+    elif isinstance(data, list):
+        for i, item in enumerate(data):
+            for value in INVALID_VALUES:
+                yield data[:i] + [value] + data[i + 1:]
+            for mutated in _mutations(item):
+                yield data[:i] + [mutated] + data[i + 1:]
+
+
+def _samples(test_case: base.TestJsonschemaValidator) -> Iterator[dict]:
+    test_case.setUp()
+    for value in vars(test_case).values():
+        if isinstance(value, dict) and "method" in value:
+            yield value
+
+
+class TestCompiledValidatorV2(base.TestJsonschemaValidatorV2):
+    def setUp(self):
+        super().setUp()
+        validator.set_compiled_validation(True)
+
+    def tearDown(self):
+        validator.set_compiled_validation(False)
+
+
+class TestCompiledValidatorV3(base.TestJsonschemaValidatorV3):
+    def setUp(self):
+        super().setUp()
+        validator.set_compiled_validation(True)
+
+    def tearDown(self):
+        validator.set_compiled_validation(False)
+
+
+class TestCompiledValidatorDifferential(unittest.TestCase):
+    def test_every_schema_is_compiled(self):
+        for schemas in (validator.SCHEMA_NODE, validator.SCHEMA_V2, validator.SCHEMA_V3):
+            for method, compiled in validator.get_validators(schemas, compiled=True).items():
+                self.assertIsInstance(compiled, CompiledValidator, method)
+
+    def _check_same_messages(self, schemas: dict, samples):
+        count = 0
+        for sample in samples:
+            for request in [sample, *_mutations(sample)]:
+                expected = _message(request, schemas, compiled=False)
+                actual = _message(request, schemas, compiled=True)
+                self.assertEqual(expected, actual, f"request: {request}")
+                count += 1
+        self.assertGreater(count, 0)
+
+    def test_same_messages_v2(self):
+        self._check_same_messages(validator.SCHEMA_V2, _samples(base.TestJsonschemaValidatorV2()))
+
+    def test_same_messages_v3(self):
+        samples = list(_samples(base.TestJsonschemaValidatorV3()))
+        samples.extend([
+            {"jsonrpc": "2.0", "id": 1, "method": "icx_getBlock", "params": {"hash": "0x" + "a" * 64}},
+            {"jsonrpc": "2.0", "id": 1, "method": "icx_getBlockReceipts", "params": {"height": "0x1"}},
+            {"jsonrpc": "2.0", "id": 1, "method": "debug_getAccount",
+             "params": {"address": "hx" + "a" * 40, "filter": "0x1"}},
+            {"jsonrpc": "2.0", "id": 1, "method": "rep_getListByHash", "params": {"repsHash": "0x" + "a" * 64}},
+            {"jsonrpc": "2.0", "id": 1, "method": "icx_proveReceipt",
+             "params": {"txHash": "0x" + "a" * 64, "proof": [{"left": "0x" + "b" * 64}, {"right": "0x" + "c" * 64}]}},
+        ])
+        self._check_same_messages(validator.SCHEMA_V3, samples)
+
+    def test_same_messages_node(self):
+        samples = [
+            {"jsonrpc": "2.0", "id": 1, "method": "node_getChannelInfos"},
+            {"jsonrpc": "2.0", "id": 1, "method": "node_getBlockByHeight", "params": {"height": "10"}},
+            {"jsonrpc": "2.0", "id": "1", "method": "node_getCitizens", "params": {}},
+        ]
+        self._check_same_messages(validator.SCHEMA_NODE, samples)
+
+    def test_same_messages_batch(self):
+        test_case = base.TestJsonschemaValidatorV3()
+        test_case.setUp()
+        batch = [test_case.call, test_case.getBalance, test_case.getTransactionResult]
+        self._check_same_messages(validator.SCHEMA_V3, [batch])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -19,9 +19,14 @@ import unittest
 from typing import Union
 from copy import deepcopy
 
-from iconrpcserver.utils.icon_service.converter import convert_params
+from iconrpcserver.utils.icon_service.converter import (_convert, compiled_templates, compiled_templates_in_place,
+                                                        convert_params, is_noop_template)
+from iconrpcserver.utils.icon_service.templates import templates
 from iconrpcserver.utils.icon_service import RequestParamType, ResponseParamType
 
+# values of other types or formats put in place of each value
+OTHER_VALUES = [None, 0, 1, -1, "", "0x", "0x1", "-0x1", "12", "zz", 1.5, [], ["a"], {}, {"a": "0x1"}]
+
 
 class TestConverter(unittest.TestCase):
     BLOCK_v0_1a = {
@@ -150,6 +155,84 @@ class TestConverter(unittest.TestCase):
             tx["fee"] = "0x2386f26fc10000"
         self._check_block_key(block_v0_3_converted, self.block_v0_1a_tx_v2, is_v3=False)
 
+    def _samples(self) -> list:
+        return [
+            self.block_v0_1a_tx_v2, self.block_v0_1a_tx_v3, self.block_v0_3_tx_v3, self.TX_V2, self.TX_V3,
+            {"method": "icx_getBalance", "params": {"address": "hx5a05b58a25a1e5ea0f1d5715e1f655dffc1fb30a"}},
+            {"method": "icx_sendTransaction", "params": dict(self.TX_V3, tx_hash="ab", time_stamp="12")},
+            {"hash": "0xab", "height": "0x10", "txHash": "ab", "repsHash": "ab", "blockHeight": 16},
+            {"block": {"block_height": 1, "block_hash": "ab", "time_stamp": 12}, "transactions": [self.TX_V2]},
+            {"tx_results": [{"txHash": "ab", "blockHash": "0xcd"}], "blockHash": "ab"},
+            "ab", 16, [],
+        ]
+
+    @staticmethod
+    def _result(convert) -> str:
+        try:
+            # the same keys in the same order
+            return json.dumps(convert())
+        except Exception as e:
+            return type(e).__name__
+
+    def _mutations(self, data):
+        yield data
+        if isinstance(data, dict):
+            for key, value in data.items():
+                for other in OTHER_VALUES:
+                    yield {**data, key: other}
+                for mutated in self._mutations(value):
+                    yield {**data, key: mutated}
+        elif isinstance(data, list):
+            for i, item in enumerate(data):
+                for other in OTHER_VALUES:
+                    yield data[:i] + [other] + data[i + 1:]
+
+    def test_compiled_templates(self):
+        count = 0
+        for param_type, template in templates.items():
+            for sample in self._samples():
+                for data in self._mutations(sample):
+                    expected = self._result(lambda: _convert(deepcopy(data), template))
+                    actual = self._result(lambda: compiled_templates[param_type](deepcopy(data)))
+                    self.assertEqual(expected, actual, f"{param_type}: {data}")
+                    actual = self._result(lambda: compiled_templates_in_place[param_type](deepcopy(data)))
+                    self.assertEqual(expected, actual, f"in place {param_type}: {data}")
+                    count += 1
+        self.assertGreater(count, 1000)
+
+    def test_compiled_templates_do_not_modify_params(self):
+        block = deepcopy(self.block_v0_3_tx_v3)
+        convert_params(block, ResponseParamType.get_block_v0_1a_tx_v2)
+        self.assertEqual(self.block_v0_3_tx_v3, block)
+
+    def test_convert_in_place(self):
+        block = deepcopy(self.block_v0_3_tx_v3)
+        transactions = block["transactions"]
+        converted = convert_params(block, ResponseParamType.get_block_v0_3_tx_v3, in_place=True)
+        self.assertIs(block, converted)
+        self.assertIs(transactions, converted["transactions"])
+        self.assertEqual(convert_params(self.block_v0_3_tx_v3, ResponseParamType.get_block_v0_3_tx_v3), converted)
+
+        # a new dict is made for the block, but the list of transactions is reused
+        block = deepcopy(self.block_v0_3_tx_v3)
+        transactions = block["transactions"]
+        converted = convert_params(block, ResponseParamType.get_block_v0_1a_tx_v2, in_place=True)
+        self.assertIs(transactions, converted["confirmed_transaction_list"])
+        self.assertEqual(convert_params(self.block_v0_3_tx_v3, ResponseParamType.get_block_v0_1a_tx_v2), converted)
+
+    def test_is_noop_template(self):
+        self.assertTrue(is_noop_template(None, dict))
+        self.assertTrue(is_noop_template(ResponseParamType.get_block_receipts, list))
+        self.assertFalse(is_noop_template(ResponseParamType.get_block_receipts, dict))
+        self.assertFalse(is_noop_template(ResponseParamType.get_block_v0_3_tx_v3, dict))
+
+        samples = [value for value in OTHER_VALUES if isinstance(value, (dict, list))]
+        samples += [self.block_v0_3_tx_v3, [self.block_v0_3_tx_v3], [{"txHash": "a" * 64}]]
+        for param_type in list(RequestParamType) + list(ResponseParamType):
+            for sample in samples:
+                if is_noop_template(param_type, type(sample)):
+                    self.assertEqual(sample, _convert(deepcopy(sample), templates.get(param_type)), param_type)
+
 
 if __name__ == "__main__":
     unittest.main()
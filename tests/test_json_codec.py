@@ -0,0 +1,106 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+import pytest
+
+from iconrpcserver.utils import json_codec
+from iconrpcserver.utils.json_codec import JsonCodec, StreamedResult, create_json_codec, set_json_codec
+
+DATA = {
+    "jsonrpc": "2.0",
+    "id": 1234,
+    "result": {
+        "height": 100,
+        "hash": "0x" + "a" * 64,
+        "url": "http://localhost:9000/api/v3",
+        "text": "ICON 아이콘",
+        "list": [None, True, False, 1, "0x1"],
+        1: "int key",
+        "big": 2 ** 100,
+    }
+}
+
+
+@pytest.fixture(params=["json", "ujson", "orjson"])
+def codec(request) -> JsonCodec:
+    pytest.importorskip(request.param)
+    return create_json_codec(request.param)
+
+
+def test_codec_is_compatible_with_stdlib(codec):
+    expected = json.loads(json.dumps(DATA))
+
+    assert json.loads(codec.dumps(DATA)) == expected
+    assert json.loads(codec.dumpb(DATA)) == expected
+    assert codec.loads(json.dumps(DATA)) == expected
+    assert codec.loads(json.dumps(DATA).encode()) == expected
+
+
+def test_codec_raises_json_decode_error(codec):
+    with pytest.raises(json.JSONDecodeError):
+        codec.loads(b"{")
+
+    with pytest.raises(TypeError):
+        codec.dumps({"value": object()})
+
+
+def test_unknown_codec():
+    assert create_json_codec("unknown").name == "json"
+
+
+def test_set_json_codec():
+    try:
+        set_json_codec("auto")
+        assert json_codec.get_json_codec().name in json_codec.AUTO_CODECS
+        assert json_codec.loads(json_codec.dumpb(DATA)) == json.loads(json.dumps(DATA))
+    finally:
+        set_json_codec("json")
+
+
+def test_streamed_result(codec, monkeypatch):
+    monkeypatch.setattr(json_codec, "_codec", codec)
+    monkeypatch.setattr(json_codec, "STREAM_CHUNK_SIZE", 16)
+    items = [{"index": hex(i), "text": "아이콘"} for i in range(10)]
+    expected = {"height": 100, "items": [dict(item, index=int(item["index"], 16)) for item in items], "end": True}
+
+    def convert(item: dict) -> dict:
+        item["index"] = int(item["index"], 16)
+        return item
+
+    result = StreamedResult.from_dict({"height": 100, "items": [], "end": True}, "items", items, convert)
+    chunks = list(result)
+
+    # Then the items are written in chunks and released
+    assert len(chunks) > 1
+    assert json.loads(b"".join(chunks)) == expected
+    assert items == []
+    with pytest.raises(RuntimeError):
+        list(result)
+
+    assert json.loads(StreamedResult([]).encode().data) == []
+    assert json.loads(StreamedResult([1, "a"]).encode().data) == [1, "a"]
+
+
+@pytest.mark.parametrize("max_bytes,called_back", [(0, True), (1024, True), (32, False)])
+def test_streamed_result_on_encoded(monkeypatch, max_bytes, called_back):
+    monkeypatch.setattr(json_codec, "STREAM_CHUNK_SIZE", 16)
+    encoded = []
+    result = StreamedResult([{"index": hex(i)} for i in range(10)])
+    result.on_encoded(encoded.append, max_bytes)
+    data = b"".join(result)
+
+    # Then the whole result is called back after it is streamed, only if it is up to max_bytes
+    assert [item.data for item in encoded] == ([data] if called_back else [])
@@ -757,5 +757,26 @@ class TestJsonschemaValidatorV3(TestJsonschemaValidator):
                 self.fail(f'error case : [{func.__name__}] {case[2]}')
 
 
+class TestValidatorRegistry(unittest.TestCase):
+    def test_validators_are_compiled_once(self):
+        from iconrpcserver.dispatcher import validator
+        for schemas in (validator.SCHEMA_NODE, validator.SCHEMA_V2, validator.SCHEMA_V3):
+            validators = validator.get_validators(schemas)
+            self.assertIs(validators, validator.get_validators(schemas))
+            self.assertEqual(schemas.keys(), validators.keys())
+            for method, schema in schemas.items():
+                self.assertIs(validators[method].schema, schema)
+
+    def test_unknown_schemas_are_registered_on_first_use(self):
+        from iconrpcserver.dispatcher import validator
+        schemas = {"icx_getLastBlock": validator.icx_getLastBlock}
+        request = {"jsonrpc": "2.0", "method": "icx_getLastBlock", "id": 1234}
+
+        validator.validate_jsonschema(request, schemas)
+        self.assertIs(validator.get_validators(schemas), validator.get_validators(schemas))
+        self.assertRaises(GenericJsonRpcServerError, validator.validate_jsonschema,
+                          {**request, "method": "icx_call"}, schemas)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,271 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import List
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from iconrpcserver.dispatcher import GenericJsonRpcServerError
+from iconrpcserver.utils.json_rpc import relay_tx_request
+from iconrpcserver.utils.relay import RelayBatcher, RelayHealthTracker, RelaySessionPool
+
+TX_HASH = "0x" + "b" * 64
+
+
+def answer(request: dict) -> dict:
+    if request.get("params", {}).get("invalid"):
+        return {"jsonrpc": "2.0", "error": {"code": -32602, "message": "Invalid params"}, "id": request["id"]}
+    return {"jsonrpc": "2.0", "result": request.get("params", {}).get("nonce", TX_HASH), "id": request["id"]}
+
+
+@asynccontextmanager
+async def start_relay_target(status: int = 200, batch: bool = True, listed: bool = False):
+    """Stand-in relay target which answers icx_sendTransaction. It yields its URL and the peers of the requests
+
+    :param batch: whether batch requests are answered. if not, they are answered with an error
+    :param listed: whether a single request is answered with a batch response of its response
+    """
+    peers: List[tuple] = []
+
+    async def handle(request: web.Request) -> web.Response:
+        peers.append(request.transport.get_extra_info("peername"))
+        data = await request.json()
+        if isinstance(data, list):
+            if not batch or any(item.get("params", {}).get("invalid") for item in data):
+                # a request of the batch is rejected by the validation of the batch
+                return web.json_response({"jsonrpc": "2.0", "error": {"code": -32602, "message": "Invalid params"},
+                                          "id": 0}, status=400)
+            return web.json_response([answer(item) for item in data], status=status)
+
+        response = answer(data)
+        if listed:
+            if request.query.get("extra"):
+                return web.json_response([response, answer({"id": "extra"})], status=status)
+            return web.json_response([response], status=status)
+        return web.json_response(response, status=400 if "error" in response else status)
+
+    app = web.Application()
+    app.router.add_post("/api/v3", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}", peers
+    finally:
+        await runner.cleanup()
+
+
+@asynccontextmanager
+async def relay_session_pool(limit: int):
+    RelaySessionPool.clear()
+    session_pool = RelaySessionPool(limit)
+    try:
+        yield session_pool
+    finally:
+        await session_pool.close()
+        RelaySessionPool.clear()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("limit,connections", [(0, 3), (4, 1)])
+async def test_relay_reuses_connections(limit, connections):
+    async with start_relay_target() as (target, peers), relay_session_pool(limit) as session_pool:
+        for _ in range(3):
+            assert await relay_tx_request(target, {"from": "hx" + "a" * 40}, "api/v3") == TX_HASH
+
+        assert len(peers) == 3
+        assert len(set(peers)) == connections
+        assert len(session_pool) == (1 if limit else 0)
+
+
+@pytest.mark.asyncio
+async def test_relay_limits_connections_and_targets():
+    async with start_relay_target() as (target, peers), relay_session_pool(2) as session_pool:
+        session_pool.max_targets = 1
+        await asyncio.gather(*[relay_tx_request(target, {}, "api/v3") for _ in range(10)])
+        assert len(set(peers)) <= 2
+
+        session = session_pool.session(target)
+        session_pool.session("http://127.0.0.1:1")
+        await asyncio.sleep(0)
+        assert len(session_pool) == 1
+        assert session.closed
+
+
+@pytest.mark.asyncio
+async def test_relay_error():
+    async with start_relay_target(status=500) as (target, _), relay_session_pool(4):
+        with pytest.raises(GenericJsonRpcServerError):
+            await relay_tx_request(target, {}, "api/v3")
+
+
+@pytest.mark.asyncio
+async def test_relay_with_batch_response():
+    async with start_relay_target(listed=True) as (target, _), relay_session_pool(4):
+        # Then the response of the request is taken from the batch response
+        assert await relay_tx_request(target, {"nonce": "0x1"}, "api/v3") == "0x1"
+
+        with pytest.raises(GenericJsonRpcServerError) as e:
+            await relay_tx_request(target, {"invalid": True}, "api/v3")
+        assert e.value.code == -32602
+
+        # a batch response of several responses is not the response of the request
+        with pytest.raises(GenericJsonRpcServerError) as e:
+            await relay_tx_request(target, {"nonce": "0x1"}, "api/v3?extra=1")
+        assert "No response" in str(e.value)
+
+
+@asynccontextmanager
+async def relay_batcher(max_items: int, max_delay: float = 0.01):
+    RelayBatcher.clear()
+    try:
+        yield RelayBatcher(max_items, max_delay)
+    finally:
+        RelayBatcher.clear()
+
+
+@pytest.mark.asyncio
+async def test_relays_are_sent_in_batches():
+    async with start_relay_target() as (target, peers), relay_session_pool(4), relay_batcher(4) as batcher:
+        results = await asyncio.gather(*[relay_tx_request(target, {"nonce": hex(i)}, "api/v3") for i in range(10)])
+
+        # Then each relay gets its own result
+        assert results == [hex(i) for i in range(10)]
+        assert len(peers) == 3
+        assert batcher.stats() == {"batches": 3, "requests": 10, "batch_size": 10 / 3}
+
+        # A relay is sent after max_delay without more relays
+        assert await relay_tx_request(target, {"nonce": "0x10"}, "api/v3") == "0x10"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("batch", [True, False])
+async def test_batch_with_invalid_relay(batch):
+    async with start_relay_target(batch=batch) as (target, peers), relay_session_pool(4), relay_batcher(3):
+        results = await asyncio.gather(relay_tx_request(target, {"nonce": "0x1"}, "api/v3"),
+                                       relay_tx_request(target, {"invalid": True}, "api/v3"),
+                                       relay_tx_request(target, {"nonce": "0x2"}, "api/v3"),
+                                       return_exceptions=True)
+
+        # Then the relays are sent one by one after the batch is rejected
+        assert results[0] == "0x1" and results[2] == "0x2"
+        assert isinstance(results[1], GenericJsonRpcServerError)
+        assert results[1].code == -32602
+        assert len(peers) == 4
+
+
+@pytest.mark.asyncio
+async def test_batch_error_from_target():
+    async with start_relay_target(status=500) as (target, peers), relay_session_pool(4), relay_batcher(2):
+        results = await asyncio.gather(relay_tx_request(target, {"nonce": "0x1"}, "api/v3"),
+                                       relay_tx_request(target, {"nonce": "0x2"}, "api/v3"),
+                                       return_exceptions=True)
+        # a batch response is demultiplexed regardless of the status
+        assert results == ["0x1", "0x2"]
+
+
+DOWN_TARGET = "http://127.0.0.1:1"
+
+
+@asynccontextmanager
+async def relay_health_tracker(failure_threshold: int, open_duration: float = 10, alternates: List[str] = ()):
+    RelayHealthTracker.clear()
+    try:
+        yield RelayHealthTracker(failure_threshold, open_duration, alternates)
+    finally:
+        RelayHealthTracker.clear()
+
+
+@pytest.mark.asyncio
+async def test_tripped_target_fails_fast():
+    async with relay_session_pool(4), relay_health_tracker(2) as tracker:
+        for _ in range(2):
+            with pytest.raises(aiohttp.ClientError):
+                await relay_tx_request(DOWN_TARGET, {}, "api/v3")
+        assert tracker.stats()[DOWN_TARGET]["state"] == "open"
+        assert tracker.stats()[DOWN_TARGET]["failures"] == 2
+
+        # Then the relay fails without connecting to the target
+        with pytest.raises(GenericJsonRpcServerError) as e:
+            await relay_tx_request(DOWN_TARGET, {}, "api/v3")
+        assert "not available" in str(e.value)
+        assert tracker.stats()[DOWN_TARGET]["requests"] == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("batch_size", [0, 2])
+async def test_relay_fails_over_to_alternate(batch_size):
+    async with start_relay_target() as (alternate, peers), relay_session_pool(4), relay_batcher(batch_size), \
+            relay_health_tracker(1, alternates=[alternate]) as tracker:
+        results = await asyncio.gather(*[relay_tx_request(DOWN_TARGET, {"nonce": hex(i)}, "api/v3")
+                                         for i in range(2)])
+        assert results == ["0x0", "0x1"]
+        assert tracker.stats()[DOWN_TARGET]["state"] == "open"
+
+        # Then the tripped target is skipped
+        assert await relay_tx_request(DOWN_TARGET, {"nonce": "0x2"}, "api/v3") == "0x2"
+        assert tracker.stats()[DOWN_TARGET]["failures"] == (1 if batch_size else 2)
+        assert tracker.stats()[alternate]["error_rate"] == 0.0
+        assert tracker.stats()[alternate]["latency"] > 0
+
+
+@pytest.mark.asyncio
+async def test_tripped_target_is_probed():
+    async with start_relay_target() as (target, _), relay_session_pool(4), \
+            relay_health_tracker(1, open_duration=0.05) as tracker:
+        tracker._record(target, 0.1, failed=True)
+        assert tracker.candidates(target) == []
+
+        time.sleep(0.05)
+        # Then only one relay probes the target
+        assert tracker.candidates(target) == [target]
+        assert tracker.acquire(target)
+        assert tracker.candidates(target) == []
+        assert not tracker.acquire(target)
+        tracker._targets[target].probing = False
+
+        assert await relay_tx_request(target, {"nonce": "0x1"}, "api/v3") == "0x1"
+        assert tracker.stats()[target]["state"] == "closed"
+
+        # A failed probe trips the target again
+        tracker._record(target, 0.1, failed=True)
+        time.sleep(0.05)
+        assert tracker.acquire(target)
+        tracker._record(target, 0.1, failed=True)
+        assert tracker.stats()[target]["state"] == "open"
+
+
+@pytest.mark.asyncio
+async def test_half_open_alternate_is_probed_after_primary_succeeds():
+    async with start_relay_target() as (target, _), start_relay_target() as (alternate, alternate_peers), \
+            relay_session_pool(4), relay_health_tracker(1, open_duration=0.05, alternates=[alternate]) as tracker:
+        tracker._record(alternate, 0.1, failed=True)
+        time.sleep(0.05)
+
+        # the alternate is listed, but its probe is not claimed while the primary answers
+        assert tracker.candidates(target) == [target, alternate]
+        assert await relay_tx_request(target, {"nonce": "0x1"}, "api/v3") == "0x1"
+        assert not alternate_peers
+        assert tracker.candidates(target) == [target, alternate]
+
+        # Then the alternate is still probed later
+        assert await relay_tx_request(alternate, {"nonce": "0x2"}, "api/v3") == "0x2"
+        assert tracker.stats()[alternate]["state"] == "closed"
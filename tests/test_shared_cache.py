@@ -0,0 +1,116 @@
+# Copyright 2018 ICON Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from iconrpcserver.utils.cache import BlockCache, TransactionCache
+from iconrpcserver.utils.json_codec import EncodedResult
+from iconrpcserver.utils.shared_cache import SharedCacheClient, SharedCacheServer
+
+CHANNEL = "icon_dex"
+BLOCK_HASH = "d071ae4d4663bdbe4b5f635399323504edfcb7352b3ca7aabd2486873b6708ba"
+
+
+@asynccontextmanager
+async def start_shared_cache(path: str, max_items: int):
+    server = await SharedCacheServer(max_items, max_bytes=1024).start(path)
+    SharedCacheClient.clear()
+    client = SharedCacheClient(path)
+    try:
+        yield client
+    finally:
+        await client.close()
+        SharedCacheClient.clear()
+        server.close()
+        await server.wait_closed()
+
+
+async def flush(client: SharedCacheClient):
+    """Puts are not answered. A get after them is answered after they are handled"""
+    await client.get("flush")
+
+
+@pytest.mark.asyncio
+async def test_get_and_put(tmp_path):
+    async with start_shared_cache(str(tmp_path / "cache.sock"), max_items=2) as shared_cache:
+        await _test_get_and_put(shared_cache)
+
+
+async def _test_get_and_put(shared_cache):
+    assert await shared_cache.get("a") is None
+    assert shared_cache.connected
+
+    shared_cache.put("a", b"1")
+    shared_cache.put("b", b"")
+    await flush(shared_cache)
+    results = await asyncio.gather(shared_cache.get("a"), shared_cache.get("b"), shared_cache.get("c"))
+    assert results == [b"1", b"", None]
+
+    # evicted by the number of items and the total size
+    shared_cache.put("c", b"3")
+    shared_cache.put("d", b"4" * 1025)
+    await flush(shared_cache)
+    assert await shared_cache.get("a") is None
+    assert await shared_cache.get("d") is None
+    stats = await shared_cache.stats()
+    assert stats["items"] == 2
+    assert stats["evictions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_not_available(tmp_path):
+    SharedCacheClient.clear()
+    try:
+        client = SharedCacheClient(str(tmp_path / "nothing.sock"))
+        client.put("a", b"1")
+        assert await client.get("a") is None
+        assert not client.connected
+    finally:
+        SharedCacheClient.clear()
+
+
+@pytest.mark.asyncio
+async def test_caches_are_shared_by_workers(tmp_path):
+    async with start_shared_cache(str(tmp_path / "cache.sock"), max_items=16) as shared_cache:
+        await _test_caches_are_shared_by_workers(shared_cache)
+
+
+async def _test_caches_are_shared_by_workers(shared_cache):
+    response = EncodedResult(b'{"height": 16}')
+    BlockCache.clear()
+    TransactionCache.clear()
+    try:
+        # the first worker fetches the block
+        BlockCache(max_items=4, max_bytes=1024, shared=shared_cache)
+        await BlockCache().fetch(CHANNEL, "icx_getBlock", height=16)
+        BlockCache().put(CHANNEL, "icx_getBlock", BLOCK_HASH, 16, response, size=len(response))
+        TransactionCache(max_items=4, max_bytes=1024, shared=shared_cache)
+        TransactionCache().put(CHANNEL, "tx", "0x" + "a" * 64, response, size=len(response))
+        await flush(shared_cache)
+
+        # the other worker finds it by height or hash in the shared cache
+        BlockCache().reset()
+        TransactionCache().reset()
+        assert (await BlockCache().fetch(CHANNEL, "icx_getBlock", height=16)).data == response.data
+        BlockCache().reset()
+        assert (await BlockCache().fetch(CHANNEL, "icx_getBlock", block_hash="0x" + BLOCK_HASH)).data == response.data
+        assert (await TransactionCache().fetch(CHANNEL, "tx", "a" * 64)).data == response.data
+        # and caches it in the worker
+        assert BlockCache().get(CHANNEL, "icx_getBlock", block_hash=BLOCK_HASH) is not None
+    finally:
+        BlockCache.clear()
+        TransactionCache.clear()
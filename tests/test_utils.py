@@ -1,10 +1,16 @@
+import json
+
 import pytest
 from jsonrpcclient.response import Response, SuccessResponse
+from jsonrpcserver.methods import Methods
+from jsonrpcserver.response import InvalidJSONResponse, InvalidJSONRPCResponse
 
 from mock import MagicMock
+from iconrpcserver.dispatcher import GenericJsonRpcServerError
 from iconrpcserver.dispatcher.v3.icx import IcxDispatcher
 from iconrpcserver.dispatcher.validator import validate_jsonschema
 from iconrpcserver.utils import json_rpc
+from iconrpcserver.utils.hexadecimal import is_lowercase_hex
 
 
 @pytest.fixture
@@ -48,3 +54,283 @@ async def test_relay_tx_request(mock_server):
     }
 
     await json_rpc.relay_tx_request(relay_target=relay_target, message=message, path=path)
+
+
+@pytest.mark.parametrize("value,prefix,expected", [
+    ("0123456789abcdef", "", True),
+    ("0x0123456789abcdef", "0x", True),
+    ("hx" + "a" * 40, "hx", True),
+    ("cx" + "0" * 40, "cx", True),
+    ("", "", False),
+    ("0x", "0x", False),
+    ("0x0", "", False),
+    ("0xA", "0x", False),
+    ("0x0g", "0x", False),
+    ("0x0\n", "0x", False),
+    ("hx" + "a" * 40, "cx", False),
+    ("0xx1", "0x", False),
+    ("0x" + "a" * (2 * 1024 * 1024) + "z", "0x", False),
+    (b"0x00", "0x", False),
+    (None, "", False),
+    ("Px00", "Px", True),
+])
+def test_is_lowercase_hex(value, prefix, expected):
+    assert is_lowercase_hex(value, prefix) is expected
+
+
+@pytest.fixture
+def echo_methods():
+    # raw requests in bytes are logged by the patched logger
+    json_rpc.monkey_patch()
+    methods = Methods()
+
+    @methods.add
+    async def echo(context, **kwargs):
+        return {"context": context, "params": kwargs}
+
+    return methods
+
+
+@pytest.mark.asyncio
+async def test_async_dispatch_uses_deserialized_request(echo_methods):
+    deserialized = {"jsonrpc": "2.0", "method": "echo", "id": 1, "params": {"value": "0x1"}}
+
+    # the raw request is only logged, so it is never decoded again
+    response = await json_rpc.async_dispatch(b"not decoded", echo_methods, deserialized=deserialized, context="ctx")
+
+    assert response.deserialized() == {
+        "jsonrpc": "2.0", "id": 1, "result": {"context": "ctx", "params": {"value": "0x1"}}
+    }
+
+
+@pytest.mark.asyncio
+async def test_async_dispatch_decodes_request_without_deserialized(echo_methods):
+    response = await json_rpc.async_dispatch(b'{"jsonrpc": "2.0", "method": "echo", "id": 1}', echo_methods,
+                                             context="ctx")
+    assert response.deserialized()["result"] == {"context": "ctx", "params": {}}
+
+    response = await json_rpc.async_dispatch(b"{", echo_methods)
+    assert isinstance(response, InvalidJSONResponse)
+
+    response = await json_rpc.async_dispatch(b"", echo_methods, deserialized={"method": "echo"})
+    assert isinstance(response, InvalidJSONRPCResponse)
+
+
+@pytest.mark.asyncio
+async def test_async_dispatch_logs_batch_with_streamed_result(caplog):
+    import json
+    import logging
+    from jsonrpcserver.dispatcher import response_logger
+    from iconrpcserver.utils.json_codec import StreamedResult
+
+    methods = Methods()
+
+    @methods.add
+    async def stream(context, **kwargs):
+        return StreamedResult([1, 2, 3])
+
+    caplog.set_level(logging.INFO, logger=response_logger.name)
+    deserialized = [{"jsonrpc": "2.0", "method": "stream", "id": 1},
+                    {"jsonrpc": "2.0", "method": "stream", "id": 2}]
+    response = await json_rpc.async_dispatch(b"batch", methods, deserialized=deserialized, context="ctx")
+
+    # the streamed results are not consumed by logging, so the response can still be encoded
+    assert json_rpc.has_streamed(response)
+    assert sorted(json.loads(json_rpc.encode_response(response)), key=lambda r: r["id"]) == [
+        {"jsonrpc": "2.0", "result": [1, 2, 3], "id": 1},
+        {"jsonrpc": "2.0", "result": [1, 2, 3], "id": 2},
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("concurrency,max_running", [(0, 9), (3, 3)])
+async def test_async_dispatch_batch(concurrency, max_running):
+    import asyncio
+
+    methods = Methods()
+    running = [0]
+
+    @methods.add
+    async def sleep(context, **kwargs):
+        running.append(running[-1] + 1)
+        await asyncio.sleep(0.01 * (10 - kwargs["i"]))
+        running.append(running[-1] - 1)
+        return kwargs["i"]
+
+    def validator(request: dict):
+        if request["params"]["i"] == 5:
+            raise GenericJsonRpcServerError(code=-32602, message="Invalid params", http_status=400)
+
+    deserialized = [{"jsonrpc": "2.0", "method": "sleep", "id": i, "params": {"i": i}} for i in range(10)]
+    deserialized.append({"jsonrpc": "2.0", "method": "sleep", "params": {"i": 5}})
+    response = await json_rpc.async_dispatch(b"", methods, deserialized=deserialized, context="ctx",
+                                             validator=validator, concurrency=concurrency)
+
+    # Then the responses are in the order of the requests, and the invalid one does not fail the others
+    results = json.loads(json_rpc.encode_response(response))
+    assert [result["id"] for result in results] == list(range(10))
+    assert [result.get("result") for result in results] == [0, 1, 2, 3, 4, None, 6, 7, 8, 9]
+    assert results[5]["error"] == {"code": -32602, "message": "Invalid params"}
+    assert max(running) == max_running
+
+    # Nothing is answered to a batch of notifications
+    response = await json_rpc.async_dispatch(b"", methods, deserialized=deserialized[-1:], context="ctx",
+                                             validator=validator)
+    assert json_rpc.encode_response(response) == b""
+
+
+def test_encode_response_with_encoded_result():
+    import json
+    from jsonrpcserver.response import BatchResponse, NotificationResponse, SuccessResponse
+    from iconrpcserver.utils.json_codec import EncodedResult
+
+    result = {"height": "0x1", "hash": "0x" + "a" * 64}
+    encoded = EncodedResult(json.dumps(result).encode())
+
+    response = SuccessResponse(result=encoded, id="abc")
+    assert json.loads(json_rpc.encode_response(response)) == {"jsonrpc": "2.0", "result": result, "id": "abc"}
+
+    response = BatchResponse([SuccessResponse(result=encoded, id=1), SuccessResponse(result=result, id=2),
+                              NotificationResponse()])
+    assert sorted(json.loads(json_rpc.encode_response(response)), key=lambda r: r["id"]) == [
+        {"jsonrpc": "2.0", "result": result, "id": 1},
+        {"jsonrpc": "2.0", "result": result, "id": 2},
+    ]
+
+    assert json_rpc.encode_response(NotificationResponse()) == b""
+
+
+@pytest.mark.parametrize("data,expected", [
+    ('{"version": "0.5", "height": "0x1"}', "0.5"),
+    (b'  {\n "version":"0.1a", "transactions": []}', "0.1a"),
+    ('{"height": "0x1", "version": "0.5"}', None),
+    ('{"transactions": [{"version": "0x3"}], "version": "0.5"}', None),
+    ('[{"version": "0.5"}]', None),
+    ('{"version": 5}', None),
+    ("", None),
+])
+def test_peek_block_version(data, expected):
+    assert json_rpc.peek_block_version(data) == expected
+
+
+@pytest.mark.parametrize("data,expected", [
+    ('[{"txHash": "0x1"}]', True),
+    (b' \n\t[]', True),
+    ('{"error": "Invalid height"}', False),
+    (b'  "[]"', False),
+    ("", False),
+])
+def test_is_json_array(data, expected):
+    assert json_rpc.is_json_array(data) is expected
+
+
+@pytest.mark.asyncio
+async def test_single_flight():
+    import asyncio
+    from iconrpcserver.utils.single_flight import SingleFlight
+
+    single_flight = SingleFlight()
+    calls = []
+
+    async def call(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        if value == "error":
+            raise ValueError(value)
+        return value
+
+    results = await asyncio.gather(*[single_flight.do("key", lambda: call("first")) for _ in range(10)])
+    assert results == ["first"] * 10
+    assert calls == ["first"]
+    assert len(single_flight) == 0
+
+    results = await asyncio.gather(*[single_flight.do("error", lambda: call("error")) for _ in range(3)],
+                                   return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+    assert calls == ["first", "error"]
+
+    # the call continues for the others when the first caller is cancelled
+    first = asyncio.ensure_future(single_flight.do("key", lambda: call("second")))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(single_flight.do("key", lambda: call("third")))
+    first.cancel()
+    assert await second == "second"
+
+
+def test_freeze():
+    from iconrpcserver.utils.single_flight import freeze
+
+    assert freeze({"a": 1, "b": [1, "2"]}) == freeze({"b": [1, "2"], "a": 1})
+    assert len({freeze(1), freeze(True), freeze(1.0), freeze("1")}) == 4
+    assert freeze({"a": [1]}) != freeze({"a": {"1": 1}})
+
+
+@pytest.mark.asyncio
+async def test_stub_single_flight(monkeypatch):
+    import asyncio
+    from earlgrey import MessageQueueStub
+    from iconrpcserver.utils import message_queue
+    from iconrpcserver.utils.message_queue.channel_inner_stub import ChannelInnerStub, ChannelInnerTask
+
+    calls = []
+
+    async def call_async_rpc(self_, func_name, func, priority, *args, **kwargs):
+        calls.append((func_name, args, kwargs))
+        await asyncio.sleep(0.01)
+        return {"args": args, "kwargs": kwargs}
+
+    monkeypatch.setattr(MessageQueueStub, "_call_async_rpc", call_async_rpc)
+    monkeypatch.setattr(message_queue, "stub_single_flight", None)
+    message_queue.set_stub_single_flight(True)
+    stub = ChannelInnerStub.__new__(ChannelInnerStub)
+    stub._route_key = "channel"
+
+    async def get_block(*args, **kwargs):
+        return await stub._call_async_rpc("ChannelInnerTask.get_block", ChannelInnerTask.get_block, None,
+                                          stub, *args, **kwargs)
+
+    results = await asyncio.gather(
+        get_block(block_height=1, block_hash="", unconfirmed=False),
+        get_block(block_height=1, block_hash="", unconfirmed=False),
+        get_block(1, "", unconfirmed=False),
+        get_block(block_height=2, block_hash="", unconfirmed=False),
+    )
+    assert results[0] is results[1] is results[2]
+    assert len(calls) == 2
+    assert message_queue.stub_single_flight.stats() == {"calls": 2, "shared": 2, "coalescing_ratio": 0.5}
+
+    # write tasks are not coalesced
+    await asyncio.gather(*[
+        stub._call_async_rpc("ChannelInnerTask.register_citizen", ChannelInnerTask.register_citizen, None,
+                             stub, "peer_id", "target", "connected_time")
+        for _ in range(2)
+    ])
+    assert len(calls) == 4
+
+    message_queue.set_stub_single_flight(False)
+    await asyncio.gather(*[get_block(1, "", False) for _ in range(2)])
+    assert len(calls) == 6
+
+
+def test_event_filter_index():
+    from iconrpcserver.utils.event_filter import EventFilterIndex
+
+    score, other_score = "cx" + "1" * 40, "cx" + "2" * 40
+    transfer = "Transfer(Address,Address,int)"
+    index = EventFilterIndex()
+    index.add(transfer, score, "0x1", "score")
+    index.add(transfer, None, "0x2", "any")
+    index.add("Approval(Address,Address,int)", score, "0x3", "approval")
+    assert len(index) == 3
+
+    assert list(index.match({"scoreAddress": score, "indexed": [transfer, "hx1"]})) == ["score", "any"]
+    assert list(index.match({"scoreAddress": other_score, "indexed": [transfer, "hx1"]})) == ["any"]
+    assert list(index.match({"indexed": [transfer]})) == ["any"]
+    assert list(index.match({"scoreAddress": score, "indexed": ["ICXIssued(int,int,int,int)"]})) == []
+    assert list(index.match({"scoreAddress": score, "indexed": []})) == []
+
+    index.remove(transfer, score, "0x1")
+    index.remove(transfer, score, "0x1")
+    index.remove(transfer, None, "0x2")
+    assert len(index) == 1
+    assert list(index.match({"scoreAddress": score, "indexed": [transfer, "hx1"]})) == []